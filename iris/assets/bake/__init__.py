@@ -0,0 +1,2 @@
+# NumPy-backed glTF bake pipeline shared by the asset generator scripts under
+# iris/assets/models.
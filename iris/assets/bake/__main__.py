@@ -0,0 +1,24 @@
+import argparse
+
+import bake.cache
+import bake.gltf
+import bake.pipeline
+
+def parse_args():
+  parser = argparse.ArgumentParser(prog="python3 -m bake",
+                                   description="Optimize a baked glTF asset")
+  parser.add_argument('input', help="Input .gltf or .glb file.")
+  parser.add_argument('output', help="Output .gltf or .glb file.")
+  bake.pipeline.add_arguments(parser)
+  bake.cache.add_arguments(parser)
+  return parser.parse_args()
+
+if __name__ == "__main__":
+  args = parse_args()
+
+  def run():
+    gltf, meshes = bake.gltf.load(args.input)
+    bake.pipeline.save(args.output, gltf,
+                       bake.pipeline.run(gltf, meshes, args), args)
+
+  bake.cache.bake(args, bake.cache.references(args.input), args.output, run)
@@ -0,0 +1,92 @@
+# _AABB data for NIST_techniques_raytracing: the min and max corner of each
+# primitive's axis aligned box as consecutive VEC3 floats. The builders take
+# arrays of analytic primitive parameters, one row per primitive, and return
+# (lo, hi) arrays in one vectorized pass; pack() turns those into the
+# attribute data and add_aabbs() into a bufferView and accessor. For Morton
+# order, index the boxes and their shaderRecord data with
+# bake.morton.order(lo, hi) before packing.
+import numpy as np
+
+from bake.gltf import ARRAY_BUFFER, add_accessor, add_buffer_view
+
+def _rows(arr, n=3):
+  return np.asarray(arr, dtype=np.float64).reshape(-1, n)
+
+def spheres(center, radius):
+  # center (N, 3), radius (N,) or a scalar.
+  center = _rows(center)
+  r = np.broadcast_to(np.asarray(radius, dtype=np.float64),
+                      (len(center),))[:, None]
+  return center - r, center + r
+
+def boxes(center, half, rotation=None):
+  # Boxes of half extents half (N, 3) around center (N, 3), optionally
+  # oriented by rotation matrices (N, 3, 3) or one (3, 3) for all.
+  center = _rows(center)
+  half = np.broadcast_to(_rows(half), center.shape)
+  if rotation is not None:
+    # The box of a rotated box reaches |R| h from its center.
+    half = np.einsum('...ij,...j->...i', np.abs(rotation), half)
+  return center - half, center + half
+
+def capsules(a, b, radius):
+  # Segments a (N, 3) to b (N, 3) swept by radius (N,) or a scalar.
+  a, b = _rows(a), _rows(b)
+  r = np.broadcast_to(np.asarray(radius, dtype=np.float64),
+                      (len(a),))[:, None]
+  return np.minimum(a, b) - r, np.maximum(a, b) + r
+
+def glyphs(matrices, lo, hi, glyph=None):
+  # Instanced glyphs: the local boxes lo, hi (G, 3) of G glyph shapes placed
+  # by matrices (N, 4, 4) as node_matrix returns them, or (N, 3, 4) without
+  # the last row. glyph (N,) picks each instance's shape; with one shape it
+  # may be left out.
+  matrices = np.asarray(matrices, dtype=np.float64)
+  lo, hi = _rows(lo), _rows(hi)
+  if glyph is None:
+    glyph = np.zeros(len(matrices), dtype=np.intp)
+  center = ((lo + hi) / 2)[glyph]
+  half = ((hi - lo) / 2)[glyph]
+  linear = matrices[:, :3, :3]
+  center = np.einsum('nij,nj->ni', linear, center) + matrices[:, :3, 3]
+  half = np.einsum('nij,nj->ni', np.abs(linear), half)
+  return center - half, center + half
+
+def glyph_bounds(positions):
+  # The local box of a glyph shape from its vertex positions.
+  positions = _rows(positions)
+  return positions.min(axis=0), positions.max(axis=0)
+
+def _outward(arr, direction):
+  # Rounds to float32 toward direction so the boxes stay conservative.
+  rounded = arr.astype(np.float32)
+  wrong = rounded < arr if direction > 0 else rounded > arr
+  return np.nextafter(rounded, np.float32(direction * np.inf), out=rounded,
+                      where=wrong)
+
+def pack(lo, hi):
+  # The _AABB attribute data, (2N, 3) float32 with each min row followed by
+  # its max row.
+  lo = np.asarray(lo).reshape(-1, 3)
+  hi = np.asarray(hi).reshape(-1, 3)
+  if lo.shape != hi.shape:
+    raise ValueError("{} minimum corners but {} maximum corners".format(
+      len(lo), len(hi)))
+  packed = np.empty((len(lo), 2, 3), dtype=np.float32)
+  packed[:, 0] = lo if lo.dtype == np.float32 else _outward(lo, -1)
+  packed[:, 1] = hi if hi.dtype == np.float32 else _outward(hi, 1)
+  return packed.reshape(-1, 3)
+
+def unpack(data):
+  # (lo, hi) of _AABB attribute data.
+  boxes = np.asarray(data).reshape(-1, 2, 3)
+  return boxes[:, 0], boxes[:, 1]
+
+def add_aabbs(gltf, writer, lo, hi, name=None):
+  # Writes the boxes as a tightly packed, 4-byte aligned bufferView and
+  # returns the index of an _AABB accessor spanning all of it.
+  data = pack(lo, hi)
+  view = add_buffer_view(gltf, writer, data, target=ARRAY_BUFFER, name=name)
+  return add_accessor(gltf, view, 0, data,
+                      data.min(axis=0) if len(data) else None,
+                      data.max(axis=0) if len(data) else None, name)
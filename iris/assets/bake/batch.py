@@ -0,0 +1,197 @@
+# Bakes every glTF asset under one or more directories in parallel, one
+# worker process per asset, and writes a JSON summary of sizes and timings.
+#
+#   python3 -m bake.batch --output baked --summary baked/summary.json \
+#     --weld --vcache --fetch --quantize models ~/my-models
+import argparse
+import concurrent.futures
+import contextlib
+import filecmp
+import io
+import json
+import os
+import shutil
+import signal
+import sys
+import time
+
+import bake.cache
+import bake.pipeline
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(
+  os.path.abspath(__file__))), "models")
+
+# Extensions whose data the loader cannot decode.
+UNSUPPORTED = ("KHR_draco_mesh_compression",)
+
+def parse_args():
+  parser = argparse.ArgumentParser(
+    prog="python3 -m bake.batch",
+    description="Optimize every baked glTF asset under some directories")
+  parser.add_argument('inputs', nargs='*', metavar='DIR', default=[MODELS_DIR],
+                      help="Directories searched for .gltf and .glb files "
+                           "(default: iris/assets/models).")
+  parser.add_argument('--output', metavar='DIR', required=True,
+                      help="Directory the baked assets are written to, one "
+                           "subdirectory per input directory.")
+  parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count(),
+                      help="Assets baked at once (default: CPU count).")
+  parser.add_argument('--timeout', type=float, default=600, metavar='SECONDS',
+                      help="Give up on an asset after this long.")
+  parser.add_argument('--summary', metavar='FILE',
+                      help="Write a JSON summary of every asset to FILE.")
+  bake.pipeline.add_arguments(parser)
+  bake.cache.add_arguments(parser)
+  return parser.parse_args()
+
+def discover(directories, exclude=None):
+  # (input, output relative to the output directory) for every asset, in a
+  # stable order. Each directory maps to a subdirectory of its own name.
+  exclude = exclude and os.path.abspath(exclude)
+  for directory in directories:
+    root = os.path.basename(os.path.abspath(directory))
+    for parent, dirs, files in os.walk(directory):
+      dirs[:] = sorted(d for d in dirs if exclude !=
+                       os.path.abspath(os.path.join(parent, d)))
+      for name in sorted(files):
+        if os.path.splitext(name)[1] in (".gltf", ".glb"):
+          path = os.path.join(parent, name)
+          yield path, os.path.join(root, os.path.relpath(path, directory))
+
+def _size(paths):
+  return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+def _copy_images(input, output):
+  # Images the asset refers to by relative URI are copied along with it.
+  paths = bake.cache.references(input)[1:]
+  for source in paths:
+    relative = os.path.relpath(source, os.path.dirname(input))
+    if os.path.splitext(source)[1] == ".bin" or relative.startswith(".."):
+      continue
+    target = os.path.join(os.path.dirname(output), relative)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if not os.path.exists(target) or \
+       not filecmp.cmp(source, target, shallow=False):
+      shutil.copyfile(source, target)
+    yield target
+
+class Timeout(Exception):
+  # Raised by the SIGALRM handler. Not a TimeoutError: that is an OSError,
+  # which the cache and the stages catch around their file operations.
+  pass
+
+def _timeout(signum, frame):
+  raise Timeout()
+
+def _bake(args, input, output, entry, log):
+  import bake.gltf
+
+  inputs = bake.cache.references(input)
+  entry["inputBytes"] = _size(inputs)
+
+  gltf, _ = bake.gltf.read(input)
+  unsupported = set(UNSUPPORTED) & set(gltf.get("extensionsUsed", []))
+  if unsupported:
+    entry["status"] = "skipped"
+    entry["error"] = "{} is not supported".format(", ".join(unsupported))
+    return
+
+  def run():
+    gltf, meshes = bake.gltf.load(input)
+    bake.pipeline.save(output, gltf, bake.pipeline.run(gltf, meshes, args),
+                       args)
+
+  os.makedirs(os.path.dirname(output), exist_ok=True)
+  with contextlib.redirect_stdout(log):
+    if bake.cache.bake(args, inputs, output, run):
+      entry["status"] = "cached"
+  images = list(_copy_images(input, output))
+  entry["outputBytes"] = _size(bake.cache.outputs(output) + images)
+
+def bake_asset(args, input, output):
+  # Runs in a worker process. Returns the asset's summary entry; stage
+  # output is captured into it rather than interleaved on stdout. The
+  # timeout is a SIGALRM, so the worker survives it for the next asset.
+  entry = { "input": input, "output": output, "status": "ok" }
+  log = io.StringIO()
+  start = time.perf_counter()
+  alarm = hasattr(signal, "SIGALRM")
+  try:
+    try:
+      if alarm:
+        signal.signal(signal.SIGALRM, _timeout)
+        signal.setitimer(signal.ITIMER_REAL, args.timeout)
+      _bake(args, input, output, entry, log)
+    finally:
+      if alarm:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+  except Timeout:
+    entry["status"] = "timeout"
+    entry["error"] = "took longer than {}s".format(args.timeout)
+  except Exception as e:
+    entry["status"] = "failed"
+    entry["error"] = "{}: {}".format(type(e).__name__, e)
+  entry["seconds"] = round(time.perf_counter() - start, 3)
+  entry["log"] = log.getvalue().splitlines()
+  return entry
+
+def _bytes(n):
+  for unit in ("B", "KiB", "MiB"):
+    if n < 1024:
+      return "{:.1f} {}".format(n, unit) if unit != "B" else \
+             "{} {}".format(n, unit)
+    n /= 1024
+  return "{:.1f} GiB".format(n)
+
+def _progress(done, total, entry, output_dir):
+  line = "[{}/{}] {} {} {:.2f}s".format(
+    done, total, entry["status"], os.path.relpath(entry["output"], output_dir),
+    entry["seconds"])
+  if "outputBytes" in entry:
+    line += " {} -> {}".format(_bytes(entry["inputBytes"]),
+                               _bytes(entry["outputBytes"]))
+  if "error" in entry:
+    line += " ({})".format(entry["error"])
+  print(line, flush=True)
+
+def main():
+  args = parse_args()
+  assets = list(discover(args.inputs, args.output))
+  print("batch: {} assets, {} jobs".format(len(assets), args.jobs))
+
+  start = time.perf_counter()
+  entries = []
+  with concurrent.futures.ProcessPoolExecutor(args.jobs) as executor:
+    futures = [executor.submit(bake_asset, args, input,
+                               os.path.join(args.output, output))
+               for input, output in assets]
+    for future in concurrent.futures.as_completed(futures):
+      entries.append(future.result())
+      _progress(len(entries), len(assets), entries[-1], args.output)
+
+  entries.sort(key=lambda entry: entry["input"])
+  statuses = {}
+  for entry in entries:
+    statuses[entry["status"]] = statuses.get(entry["status"], 0) + 1
+  summary = {
+    "assets": len(entries),
+    "statuses": statuses,
+    "seconds": round(time.perf_counter() - start, 3),
+    "inputBytes": sum(entry.get("inputBytes", 0) for entry in entries),
+    "outputBytes": sum(entry.get("outputBytes", 0) for entry in entries),
+    "entries": entries
+  }
+  print("batch: {} in {:.1f}s, {} -> {}".format(
+    ", ".join("{} {}".format(n, s) for s, n in sorted(statuses.items())),
+    summary["seconds"], _bytes(summary["inputBytes"]),
+    _bytes(summary["outputBytes"])))
+
+  if args.summary:
+    os.makedirs(os.path.dirname(os.path.abspath(args.summary)), exist_ok=True)
+    with open(args.summary, 'w') as fh:
+      json.dump(summary, fh, indent=2)
+
+  return 1 if set(statuses) - { "ok", "cached", "skipped" } else 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,110 @@
+# Splits large _AABB primitives into spatially compact chunks of at most a
+# given number of boxes. The renderer builds a bottom-level acceleration
+# structure per primitive and instances each in the top-level structure, so
+# chunks build (and rebuild) independently rather than as one enormous
+# structure. Chunks are made by splitting the centroids at the median of
+# their longest axis until every chunk fits; boxes keep their incoming
+# order within a chunk, so Morton order (--morton) carries over.
+import numpy as np
+
+from bake.gltf import RAYTRACING
+from bake.mesh import Primitive
+
+BOXES = 1 << 16
+
+def partition(boxes, max_boxes=BOXES):
+  # The box indices of each chunk of boxes, (N, 2, 3) min/max pairs. Splits
+  # fall on multiples of max_boxes so all chunks but one are full.
+  boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 2, 3)
+  if max_boxes < 1:
+    raise ValueError("chunks hold at least one box, not {}".format(max_boxes))
+  centroid = boxes.mean(axis=1)
+  chunks = []
+  stack = [np.arange(len(boxes))]
+  while stack:
+    index = stack.pop()
+    if len(index) <= max_boxes:
+      chunks.append(index)
+      continue
+    c = centroid[index]
+    axis = np.argmax(c.max(axis=0) - c.min(axis=0))
+    left = -(-len(index) // max_boxes) // 2 * max_boxes
+    mask = np.zeros(len(index), dtype=bool)
+    mask[np.argpartition(c[:, axis], left - 1)[:left]] = True
+    stack.extend((index[~mask], index[mask]))
+  return chunks
+
+def split_boxes(gltf, meshes, max_boxes=BOXES):
+  # Replaces every _AABB primitive holding more than max_boxes boxes with a
+  # primitive per chunk. The chunks share the material: shader record entries
+  # that hold one element per box are put in chunk order, and each chunk's
+  # extras.HEV.shaderRecordOffset is the index of its first box's elements.
+  # Primitives whose material shares such entries with other boxes are left
+  # whole. Returns the number of primitives split and of chunks made from
+  # them.
+  materials = gltf.get("materials", [])
+
+  def records(material):
+    if material is None:
+      return {}
+    return materials[material].get("extensions", {}).get(RAYTRACING, {}) \
+                              .get("shaderRecord", {})
+
+  owners = {}
+  for mesh in meshes:
+    for p in mesh.primitives:
+      if "_AABB" in p.attributes:
+        owners.setdefault(p.material, set()).add(id(p.attributes["_AABB"]))
+
+  chunked = {}
+  reordered = set()
+  split = made = 0
+  for mesh in meshes:
+    primitives = []
+    for p in mesh.primitives:
+      boxes = p.attributes.get("_AABB")
+      if boxes is None or len(boxes) // 2 <= max_boxes:
+        primitives.append(p)
+        continue
+      count = len(boxes) // 2
+      record = records(p.material)
+      per_box = [name for name, arr in record.items()
+                 if isinstance(arr, np.ndarray) and len(arr) == count]
+      if per_box and len(owners[p.material]) > 1:
+        primitives.append(p)
+        continue
+
+      key = id(p.attributes)
+      if key not in chunked:
+        pairs = boxes.reshape(-1, 2, 3)
+        chunks = partition(pairs, max_boxes)
+        chunked[key] = chunks, [
+          dict(p.attributes,
+               _AABB=np.ascontiguousarray(pairs[c]).reshape(-1, 3))
+          for c in chunks]
+      chunks, attributes = chunked[key]
+
+      # Only these boxes use the material's per-box entries, so they can
+      # follow the boxes into chunk order.
+      if per_box and p.material not in reordered:
+        order = np.concatenate(chunks)
+        sliced = dict(record)
+        for name in per_box:
+          sliced[name] = np.ascontiguousarray(record[name][order])
+        material = materials[p.material]
+        extensions = dict(material["extensions"])
+        extensions[RAYTRACING] = dict(extensions[RAYTRACING],
+                                      shaderRecord=sliced)
+        materials[p.material] = dict(material, extensions=extensions)
+        reordered.add(p.material)
+
+      offset = 0
+      for attrs, c in zip(attributes, chunks):
+        extras = dict(p.extras or {})
+        extras["HEV"] = dict(extras.get("HEV", {}), shaderRecordOffset=offset)
+        primitives.append(Primitive(attrs, None, p.mode, p.material, extras))
+        offset += len(c)
+      split += 1
+      made += len(chunks)
+    mesh.primitives = primitives
+  return split, made
@@ -0,0 +1,70 @@
+import numpy as np
+
+def decoded_positions(primitive):
+  positions = primitive.attributes["POSITION"]
+  if positions.dtype.kind in 'iu':
+    info = np.iinfo(positions.dtype)
+    return np.maximum(positions / info.max, -1.0)
+  return positions.astype(np.float64)
+
+def directions(count=48):
+  # Fibonacci lattice over the upper half sphere; extremes are taken in both
+  # directions along each axis.
+  i = np.arange(count) + 0.5
+  z = 1 - i / count
+  r = np.sqrt(1 - z * z)
+  phi = np.pi * (1 + 5 ** 0.5) * i
+  return np.stack((r * np.cos(phi), r * np.sin(phi), z), axis=1)
+
+def extremal_points(points, count=48):
+  proj = directions(count) @ points.T
+  return points[np.unique(np.concatenate((proj.argmin(axis=1),
+                                          proj.argmax(axis=1))))]
+
+def refine(points, center, radius, iterations=64):
+  # Badoiu-Clarkson core-set iterations pull the center toward the farthest
+  # point with a decreasing step; keep the smallest sphere seen.
+  best = center, radius
+  for i in range(1, iterations + 1):
+    d = np.einsum('ij,ij->i', points - center, points - center)
+    far = np.argmax(d)
+    if d[far] < best[1] ** 2:
+      best = center, np.sqrt(d[far])
+    center = center + (points[far] - center) / (i + 1)
+  return best
+
+def bounding_sphere(points, farthest=1024, rounds=4):
+  # Larsson, "Fast and Tight Fitting Bounding Spheres" (EPOS): fit the
+  # extremal points along a fixed set of directions, then refit together with
+  # the points farthest from that sphere's center.
+  points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+  if not len(points):
+    return np.zeros(3, dtype=np.float32), 0.0
+
+  extremes = extremal_points(points)
+  center = extremes.mean(axis=0)
+  radius = np.sqrt(np.einsum('ij,ij->i', extremes - center,
+                             extremes - center).max())
+  center, radius = refine(extremes, center, radius, 1024)
+
+  for _ in range(rounds):
+    d = np.einsum('ij,ij->i', points - center, points - center)
+    if d.max() <= radius * radius:
+      break
+    far = np.argpartition(d, -min(farthest, len(d)))[-farthest:]
+    extremes = np.concatenate((extremes, points[far]))
+    center, radius = refine(extremes, center, np.sqrt(d.max()), 256)
+
+  # Recompute the radius from the float32 center so the stored sphere
+  # contains every point exactly.
+  center = center.astype(np.float32)
+  radius = np.sqrt(np.einsum('ij,ij->i', points - center,
+                             points - center).max())
+  return center, float(np.nextafter(np.float32(radius), np.float32(np.inf)))
+
+def add_bounding_sphere(primitive):
+  center, radius = bounding_sphere(decoded_positions(primitive))
+  extras = dict(primitive.extras or {})
+  extras.setdefault("HEV", {})["boundingSphere"] = center.tolist() + [radius]
+  primitive.extras = extras
+  return primitive
@@ -0,0 +1,263 @@
+# Binned SAH bounding volume hierarchies over _AABB data, built top down one
+# level at a time: every open node of a level is binned and split in the
+# same NumPy pass, so the Python loop runs once per level rather than once
+# per node.
+#
+# The tree is an array of 32-byte nodes
+#   float32 min xyz, uint32 first, float32 max xyz, uint32 count
+# where interior nodes have count 0 and children first and first + 1, and
+# leaves hold the count boxes primitives[first:first + count], indices of
+# the primitive's _AABB min/max pairs. Node 0 is the root.
+#
+#   python3 -m bake.bvh models/RaytracedSpheres/spheres.gltf
+import argparse
+import sys
+
+import numpy as np
+
+from bake.gltf import accessor_data, read, tables_path
+
+BINS = 16
+LEAF = 4
+
+# Cost of visiting a node relative to intersecting one box.
+TRAVERSAL_COST = 1.0
+
+NODE = np.dtype([("min", "<f4", 3), ("first", "<u4"), ("max", "<f4", 3),
+                 ("count", "<u4")])
+
+def sidecar_path(path):
+  return tables_path(path, "bvh")
+
+def _area(lo, hi):
+  # Surface areas of boxes given as per-axis sequences of arrays.
+  dx, dy, dz = (np.maximum(h - l, 0) for l, h in zip(lo, hi))
+  return 2 * (dx * dy + dy * dz + dz * dx)
+
+def _split_costs(keys, m, bins, lo, hi):
+  # Unnormalized SAH cost of the bins - 1 splits between the bins of each of
+  # m nodes, (bins - 1, m), infinite where a side would be empty. keys is
+  # bin * m + node per box; bins are rows so the scans run along
+  # contiguous memory.
+  counts = np.bincount(keys, minlength=bins * m).reshape(bins, m)
+  blo, bhi = [], []
+  for k in range(3):
+    column = np.full(bins * m, np.inf)
+    np.minimum.at(column, keys, lo[:, k])
+    blo.append(column.reshape(bins, m))
+    column = np.full(bins * m, -np.inf)
+    np.maximum.at(column, keys, hi[:, k])
+    bhi.append(column.reshape(bins, m))
+
+  # Left sides grow from the first bin, right sides from the last.
+  left_area = _area([np.minimum.accumulate(a) for a in blo],
+                    [np.maximum.accumulate(a) for a in bhi])[:-1]
+  right_area = _area([np.minimum.accumulate(a[::-1]) for a in blo],
+                     [np.maximum.accumulate(a[::-1]) for a in bhi])[-2::-1]
+  left = np.cumsum(counts, axis=0)[:-1]
+  right = counts.sum(axis=0) - left
+  return np.where((left > 0) & (right > 0),
+                  left_area * left + right_area * right, np.inf)
+
+def build(boxes, leaf=LEAF, bins=BINS):
+  # The tree over boxes, (N, 2, 3) min/max pairs, as (nodes, primitives).
+  # A node stays a leaf when splitting it would cost more than testing its
+  # boxes, unless it holds more than leaf boxes; nodes whose boxes cannot
+  # be told apart by their centroids are then halved.
+  boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 2, 3)
+  n = len(boxes)
+  # The boxes, min then max per row, are kept in tree order alongside
+  # order so each level reads them sequentially.
+  data = boxes.reshape(-1, 6).astype(np.float64)
+
+  nodes = np.zeros(max(2 * n - 1, 1), dtype=NODE)
+  nodes[0]["count"] = n
+  used = 1
+  order = np.arange(n)
+
+  # The open nodes of the current level and their ranges of order.
+  level = np.zeros(1 if n else 0, dtype=np.intp)
+  starts = np.zeros(len(level), dtype=np.intp)
+  counts = np.full(len(level), n)
+  while len(level):
+    m = len(level)
+    offsets = np.cumsum(counts) - counts
+    local = np.repeat(np.arange(m), counts)
+    where = np.repeat(starts - offsets, counts) + np.arange(len(local))
+    rows = data[where]
+    nodes["min"][level] = np.minimum.reduceat(rows[:, :3], offsets)
+    nodes["max"][level] = np.maximum.reduceat(rows[:, 3:], offsets)
+    c = (rows[:, :3] + rows[:, 3:]) / 2
+    cmin = np.minimum.reduceat(c, offsets)
+    cmax = np.maximum.reduceat(c, offsets)
+
+    # The cheapest split of each node over the three axes. Small nodes get
+    # fewer bins, a power of two no larger than their count, and are
+    # binned in groups of equal bin counts so the work per level stays
+    # proportional to the boxes rather than to nodes times bins.
+    node_bins = np.minimum(bins, 2 ** np.floor(np.log2(np.maximum(counts, 1)))
+                           .astype(np.intp))
+    scale = np.divide(node_bins[:, None], cmax - cmin,
+                      out=np.zeros_like(cmax), where=cmax > cmin)
+    binned = np.minimum(((c - np.repeat(cmin, counts, axis=0)) *
+                         np.repeat(scale, counts, axis=0)).astype(np.intp),
+                        np.repeat(node_bins, counts)[:, None] - 1)
+    cost = np.full(m, np.inf)
+    axis = np.zeros(m, dtype=np.intp)
+    cut = np.zeros(m, dtype=np.intp)
+    for b in np.unique(node_bins[counts > 1]):
+      group = np.flatnonzero(node_bins == b)
+      group = group[counts[group] > 1]
+      renumber = np.full(m, -1)
+      renumber[group] = np.arange(len(group))
+      chosen = renumber[local] >= 0
+      keys = renumber[local[chosen]]
+      group_rows = rows[chosen]
+      costs = np.concatenate([
+        _split_costs(binned[chosen, k] * len(group) + keys, len(group), b,
+                     group_rows[:, :3], group_rows[:, 3:])
+        for k in range(3)])
+      best = costs.argmin(axis=0)
+      cost[group] = costs[best, np.arange(len(group))]
+      axis[group], cut[group] = best // (b - 1), best % (b - 1)
+    area = _area(nodes["min"][level].T.astype(np.float64),
+                 nodes["max"][level].T.astype(np.float64))
+    split_cost = TRAVERSAL_COST + np.divide(cost, area, out=np.zeros(m),
+                                            where=area > 0)
+
+    sah = np.isfinite(cost)
+    split = (counts > 1) & ((sah & (split_cost < counts)) | (counts > leaf))
+    rank = np.arange(len(local)) - offsets[local]
+    right = np.where(sah[local],
+                     binned[np.arange(len(local)), axis[local]] > cut[local],
+                     rank >= counts[local] // 2) & split[local]
+
+    # Partition each node's range, left boxes first, both sides keeping
+    # their order.
+    left = ~right
+    before = np.cumsum(left) - left
+    left_counts = np.add.reduceat(left, offsets)
+    side_rank = np.where(right, rank - (before - before[offsets][local]),
+                         before - before[offsets][local])
+    target = where - rank + side_rank + right * left_counts[local]
+    order[target] = order[where]
+    data[target] = rows
+
+    leaves = level[~split]
+    nodes["first"][leaves] = starts[~split]
+    nodes["count"][leaves] = counts[~split]
+    if not split.any():
+      break
+
+    # Two children per split node, numbered in level order.
+    parents = level[split]
+    left_counts = left_counts[split]
+    children = used + 2 * np.arange(len(parents))
+    used += 2 * len(parents)
+    nodes["first"][parents] = children
+    nodes["count"][parents] = 0
+
+    level = np.stack((children, children + 1), axis=1).ravel()
+    starts = np.stack((starts[split], starts[split] + left_counts),
+                      axis=1).ravel()
+    counts = np.stack((left_counts, counts[split] - left_counts),
+                      axis=1).ravel()
+    nodes["count"][level] = counts
+
+  return nodes[:used], order.astype(np.uint32)
+
+def _leaves(nodes):
+  # An empty tree is a single empty leaf.
+  return (nodes["count"] > 0) | (len(nodes) == 1)
+
+def depths(nodes):
+  # Depth of every node, the root at 0, a level at a time.
+  depth = np.zeros(len(nodes), dtype=np.intp)
+  interior = ~_leaves(nodes)
+  level = np.zeros(1, dtype=np.intp)
+  while len(level):
+    parents = level[interior[level]]
+    level = np.stack((nodes["first"][parents],
+                      nodes["first"][parents] + 1), axis=1).ravel() \
+              .astype(np.intp)
+    depth[level] = np.repeat(depth[parents], 2) + 1
+  return depth
+
+def report(nodes):
+  # SAH cost relative to the root area, depth and leaf occupancy.
+  leaf = _leaves(nodes)
+  area = _area(nodes["min"].T.astype(np.float64),
+               nodes["max"].T.astype(np.float64))
+  root = area[0] if area[0] > 0 else 1
+  depth = depths(nodes)
+  occupancy = nodes["count"][leaf]
+  return {
+    "nodes": len(nodes),
+    "leaves": int(leaf.sum()),
+    "sahCost": float((TRAVERSAL_COST * area[~leaf].sum() +
+                      (area[leaf] * nodes["count"][leaf]).sum()) / root),
+    "depth": int(depth.max()),
+    "meanLeafDepth": float(depth[leaf].mean()),
+    "meanLeafBoxes": float(occupancy.mean()),
+    "maxLeafBoxes": int(occupancy.max()),
+    "leafBoxes": np.bincount(occupancy).tolist()
+  }
+
+def add_bvhs(meshes, leaf=LEAF, bins=BINS):
+  # Trees for every primitive with _AABB data, as a list per mesh of a
+  # table or None per primitive. Primitives sharing boxes share trees.
+  done = {}
+  result = []
+  for mesh in meshes:
+    result.append([])
+    for p in mesh.primitives:
+      boxes = p.attributes.get("_AABB")
+      if boxes is not None and id(boxes) not in done:
+        nodes, primitives = build(boxes, leaf, bins)
+        done[id(boxes)] = {
+          "nodes": nodes.view(np.uint32).reshape(-1, 8),
+          "primitives": primitives
+        }
+      result[-1].append(None if boxes is None else done[id(boxes)])
+  return result
+
+def node_array(table):
+  # The nodes of a table made by add_bvhs.
+  return table["nodes"].view(NODE).ravel()
+
+def describe(stats):
+  return "{} nodes, {} leaves of {:.2f} boxes (max {}), depth {} (leaves " \
+         "{:.1f}), SAH cost {:.2f}".format(
+           stats["nodes"], stats["leaves"], stats["meanLeafBoxes"],
+           stats["maxLeafBoxes"], stats["depth"], stats["meanLeafDepth"],
+           stats["sahCost"])
+
+def main():
+  parser = argparse.ArgumentParser(
+    prog="python3 -m bake.bvh",
+    description="Build binned SAH trees over the _AABB data of a "
+                "NIST_techniques_raytracing asset and report their quality")
+  parser.add_argument('input', help="Input .gltf or .glb file.")
+  parser.add_argument('--leaf', type=int, default=LEAF, metavar='BOXES',
+                      help="Split any node holding more boxes.")
+  parser.add_argument('--bins', type=int, default=BINS,
+                      help="SAH bins per axis.")
+  args = parser.parse_args()
+
+  gltf, buffers = read(args.input)
+  done = set()
+  for m, mesh in enumerate(gltf.get("meshes", [])):
+    for p, primitive in enumerate(mesh["primitives"]):
+      index = primitive["attributes"].get("_AABB")
+      if index is None or index in done:
+        continue
+      done.add(index)
+      boxes = accessor_data(gltf, buffers, index)
+      tree, _ = build(boxes, args.leaf, args.bins)
+      print("bvh: mesh {} primitive {}: {} boxes, {}".format(
+        m, p, len(boxes) // 2, describe(report(tree))))
+  if not done:
+    print("bvh: {} has no _AABB primitives".format(args.input))
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,139 @@
+# Content-addressed cache of bake outputs. An entry is a directory named by
+# the hash of the input files, the bake options and the pipeline version and
+# holds copies of the files the bake wrote. Entries are evicted least
+# recently used first once the cache outgrows its size limit.
+import filecmp
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+DEFAULT_DIR = os.environ.get("HEVX_BAKE_CACHE", os.path.join(
+  os.path.expanduser("~"), ".cache", "hevx", "bake"))
+
+# Options that only steer the cache, name the input or drive a batch.
+IGNORED = ("input", "cache", "cache_size", "no_cache", "inputs", "jobs",
+           "timeout", "summary")
+
+def add_arguments(parser):
+  parser.add_argument('--cache', metavar='DIR', default=DEFAULT_DIR,
+                      help="Bake cache directory (default: $HEVX_BAKE_CACHE "
+                           "or ~/.cache/hevx/bake).")
+  parser.add_argument('--cache-size', type=float, default=1024,
+                      metavar='MIB',
+                      help="Evict least recently used bakes beyond this "
+                           "size.")
+  parser.add_argument('--no-cache', action='store_true',
+                      help="Always bake and leave the cache untouched.")
+
+def references(path):
+  # The files a glTF asset is made of: itself plus external buffers and
+  # images.
+  import bake.gltf
+
+  gltf, _ = bake.gltf.read(path)
+  base_dir = os.path.dirname(path)
+  paths = [path]
+  for item in gltf.get("buffers", []) + gltf.get("images", []):
+    uri = item.get("uri", "")
+    if uri and not uri.startswith("data:"):
+      paths.append(os.path.join(base_dir, uri))
+  return paths
+
+def outputs(path):
+  # The files bake.pipeline.save writes for path.
+  paths = [path, os.path.splitext(path)[0] + ".meshlets.bin",
+           os.path.splitext(path)[0] + ".bvh.bin"]
+  if os.path.splitext(path)[1] != ".glb":
+    import bake.gltf
+
+    paths.append(os.path.splitext(path)[0] + ".bin")
+    paths += bake.gltf.image_paths(path)
+  return [p for p in paths if os.path.exists(p)]
+
+def key(inputs, args, output):
+  from bake.pipeline import VERSION
+
+  options = { k: v for k, v in sorted(vars(args).items())
+              if k not in IGNORED and k != "output" }
+  # The output name is part of the key since a .gltf names its .bin after it.
+  options["output"] = os.path.basename(output)
+
+  h = hashlib.sha256(json.dumps([VERSION, options]).encode('utf-8'))
+  for path in inputs:
+    with open(path, 'rb') as fh:
+      for chunk in iter(lambda: fh.read(1 << 20), b''):
+        h.update(chunk)
+    h.update(b'\0')
+  return h.hexdigest()
+
+class Cache:
+  def __init__(self, directory=DEFAULT_DIR, size=1024):
+    self.directory = directory
+    self.size = int(size * (1 << 20))
+
+  def restore(self, key, output):
+    # Copies a cached bake next to output, leaving files that are already
+    # up to date alone. Returns False on a miss.
+    entry = os.path.join(self.directory, key)
+    if not os.path.isdir(entry):
+      return False
+
+    target_dir = os.path.dirname(output)
+    for name in os.listdir(entry):
+      target = os.path.join(target_dir, name)
+      source = os.path.join(entry, name)
+      if not os.path.exists(target) or \
+         not filecmp.cmp(source, target, shallow=False):
+        shutil.copyfile(source, target)
+    os.utime(entry)
+    return True
+
+  def store(self, key, paths):
+    os.makedirs(self.directory, exist_ok=True)
+    entry = os.path.join(self.directory, key)
+    # Fill a private directory and rename it into place so concurrent bakes
+    # never see a partial entry.
+    staging = tempfile.mkdtemp(dir=self.directory, prefix=".")
+    for path in paths:
+      shutil.copyfile(path, os.path.join(staging, os.path.basename(path)))
+    try:
+      os.rename(staging, entry)
+    except OSError:
+      shutil.rmtree(staging)  # stored meanwhile by another bake
+    self.evict()
+
+  def evict(self):
+    entries = []
+    for name in os.listdir(self.directory):
+      entry = os.path.join(self.directory, name)
+      if name.startswith(".") or not os.path.isdir(entry):
+        continue
+      size = sum(os.path.getsize(os.path.join(entry, f))
+                 for f in os.listdir(entry))
+      entries.append((os.path.getmtime(entry), size, entry))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+      if total <= self.size:
+        break
+      shutil.rmtree(entry, ignore_errors=True)
+      total -= size
+
+def bake(args, inputs, output, run):
+  # Calls run() to write output unless the cache has a bake of the same
+  # inputs and options. Returns True if output was restored from the cache.
+  if args.no_cache:
+    run()
+    return False
+
+  cache = Cache(args.cache, args.cache_size)
+  k = key(inputs, args, output)
+  if cache.restore(k, output):
+    print("cache: {} is up to date".format(output))
+    return True
+
+  run()
+  cache.store(k, outputs(output))
+  return False
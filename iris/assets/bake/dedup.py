@@ -0,0 +1,161 @@
+import hashlib
+import json
+
+from bake.gltf import accessor_data, loose_accessors
+
+DRACO = "KHR_draco_mesh_compression"
+
+def _array_key(arr):
+  # Decoded shaderRecord arrays compare by contents.
+  return "{}{}:{}".format(arr.dtype, arr.shape, _digest(arr.tobytes()))
+
+def _key(item, ignore=("name",)):
+  return json.dumps({ k: v for k, v in item.items() if k not in ignore },
+                    sort_keys=True, default=_array_key)
+
+def _unique(items, keys=None):
+  # Returns (remap, kept): the index in kept of each item's first equal item.
+  keys = map(_key, items) if keys is None else keys
+  first = {}
+  remap = []
+  kept = []
+  for item, key in zip(items, keys):
+    if key not in first:
+      first[key] = len(kept)
+      kept.append(item)
+    remap.append(first[key])
+  return remap, kept
+
+def _digest(data):
+  return "{}:{}".format(len(data), hashlib.sha1(data).hexdigest())
+
+def _remap_textures(value, remap):
+  # Texture references are textureInfo objects, i.e. dicts with an "index"
+  # under a key ending in "Texture" (baseColorTexture, normalTexture, ...).
+  if isinstance(value, dict):
+    for key, item in value.items():
+      if key.endswith("Texture") and isinstance(item, dict) and \
+         "index" in item:
+        item["index"] = remap[item["index"]]
+      _remap_textures(item, remap)
+  elif isinstance(value, list):
+    for item in value:
+      _remap_textures(item, remap)
+
+def dedup_materials(gltf):
+  # Merges equal images, samplers, textures and materials (names aside) and
+  # rewrites the references between them. Returns the material remap for
+  # the caller to apply to its primitives.
+  remap, gltf["images"] = _unique(gltf.get("images", []))
+  for texture in gltf.get("textures", []):
+    for owner in [texture] + list(texture.get("extensions", {}).values()):
+      if "source" in owner:
+        owner["source"] = remap[owner["source"]]
+
+  remap, gltf["samplers"] = _unique(gltf.get("samplers", []))
+  for texture in gltf.get("textures", []):
+    if "sampler" in texture:
+      texture["sampler"] = remap[texture["sampler"]]
+
+  remap, gltf["textures"] = _unique(gltf.get("textures", []))
+  for material in gltf.get("materials", []):
+    _remap_textures(material, remap)
+
+  remap, gltf["materials"] = _unique(gltf.get("materials", []))
+  for key in ("images", "samplers", "textures", "materials"):
+    if not gltf[key]:
+      del gltf[key]
+  return remap
+
+def _primitives(gltf):
+  return [p for mesh in gltf.get("meshes", []) for p in mesh["primitives"]]
+
+def _accessor_refs(gltf):
+  # (owner, key) for every reference to an accessor.
+  for p in _primitives(gltf):
+    for attributes in [p["attributes"]] + p.get("targets", []):
+      for semantic in attributes:
+        yield attributes, semantic
+    if "indices" in p:
+      yield p, "indices"
+  yield from loose_accessors(gltf)
+
+def _view_refs(gltf):
+  # (owner, key) for every reference to a bufferView.
+  for accessor in gltf.get("accessors", []):
+    if "bufferView" in accessor:
+      yield accessor, "bufferView"
+    sparse = accessor.get("sparse")
+    if sparse:
+      yield sparse["indices"], "bufferView"
+      yield sparse["values"], "bufferView"
+  for image in gltf.get("images", []):
+    if "bufferView" in image:
+      yield image, "bufferView"
+  for p in _primitives(gltf):
+    draco = p.get("extensions", {}).get(DRACO)
+    if draco:
+      yield draco, "bufferView"
+
+def _view_data(gltf, buffers, view):
+  offset = view.get("byteOffset", 0)
+  return buffers[view["buffer"]][offset:offset + view["byteLength"]]
+
+def dedup_buffers(gltf, buffers):
+  # Merges byte-identical bufferViews and accessors with the same contents,
+  # rewrites the references and repacks the bufferViews still in use into a
+  # single buffer. Returns the buffer data.
+  views = gltf.get("bufferViews", [])
+  accessors = gltf.get("accessors", [])
+
+  # Views first map to the first equal view, so accessors still read their
+  # data from the original views until those are repacked.
+  first = {}
+  same = [first.setdefault((_digest(_view_data(gltf, buffers, view)),
+                            view.get("byteStride"), view.get("target")), i)
+          for i, view in enumerate(views)]
+  for owner, key in _view_refs(gltf):
+    owner[key] = same[owner[key]]
+
+  # Accessors are compared by their decoded elements, except sparse ones and
+  # those without a view (Draco), which only merge when identical.
+  keys = []
+  for i, accessor in enumerate(accessors):
+    if "sparse" in accessor or "bufferView" not in accessor:
+      keys.append(str(i) if "bufferView" not in accessor else _key(accessor))
+    else:
+      data = accessor_data(gltf, buffers, i).tobytes()
+      keys.append(_key(accessor, ("name", "bufferView", "byteOffset")) +
+                  _digest(data))
+  remap, accessors = _unique(accessors, keys)
+  for owner, key in _accessor_refs(gltf):
+    owner[key] = remap[owner[key]]
+  gltf["accessors"] = accessors
+
+  # Repack the views that are still referenced, in order of first use.
+  data = bytearray()
+  packed = {}
+  kept = []
+  for owner, key in _view_refs(gltf):
+    i = owner[key]
+    if i not in packed:
+      data += bytes(-len(data) % 4)
+      packed[i] = len(kept)
+      kept.append(dict(views[i], buffer=0, byteOffset=len(data)))
+      data += _view_data(gltf, buffers, views[i])
+    owner[key] = packed[i]
+
+  for key, items in (("accessors", accessors), ("bufferViews", kept)):
+    if items:
+      gltf[key] = items
+    else:
+      gltf.pop(key, None)
+  gltf["buffers"] = [{ "byteLength": len(data) }] if data else []
+  return bytes(data)
+
+def dedup(gltf, buffers):
+  remap = dedup_materials(gltf)
+  for p in _primitives(gltf):
+    if "material" in p:
+      p["material"] = remap[p["material"]]
+  return dedup_buffers(gltf, buffers)
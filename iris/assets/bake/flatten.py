@@ -0,0 +1,129 @@
+import numpy as np
+
+from bake.gltf import TRIANGLES, TRIANGLE_STRIP, TRIANGLE_FAN, node_matrix, \
+                       set_node_matrix
+from bake.mesh import Mesh, Primitive, merge_by_material, triangulate
+
+# Node properties that flattening folds away; a node with anything else
+# (camera, skin, weights, extensions, extras) keeps a node of its own.
+TRANSFORM = ("children", "matrix", "translation", "rotation", "scale")
+
+SURFACES = (TRIANGLES, TRIANGLE_STRIP, TRIANGLE_FAN)
+
+def _normalize(v):
+  length = np.linalg.norm(v, axis=-1, keepdims=True)
+  return np.divide(v, length, out=np.zeros_like(v), where=length > 1e-20)
+
+def world_matrices(gltf, scene):
+  # (node, world matrix) for every node under the scene, parents first.
+  nodes = gltf.get("nodes", [])
+  stack = [(i, np.eye(4)) for i in reversed(scene.get("nodes", []))]
+  while stack:
+    i, parent = stack.pop()
+    matrix = parent @ node_matrix(nodes[i])
+    yield i, matrix
+    stack.extend((child, matrix)
+                 for child in reversed(nodes[i].get("children", [])))
+
+def bakeable(mesh):
+  # Baking needs float positions; quantized positions and procedural
+  # primitives (_AABB) keep their node transform.
+  return all("POSITION" in p.attributes and
+             p.attributes["POSITION"].dtype.kind == 'f' and
+             all(p.attributes[s].dtype.kind == 'f'
+                 for s in ("NORMAL", "TANGENT") if s in p.attributes)
+             for p in mesh.primitives)
+
+def transform_primitive(primitive, matrix):
+  linear = matrix[:3, :3]
+  mirrored = np.linalg.det(linear) < 0
+  if mirrored and primitive.mode in SURFACES:
+    primitive = triangulate(primitive)
+
+  attributes = dict(primitive.attributes)
+  positions = attributes["POSITION"].astype(np.float64)
+  attributes["POSITION"] = (positions @ linear.T +
+                            matrix[:3, 3]).astype(np.float32)
+  if "NORMAL" in attributes:
+    normals = attributes["NORMAL"].astype(np.float64)
+    attributes["NORMAL"] = _normalize(
+      normals @ np.linalg.inv(linear)).astype(np.float32)
+  if "TANGENT" in attributes:
+    tangents = attributes["TANGENT"].astype(np.float64)
+    tangents[:, :3] = _normalize(tangents[:, :3] @ linear.T)
+    if mirrored:
+      tangents[:, 3] = -tangents[:, 3]
+    attributes["TANGENT"] = tangents.astype(np.float32)
+
+  indices = primitive.indices
+  if mirrored and primitive.mode in SURFACES:
+    # Keep front faces facing out by reversing the winding.
+    indices = np.ascontiguousarray(indices.reshape(-1, 3)[:, ::-1]).ravel()
+
+  return Primitive(attributes, indices, primitive.mode, primitive.material,
+                   primitive.extras)
+
+def flatten(gltf, meshes):
+  # Collapse each scene into one root node per kept node plus one node for a
+  # mesh holding every mesh that is referenced once, with its world matrix
+  # baked into the vertices and its primitives merged by material. Meshes
+  # referenced more than once stay instanced under their world matrix.
+  # Returns None for animated or skinned assets, whose hierarchy matters.
+  if gltf.get("animations") or gltf.get("skins"):
+    return None
+
+  nodes = gltf.get("nodes", [])
+  scenes = gltf.get("scenes") or [{ "nodes": [0] if nodes else [] }]
+
+  # Meshes used by several nodes, or sharing geometry with another mesh that
+  # is used (instances with another material), are not baked.
+  uses = {}
+  for scene in scenes:
+    for i, _ in world_matrices(gltf, scene):
+      if "mesh" in nodes[i]:
+        for p in meshes[nodes[i]["mesh"]].primitives:
+          uses[id(p.attributes)] = uses.get(id(p.attributes), 0) + 1
+
+  def unique(mesh):
+    return all(uses[id(p.attributes)] == 1 for p in meshes[mesh].primitives)
+
+  flat = []
+  result = []
+  kept = {}
+  for scene in scenes:
+    baked = []
+    roots = []
+    for i, matrix in world_matrices(gltf, scene):
+      node = { key: value for key, value in nodes[i].items()
+               if key not in TRANSFORM }
+      mesh = node.get("mesh")
+      named = set(node) <= { "mesh", "name" }
+      if mesh is not None and named and unique(mesh) and \
+         bakeable(meshes[mesh]) and abs(np.linalg.det(matrix)) > 1e-30:
+        baked.extend(transform_primitive(p, matrix)
+                     for p in meshes[mesh].primitives)
+        continue
+      if mesh is None and named:
+        continue
+
+      if mesh is not None:
+        if mesh not in kept:
+          kept[mesh] = len(result)
+          result.append(meshes[mesh])
+        node["mesh"] = kept[mesh]
+      set_node_matrix(node, matrix)
+      roots.append(len(flat))
+      flat.append(node)
+
+    if baked:
+      surfaces = [p for p in baked if p.mode in SURFACES]
+      result.append(Mesh(merge_by_material(surfaces) +
+                         [p for p in baked if p.mode not in SURFACES],
+                         scene.get("name")))
+      roots.insert(0, len(flat))
+      flat.append({ "mesh": len(result) - 1 })
+    scene["nodes"] = roots
+
+  gltf["nodes"] = flat
+  gltf["scenes"] = scenes
+  return result
@@ -0,0 +1,688 @@
+import base64
+import io
+import glob
+import json
+import mimetypes
+import os
+import shutil
+import struct
+import tempfile
+
+import numpy as np
+
+# componentType
+BYTE = 5120
+UNSIGNED_BYTE = 5121
+SHORT = 5122
+UNSIGNED_SHORT = 5123
+UNSIGNED_INT = 5125
+FLOAT = 5126
+
+# bufferView.target
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+# primitive.mode
+POINTS = 0
+TRIANGLES = 4
+TRIANGLE_STRIP = 5
+TRIANGLE_FAN = 6
+
+COMPONENT_TYPES = {
+  np.dtype(np.int8): BYTE,
+  np.dtype(np.uint8): UNSIGNED_BYTE,
+  np.dtype(np.int16): SHORT,
+  np.dtype(np.uint16): UNSIGNED_SHORT,
+  np.dtype(np.uint32): UNSIGNED_INT,
+  np.dtype(np.float32): FLOAT,
+}
+
+GLB_MAGIC = 0x46546C67
+GLB_CHUNK_JSON = 0x4E4F534A
+GLB_CHUNK_BIN = 0x004E4942
+
+ACCESSOR_TYPES = { 1: "SCALAR", 2: "VEC2", 3: "VEC3", 4: "VEC4", 16: "MAT4" }
+
+COMPONENT_DTYPES = { v: k for k, v in COMPONENT_TYPES.items() }
+TYPE_COMPONENTS = { v: k for k, v in ACCESSOR_TYPES.items() }
+
+def as_float32(arr, components=3):
+  return np.ascontiguousarray(arr, dtype=np.float32).reshape(-1, components)
+
+def bounds(arr, starts=None):
+  if starts is None:
+    return arr.min(axis=0), arr.max(axis=0)
+  return np.minimum.reduceat(arr, starts, axis=0), \
+         np.maximum.reduceat(arr, starts, axis=0)
+
+class BufferWriter:
+  def __init__(self, fh):
+    self.fh = fh
+    self.byteLength = 0
+
+  def align(self, alignment=4):
+    pad = -self.byteLength % alignment
+    if pad:
+      self.fh.write(bytes(pad))
+      self.byteLength += pad
+    return self.byteLength
+
+  def write(self, arr, alignment=4):
+    offset = self.align(alignment)
+    arr = np.ascontiguousarray(arr)
+    self.fh.write(arr.data)
+    self.byteLength += arr.nbytes
+    return offset, arr.nbytes
+
+def add_accessor(gltf, bufferView, byteOffset, arr, lo=None, hi=None,
+                 name=None, normalized=False, count=None):
+  # arr gives the element type; count overrides its length for accessors
+  # whose data was streamed a chunk at a time.
+  accessor = {
+    "bufferView": bufferView,
+    "byteOffset": byteOffset,
+    "componentType": COMPONENT_TYPES[arr.dtype],
+    "count": len(arr) if count is None else count,
+    "type": ACCESSOR_TYPES[arr.shape[1] if arr.ndim > 1 else 1]
+  }
+  if normalized:
+    accessor["normalized"] = True
+  if hi is not None:
+    accessor["max"] = hi.tolist()
+  if lo is not None:
+    accessor["min"] = lo.tolist()
+  if name is not None:
+    accessor["name"] = name
+
+  gltf["accessors"].append(accessor)
+  return len(gltf["accessors"]) - 1
+
+def add_buffer_view(gltf, writer, arr, byteStride=None, target=None,
+                    name=None):
+  byteOffset, byteLength = writer.write(arr)
+  bufferView = {
+    "buffer": 0,
+    "byteOffset": byteOffset,
+    "byteLength": byteLength
+  }
+  if byteStride is not None:
+    bufferView["byteStride"] = byteStride
+  if target is not None:
+    bufferView["target"] = target
+  if name is not None:
+    bufferView["name"] = name
+
+  gltf["bufferViews"].append(bufferView)
+  return len(gltf["bufferViews"]) - 1
+
+RAYTRACING = "NIST_techniques_raytracing"
+
+def shader_records(gltf):
+  # (record, name) for every entry of a NIST_techniques_raytracing material
+  # shaderRecord: an accessor index in a glTF, its array once decoded.
+  for material in gltf.get("materials", []):
+    record = material.get("extensions", {}).get(RAYTRACING, {}) \
+                     .get("shaderRecord", {})
+    for name in record:
+      yield record, name
+
+INSTANCING = "EXT_mesh_gpu_instancing"
+
+def loose_accessors(gltf):
+  # (owner, key) for every accessor reference outside the meshes: skin
+  # inverse bind matrices, animation keyframes, instancing attributes and
+  # shader records. decode() replaces them with their arrays and save()
+  # writes those back.
+  for skin in gltf.get("skins", []):
+    if "inverseBindMatrices" in skin:
+      yield skin, "inverseBindMatrices"
+  for animation in gltf.get("animations", []):
+    for sampler in animation["samplers"]:
+      yield sampler, "input"
+      yield sampler, "output"
+  for node in gltf.get("nodes", []):
+    attributes = node.get("extensions", {}).get(INSTANCING, {}) \
+                     .get("attributes", {})
+    for semantic in attributes:
+      yield attributes, semantic
+  yield from shader_records(gltf)
+
+def instanced_meshes(gltf):
+  # The meshes drawn by EXT_mesh_gpu_instancing nodes. Their instance
+  # transforms apply between the node's and the mesh's, so a matrix cannot
+  # be folded into such a node.
+  return { node["mesh"] for node in gltf.get("nodes", [])
+           if "mesh" in node and INSTANCING in node.get("extensions", {}) }
+
+def _with_extension(owner, name, key):
+  # A copy of owner whose extensions[name][key] dict is a copy too.
+  extensions = dict(owner["extensions"])
+  extensions[name] = dict(extensions[name])
+  extensions[name][key] = dict(extensions[name][key])
+  return dict(owner, extensions=extensions)
+
+def _add_loose_accessors(gltf, writer):
+  # Writes the arrays decode() left in place of loose accessors, into copies
+  # of their owners so the caller's keep their arrays.
+  if "skins" in gltf:
+    gltf["skins"] = [dict(skin) for skin in gltf["skins"]]
+  if "animations" in gltf:
+    gltf["animations"] = [
+      dict(animation, samplers=[dict(s) for s in animation["samplers"]])
+      for animation in gltf["animations"]]
+  if "nodes" in gltf:
+    gltf["nodes"] = [
+      _with_extension(node, INSTANCING, "attributes")
+      if "attributes" in node.get("extensions", {}).get(INSTANCING, {})
+      else node for node in gltf["nodes"]]
+  if "materials" in gltf:
+    gltf["materials"] = [
+      _with_extension(material, RAYTRACING, "shaderRecord")
+      if "shaderRecord" in material.get("extensions", {}).get(RAYTRACING, {})
+      else material for material in gltf["materials"]]
+
+  written = {}
+  for owner, key in loose_accessors(gltf):
+    arr = owner[key]
+    if not isinstance(arr, np.ndarray):
+      continue
+    if id(arr) not in written:
+      view = add_buffer_view(gltf, writer, arr)
+      # Animation inputs must have bounds; the rest get them for free.
+      lo, hi = bounds(arr.reshape(len(arr), -1)) if len(arr) else (None, None)
+      written[id(arr)] = add_accessor(gltf, view, 0, arr, lo, hi, key)
+    owner[key] = written[id(arr)]
+
+SEMANTIC_ORDER = ("POSITION", "NORMAL", "TANGENT", "TEXCOORD", "COLOR",
+                  "JOINTS", "WEIGHTS")
+
+# Attributes whose accessors carry min and max; for _AABB these are the
+# bounds of the primitive's boxes.
+BOUNDED = ("POSITION", "_AABB")
+
+def _semantic_key(semantic):
+  prefix = semantic.split("_")[0]
+  return (SEMANTIC_ORDER.index(prefix) if prefix in SEMANTIC_ORDER
+          else len(SEMANTIC_ORDER), semantic)
+
+def _element_size(arr):
+  return arr.itemsize * (arr.shape[1] if arr.ndim > 1 else 1)
+
+def _normalized(semantic, arr):
+  # Integer vertex attributes come from quantization and are normalized,
+  # except JOINTS which hold node indices.
+  return arr.dtype.kind in 'iu' and not semantic.startswith("JOINTS_")
+
+def _padded_rows(arr, stride):
+  rows = arr.view(np.uint8).reshape(len(arr), -1)
+  if rows.shape[1] == stride:
+    return rows
+  padded = np.zeros((len(arr), stride), dtype=np.uint8)
+  padded[:, :rows.shape[1]] = rows
+  return padded
+
+def _add_planar(gltf, writer, mesh, name, accessors):
+  # All primitives of a mesh share one vertex bufferView per element size,
+  # with each attribute stored as a contiguous run across the primitives.
+  # Elements are padded to 4 bytes, e.g. quantized VEC3 bytes use stride 4.
+  strides = {}
+  for primitive in mesh.primitives:
+    for semantic, arr in primitive.attributes.items():
+      semantics = strides.setdefault(-(-_element_size(arr) // 4) * 4, [])
+      if semantic not in semantics:
+        semantics.append(semantic)
+
+  for stride, semantics in strides.items():
+    runs = []
+    for semantic in semantics:
+      owners = [j for j, p in enumerate(mesh.primitives)
+                if semantic in p.attributes]
+      arrs = [mesh.primitives[j].attributes[semantic] for j in owners]
+      runs.append((semantic, owners,
+                   np.concatenate(arrs) if len(arrs) > 1 else arrs[0]))
+
+    data = np.concatenate([_padded_rows(run, stride) for _, _, run in runs])
+    view = add_buffer_view(gltf, writer, data, stride, ARRAY_BUFFER,
+                           name if len(strides) == 1 else
+                           "{}_{}".format(name, stride))
+
+    runOffset = 0
+    for semantic, owners, run in runs:
+      counts = np.array([mesh.primitives[j].vertex_count for j in owners])
+      starts = np.cumsum(counts) - counts
+      lo, hi = bounds(run, starts) if semantic in BOUNDED else (None, None)
+
+      for k, (j, start) in enumerate(zip(owners, starts.tolist())):
+        accessors[j][semantic] = (view, runOffset + start * stride,
+                                  None if lo is None else lo[k],
+                                  None if hi is None else hi[k])
+
+      runOffset += len(run) * stride
+
+def _add_interleaved(gltf, writer, mesh, name, accessors):
+  # Primitives with the same vertex format share one strided bufferView;
+  # every attribute starts on a 4-byte boundary within the vertex.
+  formats = {}
+  for j, primitive in enumerate(mesh.primitives):
+    semantics = sorted(primitive.attributes, key=_semantic_key)
+    key = tuple((s, primitive.attributes[s].dtype.str,
+                 _element_size(primitive.attributes[s])) for s in semantics)
+    formats.setdefault(key, []).append(j)
+
+  for n, (key, owners) in enumerate(formats.items()):
+    offsets = []
+    stride = 0
+    for _, _, size in key:
+      offsets.append(stride)
+      stride += -(-size // 4) * 4
+
+    counts = np.array([mesh.primitives[j].vertex_count for j in owners])
+    starts = np.cumsum(counts) - counts
+    data = np.zeros((counts.sum(), stride), dtype=np.uint8)
+
+    for (semantic, _, size), offset in zip(key, offsets):
+      run = np.concatenate([mesh.primitives[j].attributes[semantic]
+                            for j in owners])
+      data[:, offset:offset + size] = run.view(np.uint8).reshape(len(run), -1)
+      lo, hi = bounds(run, starts) if semantic in BOUNDED else (None, None)
+
+      for k, (j, start) in enumerate(zip(owners, starts.tolist())):
+        accessors[j][semantic] = (len(gltf["bufferViews"]),
+                                  offset + start * stride,
+                                  None if lo is None else lo[k],
+                                  None if hi is None else hi[k])
+
+    add_buffer_view(gltf, writer, data, stride, ARRAY_BUFFER,
+                    name if len(formats) == 1 else "{}_{}".format(name, n))
+
+def _geometry(primitive):
+  return id(primitive.attributes), id(primitive.indices)
+
+def add_mesh(gltf, writer, mesh, layout="planar", written=None):
+  # Primitives whose attribute dict and indices were already written through
+  # the same `written` map (instances with another material) reuse their
+  # accessors instead of writing the geometry again.
+  from bake.mesh import Mesh
+
+  written = {} if written is None else written
+  i = len(gltf["meshes"])
+  name = mesh.name if mesh.name is not None else "mesh{}".format(i)
+  fresh = []
+  seen = set(written)
+  for j, p in enumerate(mesh.primitives):
+    if _geometry(p) not in seen:
+      seen.add(_geometry(p))
+      fresh.append(j)
+  encoded = Mesh([mesh.primitives[j] for j in fresh])
+  accessors = [{} for _ in fresh]
+
+  if fresh and layout == "interleaved":
+    _add_interleaved(gltf, writer, encoded, name, accessors)
+  elif fresh:
+    _add_planar(gltf, writer, encoded, name, accessors)
+
+  indexed = [k for k, p in enumerate(encoded.primitives)
+             if p.indices is not None]
+  if indexed:
+    # Indices are concatenated in place so each accessor keeps its own type.
+    offsets = []
+    chunks = []
+    byteLength = 0
+    for k in indexed:
+      indices = np.ascontiguousarray(encoded.primitives[k].indices)
+      pad = -byteLength % indices.itemsize
+      chunks.append(np.zeros(pad, dtype=np.uint8))
+      offsets.append(byteLength + pad)
+      chunks.append(indices.view(np.uint8))
+      byteLength += pad + indices.nbytes
+
+    view = add_buffer_view(gltf, writer, np.concatenate(chunks), None,
+                           ELEMENT_ARRAY_BUFFER, name + "_indices")
+    for k, offset in zip(indexed, offsets):
+      accessors[k]["indices"] = (view, offset, None, None)
+
+  for k, (j, p) in enumerate(zip(fresh, encoded.primitives)):
+    geometry = { "attributes": {} }
+    for semantic, arr in p.attributes.items():
+      view, offset, lo, hi = accessors[k][semantic]
+      geometry["attributes"][semantic] = add_accessor(
+        gltf, view, offset, arr, lo, hi,
+        "{}_prim{}_{}".format(name, j, semantic.lower()),
+        _normalized(semantic, arr))
+    if p.indices is not None:
+      view, offset, _, _ = accessors[k]["indices"]
+      geometry["indices"] = add_accessor(
+        gltf, view, offset, p.indices,
+        name="{}_prim{}_indices".format(name, j))
+    written[_geometry(p)] = geometry
+
+  primitives = []
+  for p in mesh.primitives:
+    geometry = written[_geometry(p)]
+    primitive = { "attributes": dict(geometry["attributes"]) }
+    if "indices" in geometry:
+      primitive["indices"] = geometry["indices"]
+    # Procedural _AABB boxes have no topology; any mode would claim one.
+    if "_AABB" not in p.attributes:
+      primitive["mode"] = p.mode
+    if p.material is not None:
+      primitive["material"] = p.material
+    if p.extras:
+      primitive["extras"] = p.extras
+    primitives.append(primitive)
+
+  gltf["meshes"].append({ "primitives": primitives, "name": name })
+  return i
+
+def node_matrix(node):
+  if "matrix" in node:
+    return np.array(node["matrix"], dtype=np.float64).reshape(4, 4).T
+
+  t = np.eye(4)
+  t[:3, 3] = node.get("translation", [0, 0, 0])
+  x, y, z, w = node.get("rotation", [0, 0, 0, 1])
+  r = np.eye(4)
+  r[:3, :3] = [
+    [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+    [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+    [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)]
+  ]
+  s = np.diag(list(node.get("scale", [1, 1, 1])) + [1])
+  return t @ r @ s
+
+def set_node_matrix(node, matrix):
+  for key in ("translation", "rotation", "scale"):
+    node.pop(key, None)
+  if np.allclose(matrix, np.eye(4)):
+    node.pop("matrix", None)
+  else:
+    node["matrix"] = matrix.T.ravel().tolist()
+
+def transform_mesh_nodes(gltf, targets):
+  # targets[i] is the (mesh, matrix) that replaces mesh i: every node using
+  # mesh i now uses the new mesh with the matrix folded into its transform.
+  # A node with children hands its mesh to a new child so the children are
+  # unaffected.
+  nodes = gltf.setdefault("nodes", [])
+  for node in list(nodes):
+    if "mesh" not in node:
+      continue
+    mesh, matrix = targets[node["mesh"]]
+    if INSTANCING in node.get("extensions", {}) and \
+       not np.allclose(matrix, np.eye(4)):
+      raise ValueError("cannot transform the mesh of an {} node".format(
+        INSTANCING))
+    if node.get("children") and not np.allclose(matrix, np.eye(4)):
+      node.pop("mesh")
+      node["children"].append(len(nodes))
+      nodes.append({ "mesh": mesh })
+      set_node_matrix(nodes[-1], matrix)
+      # Mesh LODs (MSFT_lod) stand in for the mesh, so they move with it.
+      lod = node.get("extensions", {}).pop("MSFT_lod", None)
+      if lod:
+        nodes[-1]["extensions"] = { "MSFT_lod": lod }
+        nodes[-1]["extras"] = {
+          "MSFT_screencoverage": node["extras"].pop("MSFT_screencoverage")
+        }
+        for key in ("extensions", "extras"):
+          if not node[key]:
+            del node[key]
+    else:
+      node["mesh"] = mesh
+      set_node_matrix(node, node_matrix(node) @ matrix)
+
+def add_extension(gltf, name, required=False):
+  keys = ("extensionsUsed", "extensionsRequired") if required \
+         else ("extensionsUsed",)
+  for key in keys:
+    extensions = gltf.setdefault(key, [])
+    if name not in extensions:
+      extensions.append(name)
+
+def read_uri(uri, base_dir):
+  if uri.startswith("data:"):
+    return base64.b64decode(uri[uri.index(",") + 1:])
+  with open(os.path.join(base_dir, uri), 'rb') as fh:
+    return fh.read()
+
+def read(path):
+  with open(path, 'rb') as fh:
+    data = fh.read()
+
+  binChunk = None
+  if data[:4] == struct.pack('<I', GLB_MAGIC):
+    _, version, length = struct.unpack_from('<3I', data)
+    jsonLength, chunkType = struct.unpack_from('<2I', data, 12)
+    if version != 2 or chunkType != GLB_CHUNK_JSON:
+      raise ValueError("{}: unsupported GLB container".format(path))
+    gltf = json.loads(data[20:20 + jsonLength].decode('utf-8'))
+    if 20 + jsonLength + 8 <= length:
+      binLength, chunkType = struct.unpack_from('<2I', data, 20 + jsonLength)
+      if chunkType == GLB_CHUNK_BIN:
+        binChunk = data[28 + jsonLength:28 + jsonLength + binLength]
+  else:
+    gltf = json.loads(data.decode('utf-8'))
+
+  base_dir = os.path.dirname(path)
+  buffers = []
+  for buffer in gltf.get("buffers", []):
+    if "uri" in buffer:
+      buffers.append(read_uri(buffer["uri"], base_dir))
+    elif binChunk is not None and not buffers:
+      buffers.append(binChunk)
+    else:
+      raise ValueError("{}: buffer with no uri".format(path))
+
+  return gltf, buffers
+
+def accessor_data(gltf, buffers, index):
+  accessor = gltf["accessors"][index]
+  if "sparse" in accessor:
+    raise ValueError("sparse accessor {} is not supported".format(index))
+
+  dtype = COMPONENT_DTYPES[accessor["componentType"]]
+  components = TYPE_COMPONENTS[accessor["type"]]
+  shape = (accessor["count"], components)
+  if "bufferView" not in accessor:
+    arr = np.zeros(shape, dtype=dtype)
+  else:
+    view = gltf["bufferViews"][accessor["bufferView"]]
+    stride = view.get("byteStride", dtype.itemsize * components)
+    arr = np.ascontiguousarray(np.ndarray(
+      shape, dtype, buffers[view["buffer"]],
+      view.get("byteOffset", 0) + accessor.get("byteOffset", 0),
+      (stride, dtype.itemsize)))
+
+  return arr.ravel() if components == 1 else arr
+
+def decode(gltf, buffers):
+  from bake.mesh import Mesh, Primitive
+
+  meshes = []
+  for mesh in gltf.get("meshes", []):
+    primitives = []
+    for primitive in mesh["primitives"]:
+      if "targets" in primitive:
+        raise ValueError("morph targets are not supported")
+      attributes = {}
+      for semantic, index in primitive["attributes"].items():
+        arr = accessor_data(gltf, buffers, index)
+        if _normalized(semantic, arr) and \
+           not gltf["accessors"][index].get("normalized", False):
+          arr = arr.astype(np.float32)
+        attributes[semantic] = arr
+      indices = accessor_data(gltf, buffers, primitive["indices"]) \
+                if "indices" in primitive else None
+      primitives.append(Primitive(attributes, indices,
+                                  primitive.get("mode", TRIANGLES),
+                                  primitive.get("material"),
+                                  primitive.get("extras")))
+    meshes.append(Mesh(primitives, mesh.get("name")))
+
+  # Data that meshes do not reference stays with its owners as arrays, the
+  # same array wherever one accessor is referenced twice. Normalized
+  # integers are decoded to floats since the accessor is not kept.
+  arrays = {}
+  for owner, key in loose_accessors(gltf):
+    index = owner[key]
+    if index not in arrays:
+      arr = accessor_data(gltf, buffers, index)
+      if gltf["accessors"][index].get("normalized", False):
+        arr = np.maximum(arr / np.iinfo(arr.dtype).max, -1).astype(np.float32)
+      arrays[index] = arr
+    owner[key] = arrays[index]
+
+  # Images stored in bufferViews or data URIs keep their bytes, as a uint8
+  # array in place of the bufferView, until save() writes them back.
+  for image in gltf.get("images", []):
+    if "bufferView" in image:
+      view = gltf["bufferViews"][image["bufferView"]]
+      start = view.get("byteOffset", 0)
+      data = buffers[view["buffer"]][start:start + view["byteLength"]]
+      image["bufferView"] = np.frombuffer(data, dtype=np.uint8)
+    elif image.get("uri", "").startswith("data:"):
+      uri = image.pop("uri")
+      image["mimeType"] = uri[5:uri.index(",")].split(";")[0]
+      image["bufferView"] = np.frombuffer(read_uri(uri, None),
+                                          dtype=np.uint8)
+
+  for key in ("accessors", "bufferViews", "buffers", "meshes"):
+    gltf.pop(key, None)
+
+  return gltf, meshes
+
+def load(path):
+  return decode(*read(path))
+
+def write_glb(fh, gltf, binFile, binLength):
+  # Both chunks are padded to 4 bytes: JSON with spaces, BIN with zeros.
+  data = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+  data += b' ' * (-len(data) % 4)
+  binPad = -binLength % 4
+
+  length = 12 + 8 + len(data)
+  if binLength:
+    length += 8 + binLength + binPad
+
+  fh.write(struct.pack('<3I', GLB_MAGIC, 2, length))
+  fh.write(struct.pack('<2I', len(data), GLB_CHUNK_JSON))
+  fh.write(data)
+  if binLength:
+    fh.write(struct.pack('<2I', binLength + binPad, GLB_CHUNK_BIN))
+    shutil.copyfileobj(binFile, fh)
+    fh.write(bytes(binPad))
+
+def write(path, gltf, data):
+  # Writes a glTF whose first buffer holds data, as GLB or .gltf with .bin.
+  # Any further buffers are sidecar files the caller wrote and are kept.
+  others = gltf.get("buffers", [])[1:]
+  if not data and not others:
+    gltf.pop("buffers", None)
+  if os.path.splitext(path)[1] == ".glb":
+    if data or others:
+      gltf["buffers"] = [{ "byteLength": len(data) }] + others
+    with open(path, 'wb') as fh:
+      write_glb(fh, gltf, io.BytesIO(data), len(data))
+    return
+
+  if data:
+    uri = os.path.splitext(os.path.basename(path))[0] + ".bin"
+    gltf["buffers"] = [{ "byteLength": len(data), "uri": uri }] + others
+    with open(os.path.join(os.path.dirname(path), uri), 'wb') as fh:
+      fh.write(data)
+
+  with open(path, 'w') as fh:
+    json.dump(gltf, fh, indent=2)
+
+def tables_path(path, name):
+  return os.path.splitext(path)[0] + "." + name + ".bin"
+
+def write_tables(path, name, tables):
+  # Stores per-primitive tables of arrays, a list per mesh of a dict of
+  # arrays or None per primitive, in a further buffer, path's .<name>.bin,
+  # and points each primitive's extras.HEV.<name> at their bufferViews and
+  # the length of the first array. Tables shared by primitives are written
+  # once.
+  gltf, buffers = read(path)
+  buffer = len(gltf.get("buffers", []))
+  uri = os.path.basename(tables_path(path, name))
+  written = {}
+  with open(tables_path(path, name), 'wb') as fh:
+    writer = BufferWriter(fh)
+    for mesh, mesh_tables in zip(gltf.get("meshes", []), tables):
+      for primitive, table in zip(mesh["primitives"], mesh_tables):
+        if table is None:
+          continue
+        if id(table) not in written:
+          written[id(table)] = { "count": len(next(iter(table.values()))) }
+          for key, arr in table.items():
+            view = add_buffer_view(gltf, writer, arr, name=key)
+            gltf["bufferViews"][view]["buffer"] = buffer
+            written[id(table)][key] = view
+        extras = primitive.setdefault("extras", {})
+        extras.setdefault("HEV", {})[name] = written[id(table)]
+    gltf.setdefault("buffers", []).append({ "byteLength": writer.byteLength,
+                                            "uri": uri })
+  write(path, gltf, buffers[0] if buffers else b'')
+
+def image_paths(path):
+  # The image files save() writes next to a .gltf.
+  return sorted(glob.glob(glob.escape(os.path.splitext(path)[0]) +
+                          ".image*"))
+
+def _add_images(gltf, writer, path=None):
+  # Writes the image bytes decode() kept into the buffer, or with a path
+  # (for .gltf output) as files next to it, since the loader reads image
+  # URIs as file paths rather than data URIs.
+  images = []
+  for i, image in enumerate(gltf.get("images", [])):
+    data = image.get("bufferView")
+    if isinstance(data, np.ndarray):
+      image = dict(image)
+      if path is None:
+        image["bufferView"] = add_buffer_view(gltf, writer, data)
+      else:
+        del image["bufferView"]
+        image["uri"] = "{}.image{}{}".format(
+          os.path.splitext(os.path.basename(path))[0], i,
+          mimetypes.guess_extension(image["mimeType"]) or ".bin")
+        with open(os.path.join(os.path.dirname(path), image["uri"]),
+                  'wb') as fh:
+          fh.write(data.tobytes())
+    images.append(image)
+  if images:
+    gltf["images"] = images
+
+def save(path, gltf, meshes, layout="planar"):
+  gltf = dict(gltf, accessors=[], bufferViews=[], buffers=[], meshes=[])
+
+  if os.path.splitext(path)[1] == ".glb":
+    # Encode into a temporary file first since the JSON chunk, which
+    # describes the buffer, must precede the BIN chunk.
+    with tempfile.TemporaryFile() as binFile:
+      writer = BufferWriter(binFile)
+      written = {}
+      for mesh in meshes:
+        add_mesh(gltf, writer, mesh, layout, written)
+      _add_loose_accessors(gltf, writer)
+      _add_images(gltf, writer)
+      gltf["buffers"].append({ "byteLength": writer.byteLength })
+
+      binFile.seek(0)
+      with open(path, 'wb') as fh:
+        write_glb(fh, gltf, binFile, writer.byteLength)
+    return
+
+  uri = os.path.splitext(os.path.basename(path))[0] + ".bin"
+
+  with open(os.path.join(os.path.dirname(path), uri), 'wb') as fh:
+    writer = BufferWriter(fh)
+    written = {}
+    for mesh in meshes:
+      add_mesh(gltf, writer, mesh, layout, written)
+    _add_loose_accessors(gltf, writer)
+    _add_images(gltf, writer, path)
+    gltf["buffers"].append({ "byteLength": writer.byteLength, "uri": uri })
+
+  with open(path, 'w') as fh:
+    json.dump(gltf, fh, indent=2)
@@ -0,0 +1,290 @@
+import itertools
+
+import numpy as np
+
+from bake.gltf import (TRIANGLES, TRIANGLE_STRIP, TRIANGLE_FAN,
+                       instanced_meshes, transform_mesh_nodes)
+from bake.mesh import Mesh, Primitive, triangulate
+
+# Attributes that rotate with the geometry; the rest must match as stored.
+DIRECTIONS = ("NORMAL", "TANGENT")
+
+# Default angle in degrees normals and tangents of instances may differ by.
+ANGLE = 0.1
+
+def _layout(mesh):
+  # What two meshes must share to be compared: per primitive the triangle
+  # count (the vertex count for points and lines) and the attribute types.
+  layout = []
+  for p in mesh.primitives:
+    triangles = _triangles(p)
+    layout.append((p.vertex_count if triangles is None else -len(triangles),
+                   tuple((s, a.dtype.str, a.shape[1:])
+                         for s, a in sorted(p.attributes.items()))))
+  return tuple(layout)
+
+def _positions(mesh):
+  return np.concatenate([p.attributes["POSITION"]
+                         for p in mesh.primitives]).astype(np.float64)
+
+def frame(points):
+  # Principal axes in ascending variance, each oriented so the third moment
+  # of the points along it is positive, and made right-handed by flipping
+  # the least skewed axis.
+  center = points.mean(axis=0)
+  centered = points - center
+  variance, axes = np.linalg.eigh(centered.T @ centered / len(points))
+  skew = ((centered @ axes) ** 3).sum(axis=0)
+  axes = axes * np.where(skew < 0, -1.0, 1.0)
+  if np.linalg.det(axes) < 0:
+    axes[:, np.argmin(np.abs(skew))] *= -1
+  return center, np.sqrt(np.maximum(variance, 0)), axes
+
+def _kabsch(src, dst):
+  # Least-squares rotation and translation taking src onto dst, as a 4x4
+  # matrix acting on column vectors.
+  cs = src.mean(axis=0)
+  cd = dst.mean(axis=0)
+  u, _, vt = np.linalg.svd((src - cs).T @ (dst - cd))
+  r = (u * [1, 1, np.sign(np.linalg.det(u @ vt))]) @ vt
+  matrix = np.eye(4)
+  matrix[:3, :3] = r.T
+  matrix[:3, 3] = cd - cs @ r
+  return matrix
+
+def _rotations(a, b, cell):
+  # Candidate rotations taking a's PCA frame onto b's. Third-moment signs
+  # vanish for symmetric shapes, so every proper sign flip is tried. When two
+  # spreads agree the frame only fixes the distinct axis; the angle about it
+  # is found by mapping a's vertex farthest from the axis onto each vertex
+  # of b at the same height and distance.
+  ca, sa, axes_a = frame(a)
+  cb, sb, axes_b = frame(b)
+  equal = np.diff(sa) <= 1e-3 * sa[-1]
+  if equal.all():
+    return  # no preferred axes
+
+  if not equal.any():
+    for signs in ([1, 1, 1], [1, -1, -1], [-1, 1, -1], [-1, -1, 1]):
+      yield ca, cb, (axes_b * signs) @ axes_a.T
+    return
+
+  k = 2 if equal[0] else 0
+  da = a - ca
+  db = b - cb
+  ua = axes_a[:, k]
+  radial = da - np.outer(da @ ua, ua)
+  distance = np.linalg.norm(radial, axis=1)
+  anchor = np.argmax(distance)
+  if distance[anchor] <= cell:
+    return
+  ea = radial[anchor] / distance[anchor]
+  fa = np.stack([ua, ea, np.cross(ua, ea)], axis=1)
+
+  for sign in (1, -1):
+    ub = axes_b[:, k] * sign
+    height = db @ ub
+    radial = db - np.outer(height, ub)
+    distance_b = np.linalg.norm(radial, axis=1)
+    picks = np.flatnonzero(
+      (np.abs(height - da[anchor] @ ua) <= cell) &
+      (np.abs(distance_b - distance[anchor]) <= cell))
+    for j in picks:
+      eb = radial[j] / distance_b[j]
+      yield ca, cb, np.stack([ub, eb, np.cross(ub, eb)], axis=1) @ fa.T
+
+def _cell_keys(grid):
+  return grid[:, 0] * 73856093 ^ grid[:, 1] * 19349663 ^ grid[:, 2] * 83492791
+
+def _nearest(src, dst):
+  # Index of the nearest row of dst for each row of src, looking only at dst
+  # rows whose first three columns fall in the unit grid cells around the
+  # src row (-1 if there are none).
+  keys = _cell_keys(np.floor(dst[:, :3]).astype(np.int64))
+  order = np.argsort(keys, kind='stable')
+  keys = keys[order]
+  cells = np.floor(src[:, :3]).astype(np.int64)
+
+  best = np.full(len(src), np.inf)
+  nearest = np.full(len(src), -1, dtype=np.intp)
+  for offset in itertools.product((-1, 0, 1), repeat=3):
+    key = _cell_keys(cells + offset)
+    lo = np.searchsorted(keys, key, 'left')
+    hi = np.searchsorted(keys, key, 'right')
+    for step in range((hi - lo).max(initial=0)):
+      rows = np.flatnonzero(lo + step < hi)
+      candidates = order[lo[rows] + step]
+      distance = ((src[rows] - dst[candidates]) ** 2).sum(axis=1)
+      closer = distance < best[rows]
+      best[rows[closer]] = distance[closer]
+      nearest[rows[closer]] = candidates[closer]
+  return nearest
+
+def _triangles(primitive):
+  # The primitive's triangles as rows of vertex indices, or None for points
+  # and lines.
+  if primitive.mode not in (TRIANGLES, TRIANGLE_STRIP, TRIANGLE_FAN):
+    return None
+  if primitive.indices is None or primitive.mode != TRIANGLES:
+    primitive = triangulate(primitive)
+  return primitive.indices.astype(np.intp).reshape(-1, 3)
+
+def _canonical(triangles):
+  # Each triangle rotated to start at its smallest index, keeping the
+  # winding, and the order sorting them: (rows, order, shift).
+  shift = np.argmin(triangles, axis=1)
+  rows = np.arange(len(triangles))[:, None]
+  rolled = triangles[rows, (shift[:, None] + np.arange(3)) % 3]
+  order = np.lexsort(rolled.T[::-1])
+  return rolled[order], order, shift[order]
+
+def _corners(a, b, ca, cb, rotation, cell):
+  # Per primitive, the vertex of b at each triangle corner of a once a is
+  # moved by the rotation, as (a's vertices, b's vertices) arrays, if the
+  # triangles match up. Vertices sharing a position are one point here, so
+  # neither the vertex order nor how the meshes were split into vertices
+  # matters; the triangles must match as unordered sets of point triples.
+  corners = []
+  for pa, pb in zip(a.primitives, b.primitives):
+    ta, tb = _triangles(pa), _triangles(pb)
+    points_a, inverse_a = np.unique(pa.attributes["POSITION"], axis=0,
+                                    return_inverse=True)
+    points_b, inverse_b = np.unique(pb.attributes["POSITION"], axis=0,
+                                    return_inverse=True)
+    if len(points_a) != len(points_b):
+      return None
+
+    moved = (points_a.astype(np.float64) - ca) @ rotation.T + cb
+    order = _nearest(moved / cell, points_b.astype(np.float64) / cell)
+    if (order < 0).any() or len(np.unique(order)) != len(order):
+      return None
+
+    rows_a, triangles_a, shift_a = _canonical(order[inverse_a.ravel()][ta])
+    rows_b, triangles_b, shift_b = _canonical(inverse_b.ravel()[tb])
+    if not np.array_equal(rows_a, rows_b):
+      return None
+
+    corner = np.arange(3)
+    corners.append((ta[triangles_a[:, None], (shift_a[:, None] + corner) % 3],
+                    tb[triangles_b[:, None], (shift_b[:, None] + corner) % 3]))
+  return corners
+
+def _stored_corners(a, b):
+  # Vertices paired in stored order, when both meshes index them alike.
+  if not all(np.array_equal(pa.indices, pb.indices) and
+             pa.vertex_count == pb.vertex_count
+             for pa, pb in zip(a.primitives, b.primitives)):
+    return None
+  return [(np.arange(pa.vertex_count), np.arange(pa.vertex_count))
+          for pa in a.primitives]
+
+def _candidates(a, b, cell):
+  # Vertex correspondences worth a rigid fit: stored order first, then one
+  # per PCA frame alignment of the meshes' distinct points.
+  stored = _stored_corners(a, b)
+  if stored is not None:
+    yield stored
+  if any(_triangles(p) is None for p in a.primitives):
+    return
+  points_a = np.unique(_positions(a), axis=0)
+  points_b = np.unique(_positions(b), axis=0)
+  if len(points_a) != len(points_b):
+    return
+  for ca, cb, rotation in _rotations(points_a, points_b, cell * 10):
+    corners = _corners(a, b, ca, cb, rotation, cell * 10)
+    if corners is not None:
+      yield corners
+
+def _fit(a, b, corners, tolerance, angle):
+  # The rigid transform taking a's vertices onto their b partners, if every
+  # position lands within tolerance, directions within angle radians and
+  # other attributes match exactly.
+  src = np.concatenate([pa.attributes["POSITION"][va]
+                        for pa, (va, _) in zip(a.primitives, corners)])
+  dst = np.concatenate([pb.attributes["POSITION"][vb]
+                        for pb, (_, vb) in zip(b.primitives, corners)])
+  src = src.reshape(-1, 3).astype(np.float64)
+  dst = dst.reshape(-1, 3).astype(np.float64)
+  matrix = _kabsch(src, dst)
+  moved = src @ matrix[:3, :3].T + matrix[:3, 3]
+  if np.abs(moved - dst).max() > tolerance:
+    return None
+
+  for pa, pb, (va, vb) in zip(a.primitives, b.primitives, corners):
+    for semantic, arr in pa.attributes.items():
+      if semantic == "POSITION":
+        continue
+      mine, other = arr[va], pb.attributes[semantic][vb]
+      if semantic in DIRECTIONS and arr.dtype.kind == 'f':
+        rotated = mine[..., :3] @ matrix[:3, :3].T
+        cosine = (rotated * other[..., :3]).sum(axis=-1) / np.maximum(
+          np.linalg.norm(rotated, axis=-1) *
+          np.linalg.norm(other[..., :3], axis=-1), 1e-30)
+        if (cosine < np.cos(angle)).any() or \
+           not np.array_equal(mine[..., 3:], other[..., 3:]):
+          return None
+      elif not np.array_equal(mine, other):
+        return None
+  return matrix
+
+def match(a, b, tolerance=1e-4, angle=ANGLE):
+  # Returns the rigid transform taking mesh a onto mesh b, or None.
+  # Positions must agree within tolerance times a's radius, and normals and
+  # tangents within angle degrees. Triangle meshes are compared as sets of
+  # triangles, aligned through their PCA frames when the stored vertex order
+  # does not line up.
+  if any(pa.extras != pb.extras for pa, pb in zip(a.primitives,
+                                                  b.primitives)):
+    return None
+
+  points = _positions(a)
+  cell = tolerance * max(np.abs(points - points.mean(axis=0)).max(), 1e-30)
+  for corners in _candidates(a, b, cell):
+    matrix = _fit(a, b, corners, cell, np.radians(angle))
+    if matrix is not None:
+      return matrix
+  return None
+
+def instance(gltf, meshes, tolerance=1e-4, angle=ANGLE):
+  # Replace meshes that are rigid transforms of an earlier mesh with that
+  # mesh, moving the transform into the nodes that reference them. When the
+  # materials differ the copy keeps its own mesh but shares the geometry, so
+  # the writer emits the vertex and index data once. Meshes drawn by
+  # EXT_mesh_gpu_instancing nodes keep their own transform-free geometry.
+  instanced = instanced_meshes(gltf)
+  representatives = {}
+  targets = []
+  result = []
+  shared = {}
+
+  for i, mesh in enumerate(meshes):
+    if not mesh.primitives or \
+       not all("POSITION" in p.attributes for p in mesh.primitives):
+      targets.append((len(result), np.eye(4)))
+      result.append(mesh)
+      continue
+
+    candidates = representatives.setdefault(_layout(mesh), [])
+    for r, index in candidates if i not in instanced else ():
+      matrix = match(meshes[r], mesh, tolerance, angle)
+      if matrix is not None:
+        break
+    else:
+      candidates.append((i, len(result)))
+      targets.append((len(result), np.eye(4)))
+      result.append(mesh)
+      continue
+
+    key = (r, tuple(p.material for p in mesh.primitives))
+    if key[1] != tuple(p.material for p in meshes[r].primitives) and \
+       key not in shared:
+      shared[key] = len(result)
+      result.append(Mesh([Primitive(pr.attributes, pr.indices, pr.mode,
+                                    p.material, pr.extras)
+                          for pr, p in zip(meshes[r].primitives,
+                                           mesh.primitives)],
+                         mesh.name))
+    targets.append((shared.get(key, index), matrix))
+
+  transform_mesh_nodes(gltf, targets)
+  return result
@@ -0,0 +1,108 @@
+import json
+
+import numpy as np
+
+from bake.gltf import TRIANGLES, TRIANGLE_STRIP, TRIANGLE_FAN
+
+class Primitive:
+  def __init__(self, attributes, indices=None, mode=TRIANGLES, material=None,
+               extras=None):
+    self.attributes = attributes
+    self.indices = indices
+    self.mode = mode
+    self.material = material
+    self.extras = extras
+
+  @property
+  def vertex_count(self):
+    return len(next(iter(self.attributes.values())))
+
+  @property
+  def triangle_count(self):
+    count = self.vertex_count if self.indices is None else len(self.indices)
+    if self.mode == TRIANGLES:
+      return count // 3
+    return max(count - 2, 0)
+
+class Mesh:
+  def __init__(self, primitives, name=None):
+    self.primitives = primitives
+    self.name = name
+
+def strip_indices(counts):
+  counts = np.asarray(counts, dtype=np.intp)
+  ntris = np.maximum(counts - 2, 0)
+  starts = np.cumsum(counts) - counts
+  first = np.cumsum(ntris) - ntris
+  local = np.arange(ntris.sum()) - np.repeat(first, ntris)
+  base = np.repeat(starts, ntris) + local
+  # Odd triangles swap their last two vertices to keep a consistent winding.
+  odd = local & 1
+  return np.stack((base, base + 1 + odd, base + 2 - odd), axis=1).ravel()
+
+def fan_indices(count):
+  i = np.arange(1, max(count - 1, 1), dtype=np.intp)
+  return np.stack((np.zeros_like(i), i, i + 1), axis=1).ravel()
+
+def drop_degenerate(indices):
+  t = indices.reshape(-1, 3)
+  keep = (t[:, 0] != t[:, 1]) & (t[:, 1] != t[:, 2]) & (t[:, 0] != t[:, 2])
+  return t[keep].ravel()
+
+def index_type(vertex_count):
+  return np.uint16 if vertex_count <= 0xFFFF else np.uint32
+
+def triangulate(primitive):
+  count = primitive.vertex_count if primitive.indices is None \
+          else len(primitive.indices)
+
+  if primitive.mode == TRIANGLES:
+    indices = np.arange(count - count % 3, dtype=np.intp)
+  elif primitive.mode == TRIANGLE_STRIP:
+    indices = strip_indices([count])
+  elif primitive.mode == TRIANGLE_FAN:
+    indices = fan_indices(count)
+  else:
+    raise ValueError("cannot triangulate mode {}".format(primitive.mode))
+
+  if primitive.indices is not None:
+    indices = drop_degenerate(np.asarray(primitive.indices)[indices])
+
+  return Primitive(primitive.attributes,
+                   indices.astype(index_type(primitive.vertex_count)),
+                   TRIANGLES, primitive.material, primitive.extras)
+
+def merge_by_material(primitives):
+  groups = {}
+  merged = []
+  for primitive in primitives:
+    if "_AABB" in primitive.attributes:
+      merged.append(primitive)  # procedural, nothing to triangulate
+      continue
+    # Primitives only merge when their extras agree, so none are lost.
+    key = (primitive.material, tuple(primitive.attributes),
+           json.dumps(primitive.extras, sort_keys=True))
+    groups.setdefault(key, []).append(primitive)
+
+  for group in groups.values():
+    attributes = {
+      semantic: np.concatenate([p.attributes[semantic] for p in group])
+      for semantic in group[0].attributes
+    }
+    vertex_count = len(next(iter(attributes.values())))
+
+    if all(p.mode == TRIANGLE_STRIP and p.indices is None for p in group):
+      indices = strip_indices([p.vertex_count for p in group])
+    else:
+      indices = []
+      offset = 0
+      for p in group:
+        indices.append(triangulate(p).indices.astype(np.intp) + offset)
+        offset += p.vertex_count
+      indices = np.concatenate(indices)
+
+    merged.append(Primitive(attributes,
+                            indices.astype(index_type(vertex_count)),
+                            TRIANGLES, group[0].material, group[0].extras))
+
+  return merged
@@ -0,0 +1,145 @@
+import numpy as np
+
+from bake.bounds import decoded_positions
+from bake.gltf import TRIANGLES, tables_path, write_tables
+
+MAX_VERTICES = 64
+MAX_TRIANGLES = 124
+
+def sidecar_path(path):
+  return tables_path(path, "meshlets")
+
+def partition(indices, vertex_count, max_vertices=MAX_VERTICES,
+              max_triangles=MAX_TRIANGLES):
+  # Splits the triangles, in their current order, into runs that use at most
+  # max_vertices distinct vertices and max_triangles triangles. Clusters
+  # follow the triangle order, so a vertex cache ordering (--vcache) keeps
+  # them compact. Returns the number of triangles in each cluster.
+  stamps = [-1] * vertex_count
+  counts = []
+  cluster = vertices = triangles = 0
+  for a, b, c in np.asarray(indices).reshape(-1, 3).tolist():
+    new = (stamps[a] != cluster) + (stamps[b] != cluster) + \
+          (stamps[c] != cluster)
+    if vertices + new > max_vertices or triangles == max_triangles:
+      counts.append(triangles)
+      cluster += 1
+      vertices = triangles = 0
+    for v in (a, b, c):
+      if stamps[v] != cluster:
+        stamps[v] = cluster
+        vertices += 1
+    triangles += 1
+  if triangles:
+    counts.append(triangles)
+  return np.array(counts, dtype=np.intp)
+
+def meshlets(primitive, max_vertices=MAX_VERTICES,
+             max_triangles=MAX_TRIANGLES):
+  # Mesh shader style tables for an indexed TRIANGLES primitive:
+  #   meshlets   uint32 (vertexOffset, vertexCount, triangleOffset,
+  #              triangleCount) per cluster; its triangles are
+  #              triangleCount triangles of the index buffer from
+  #              triangleOffset on, so index ranges cull as well
+  #   vertices   uint32 primitive vertex of each cluster vertex
+  #   triangles  uint8 cluster-local corners, 3 per triangle
+  #   bounds     float32 (center xyz, radius, cone axis xyz, cone cutoff)
+  # A cluster is back facing when
+  #   dot(center - eye, axis) >= cutoff * length(center - eye) + radius.
+  triangles = primitive.indices.astype(np.intp).reshape(-1, 3)
+  counts = partition(triangles, primitive.vertex_count, max_vertices,
+                     max_triangles)
+  starts = np.cumsum(counts) - counts
+  cluster = np.repeat(np.arange(len(counts)), counts)
+
+  # Cluster vertices in order of first use.
+  keys = np.repeat(cluster, 3) * primitive.vertex_count + triangles.ravel()
+  unique, first, local = np.unique(keys, return_index=True,
+                                   return_inverse=True)
+  order = np.lexsort((first, unique // primitive.vertex_count))
+  rank = np.empty_like(order)
+  rank[order] = np.arange(len(order))
+  vertices = (unique[order] % primitive.vertex_count).astype(np.uint32)
+  vertex_counts = np.bincount(unique[order] // primitive.vertex_count,
+                              minlength=len(counts))
+  vertex_starts = np.cumsum(vertex_counts) - vertex_counts
+  local = rank[local.ravel()] - np.repeat(vertex_starts[cluster], 3)
+
+  # Bounding spheres around the bounding box centers.
+  positions = decoded_positions(primitive)
+  points = positions[vertices]
+  lo = np.minimum.reduceat(points, vertex_starts)
+  hi = np.maximum.reduceat(points, vertex_starts)
+  center = (lo + hi) / 2
+  offset = points - np.repeat(center, vertex_counts, axis=0)
+  radius = np.sqrt(np.maximum.reduceat((offset ** 2).sum(axis=1),
+                                       vertex_starts))
+
+  # Normal cones from the face normals; degenerate faces do not count.
+  p = positions[triangles]
+  normal = np.cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+  length = np.linalg.norm(normal, axis=1)
+  normal = np.divide(normal, length[:, None], out=np.zeros_like(normal),
+                     where=length[:, None] > 0)
+  axis = np.add.reduceat(normal, starts)
+  axis_length = np.linalg.norm(axis, axis=1)
+  axis = np.divide(axis, axis_length[:, None], out=np.zeros_like(axis),
+                   where=axis_length[:, None] > 1e-12)
+  dots = np.where(length > 0, (normal * axis[cluster]).sum(axis=1), 1)
+  spread = np.minimum.reduceat(dots, starts)
+  # Cones wider than a hemisphere never cull; a cutoff of 1 never passes.
+  cutoff = np.where((spread > 0) & (axis_length > 1e-12),
+                    np.sqrt(1 - np.minimum(spread, 1) ** 2), 1)
+
+  return {
+    "meshlets": np.stack((vertex_starts, vertex_counts, starts, counts),
+                         axis=1).astype(np.uint32),
+    "vertices": vertices,
+    "triangles": local.reshape(-1, 3).astype(np.uint8),
+    "bounds": np.concatenate((center, radius[:, None], axis,
+                              cutoff[:, None]), axis=1).astype(np.float32)
+  }
+
+def viewpoints(center, radius, distance=3):
+  # Eyes on the 26 directions of a cube around a bounding sphere.
+  d = np.array([(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1)
+                for z in (-1, 0, 1) if (x, y, z) != (0, 0, 0)], dtype=float)
+  d /= np.linalg.norm(d, axis=1)[:, None]
+  return center + d * radius * distance
+
+def culled(table, eyes=None):
+  # Fraction of the triangles in back facing clusters, averaged over the
+  # eyes (default: the viewpoints around the clusters).
+  bounds = table["bounds"].astype(np.float64)
+  counts = table["meshlets"][:, 3]
+  if eyes is None:
+    lo = (bounds[:, :3] - bounds[:, 3:4]).min(axis=0)
+    hi = (bounds[:, :3] + bounds[:, 3:4]).max(axis=0)
+    eyes = viewpoints((lo + hi) / 2, np.linalg.norm(hi - lo) / 2)
+  view = bounds[None, :, :3] - eyes[:, None, :]
+  distance = np.linalg.norm(view, axis=2)
+  back = (view * bounds[None, :, 4:7]).sum(axis=2) >= \
+         bounds[None, :, 7] * distance + bounds[None, :, 3]
+  return float((back * counts).sum() / max(counts.sum() * len(eyes), 1))
+
+def add_meshlets(meshes, max_vertices=MAX_VERTICES,
+                 max_triangles=MAX_TRIANGLES):
+  # Cluster tables for every indexed TRIANGLES primitive with more triangles
+  # than fit one cluster, as a list per mesh of a table or None per
+  # primitive. Primitives sharing geometry share tables.
+  done = {}
+  result = []
+  for mesh in meshes:
+    result.append([])
+    for p in mesh.primitives:
+      key = (id(p.attributes), id(p.indices))
+      if key not in done:
+        done[key] = meshlets(p, max_vertices, max_triangles) \
+                    if p.mode == TRIANGLES and p.indices is not None and \
+                       "POSITION" in p.attributes and \
+                       p.triangle_count > max_triangles else None
+      result[-1].append(done[key])
+  return result
+
+def write_sidecar(path, tables):
+  write_tables(path, "meshlets", tables)
@@ -0,0 +1,130 @@
+# Morton (Z-order) codes of box centroids. Boxes in Morton order are
+# spatially coherent, which speeds up bottom-level acceleration structure
+# builds and keeps traversal coherent at no runtime cost. Codes are 30 bits
+# (10 per axis, uint32) or 63 bits (21 per axis, uint64).
+import tempfile
+
+import numpy as np
+
+from bake.gltf import RAYTRACING
+
+BITS = (30, 63)
+
+def _spread(x, bits):
+  # Moves bit i of x to bit 3i.
+  x = x.astype(np.uint64)
+  if bits == 30:
+    masks = ((16, 0x30000FF), (8, 0x300F00F), (4, 0x30C30C3),
+             (2, 0x9249249))
+  else:
+    masks = ((32, 0x1F00000000FFFF), (16, 0x1F0000FF0000FF),
+             (8, 0x100F00F00F00F00F), (4, 0x10C30C30C30C30C3),
+             (2, 0x1249249249249249))
+  for shift, mask in masks:
+    x = (x | (x << np.uint64(shift))) & np.uint64(mask)
+  return x
+
+def codes(points, lo, hi, bits=30):
+  # Morton codes of points (N, 3) on a grid over the box lo, hi.
+  if bits not in BITS:
+    raise ValueError("Morton codes have 30 or 63 bits, not {}".format(bits))
+  cells = 1 << (bits // 3)
+  points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+  lo = np.asarray(lo, dtype=np.float64)
+  extent = np.asarray(hi, dtype=np.float64) - lo
+  scale = np.divide(cells, extent, out=np.zeros(3), where=extent > 0)
+  grid = np.clip(((points - lo) * scale).astype(np.int64), 0, cells - 1)
+  code = (_spread(grid[:, 0], bits) << np.uint64(2)) | \
+         (_spread(grid[:, 1], bits) << np.uint64(1)) | \
+         _spread(grid[:, 2], bits)
+  return code.astype(np.uint32) if bits == 30 else code
+
+def order(lo, hi, bits=30):
+  # The permutation that sorts boxes lo, hi (N, 3) by the Morton code of
+  # their centroids over the centroids' bounds.
+  centroid = (np.asarray(lo, dtype=np.float64) +
+              np.asarray(hi, dtype=np.float64)) / 2
+  if not len(centroid):
+    return np.zeros(0, dtype=np.intp)
+  return np.argsort(codes(centroid, centroid.min(axis=0),
+                          centroid.max(axis=0), bits), kind='stable')
+
+def sort_boxes(gltf, meshes, bits=30):
+  # Sorts the boxes of every _AABB primitive into Morton order, along with
+  # the entries of its material's shaderRecord that hold one element per
+  # box. Boxes whose material shares such entries with other boxes are left
+  # alone. Returns the number of boxes sorted and left alone.
+  materials = gltf.get("materials", [])
+
+  def records(material):
+    if material is None:
+      return {}
+    return materials[material].get("extensions", {}).get(RAYTRACING, {}) \
+                              .get("shaderRecord", {})
+
+  primitives = [p for mesh in meshes for p in mesh.primitives
+                if "_AABB" in p.attributes]
+  owners = {}
+  for p in primitives:
+    owners.setdefault(p.material, set()).add(id(p.attributes["_AABB"]))
+
+  done = {}
+  moved = kept = 0
+  for p in primitives:
+    key = id(p.attributes)
+    if key not in done:
+      boxes = p.attributes["_AABB"]
+      count = len(boxes) // 2
+      record = records(p.material)
+      per_box = [name for name, arr in record.items()
+                 if isinstance(arr, np.ndarray) and len(arr) == count]
+      if per_box and len(owners[p.material]) > 1:
+        done[key] = p.attributes
+        kept += count
+        continue
+      pairs = boxes.reshape(-1, 2, 3)
+      perm = order(pairs[:, 0], pairs[:, 1], bits)
+      done[key] = dict(p.attributes,
+                       _AABB=np.ascontiguousarray(pairs[perm]).reshape(-1, 3))
+      for name in per_box:
+        record[name] = np.ascontiguousarray(record[name][perm])
+      moved += count
+    p.attributes = done[key]
+  return moved, kept
+
+def sort_chunks(chunks, points, lo, hi, bits=30, buckets=256, directory=None):
+  # Reorders a stream of chunks, dicts of arrays with one row per item, by
+  # the Morton code of points(chunk) over lo, hi in bounded memory. Rows go
+  # to one of buckets (a power of two) spools by the top bits of their
+  # code; each spool is then read back, sorted and yielded as a chunk, so
+  # only the largest bucket is ever resident.
+  shift = np.uint64(bits - (buckets.bit_length() - 1))
+  spools = [tempfile.TemporaryFile(dir=directory) for _ in range(buckets)]
+  dtype = None
+  try:
+    for chunk in chunks:
+      code = codes(points(chunk), lo, hi, bits)
+      if dtype is None:
+        dtype = np.dtype([(name, arr.dtype, arr.shape[1:])
+                          for name, arr in chunk.items()] +
+                         [("_code", code.dtype)])
+      rows = np.empty(len(code), dtype=dtype)
+      for name in chunk:
+        rows[name] = chunk[name]
+      rows["_code"] = code
+      bucket = (code.astype(np.uint64) >> shift).astype(np.intp)
+      rows = rows[np.argsort(bucket, kind='stable')]
+      counts = np.bincount(bucket, minlength=buckets)
+      ends = np.cumsum(counts)
+      for fh, start, end in zip(spools, ends - counts, ends):
+        fh.write(rows[start:end].tobytes())
+
+    for fh in spools:
+      fh.seek(0)
+      rows = np.fromfile(fh, dtype=dtype) if dtype is not None else []
+      if len(rows):
+        rows = rows[np.argsort(rows["_code"], kind='stable')]
+        yield { name: rows[name] for name in dtype.names[:-1] }
+  finally:
+    for fh in spools:
+      fh.close()
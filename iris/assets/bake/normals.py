@@ -0,0 +1,76 @@
+import numpy as np
+
+from bake.gltf import TRIANGLES, TRIANGLE_STRIP, TRIANGLE_FAN
+from bake.mesh import Primitive, index_type, triangulate
+from bake.weld import unique_rows
+
+def _normalize(v):
+  length = np.linalg.norm(v, axis=-1, keepdims=True)
+  return np.divide(v, length, out=np.zeros_like(v), where=length > 1e-20)
+
+def _scatter(index, values, size):
+  return np.stack([np.bincount(index, values[:, k], minlength=size)
+                   for k in range(values.shape[1])], axis=1)
+
+def _finish(normals):
+  # The loader's GenerateNormals leaves NaNs for degenerate faces; point
+  # vertices no face contributed to along +Z instead.
+  normals = _normalize(normals)
+  normals[~normals.any(axis=1), 2] = 1
+  return normals.astype(np.float32)
+
+def _corner_pairs(corners):
+  # Every (i, j) pair of corners that reference the same vertex, i included.
+  order = np.argsort(corners, kind='stable')
+  _, starts, counts = np.unique(corners[order], return_index=True,
+                                return_counts=True)
+  sizes = np.repeat(counts, counts)
+  first = np.repeat(starts, counts)
+  i = np.repeat(order, sizes)
+  offsets = np.arange(len(i)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+  j = order[np.repeat(first, sizes) + offsets]
+  return i, j
+
+def generate_normals(positions, indices, vertex_count, crease=None):
+  # Smooth normals as the sum of the cross products of the faces around a
+  # vertex, so each face is weighted by its area. With a crease angle (in
+  # degrees) a corner only averages faces within the angle of its own face,
+  # and corners that end up with different normals get their own vertex.
+  triangles = np.asarray(indices, dtype=np.intp).reshape(-1, 3)
+  p = positions[triangles].astype(np.float64)
+  face = np.cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+  corners = triangles.ravel()
+
+  if crease is None:
+    normals = _scatter(corners, np.repeat(face, 3, axis=0), vertex_count)
+    return np.arange(vertex_count), _finish(normals), corners
+
+  unit = np.repeat(_normalize(face), 3, axis=0)
+  i, j = _corner_pairs(corners)
+  keep = (unit[i] * unit[j]).sum(axis=1) >= np.cos(np.radians(crease))
+  normals = _finish(_scatter(i[keep], np.repeat(face, 3, axis=0)[j[keep]],
+                             len(corners)))
+
+  keys = np.concatenate((corners[:, None].astype(np.int64),
+                         normals.astype(np.float64).view(np.int64)), axis=1)
+  first, inverse = unique_rows(keys)
+  return corners[first], normals[first], inverse
+
+def add_normals(primitive, crease=None):
+  # Points, lines and procedural (_AABB) primitives have no surface normal.
+  if "NORMAL" in primitive.attributes or \
+     "POSITION" not in primitive.attributes or \
+     primitive.mode not in (TRIANGLES, TRIANGLE_STRIP, TRIANGLE_FAN):
+    return primitive
+  if primitive.mode != TRIANGLES or primitive.indices is None:
+    primitive = triangulate(primitive)
+
+  vertices, normals, indices = generate_normals(
+    primitive.attributes["POSITION"], primitive.indices,
+    primitive.vertex_count, crease)
+
+  attributes = { semantic: np.ascontiguousarray(arr[vertices])
+                 for semantic, arr in primitive.attributes.items() }
+  attributes["NORMAL"] = normals
+  return Primitive(attributes, indices.astype(index_type(len(vertices))),
+                   TRIANGLES, primitive.material, primitive.extras)
@@ -0,0 +1,98 @@
+import numpy as np
+
+from bake.mesh import Primitive
+from bake.quantize import quantize_snorm
+
+# Application-specific semantics for octahedral encoded unit vectors. The
+# tangent stores the bitangent sign as a third component.
+NORMAL = "_NORMAL_OCT"
+TANGENT = "_TANGENT_OCT"
+
+def _sign(v):
+  return np.where(v >= 0, 1.0, -1.0)
+
+def project(n):
+  n = np.asarray(n, dtype=np.float64)[:, :3]
+  n = n / np.maximum(np.abs(n).sum(axis=1, keepdims=True), 1e-30)
+  x, y, z = n.T
+  folded = z < 0
+  u = np.where(folded, (1 - np.abs(y)) * _sign(x), x)
+  v = np.where(folded, (1 - np.abs(x)) * _sign(y), y)
+  return np.stack((u, v), axis=1)
+
+def decode(e):
+  e = np.asarray(e)
+  if e.dtype.kind == 'i':
+    e = np.maximum(e / np.iinfo(e.dtype).max, -1.0)
+  x, y = e[:, 0].astype(np.float64), e[:, 1].astype(np.float64)
+  z = 1 - np.abs(x) - np.abs(y)
+  t = np.clip(-z, 0, None)
+  x = x - _sign(x) * t
+  y = y - _sign(y) * t
+  n = np.stack((x, y, z), axis=1)
+  return n / np.linalg.norm(n, axis=1, keepdims=True)
+
+def encode(n, dtype=np.int8):
+  # Try the four grid points around the projection and keep the one that
+  # decodes closest to the input direction.
+  scale = np.iinfo(dtype).max
+  p = project(n) * scale
+  n = np.asarray(n, dtype=np.float64)[:, :3]
+  n = n / np.maximum(np.linalg.norm(n, axis=1, keepdims=True), 1e-30)
+
+  best = None
+  bestDot = np.full(len(n), -np.inf)
+  for fx in (np.floor, np.ceil):
+    for fy in (np.floor, np.ceil):
+      q = np.clip(np.stack((fx(p[:, 0]), fy(p[:, 1])), axis=1), -scale, scale)
+      q = q.astype(dtype)
+      dot = (decode(q) * n).sum(axis=1)
+      better = dot > bestDot
+      best = q if best is None else np.where(better[:, None], q, best)
+      bestDot = np.maximum(dot, bestDot)
+  return best
+
+def angular_error(n, e):
+  n = np.asarray(n, dtype=np.float64)[:, :3]
+  n = n / np.maximum(np.linalg.norm(n, axis=1, keepdims=True), 1e-30)
+  dot = np.clip((decode(e) * n).sum(axis=1), -1, 1)
+  return np.degrees(np.arccos(dot))
+
+def encode_primitive(primitive, dtype=np.int8):
+  attributes = {}
+  errors = []
+  for semantic, arr in primitive.attributes.items():
+    if semantic == "NORMAL" and arr.dtype == np.float32:
+      attributes[NORMAL] = encode(arr, dtype)
+      errors.append(angular_error(arr, attributes[NORMAL]))
+    elif semantic == "TANGENT" and arr.dtype == np.float32:
+      e = encode(arr, dtype)
+      errors.append(angular_error(arr, e))
+      w = quantize_snorm(_sign(arr[:, 3])[:, None], dtype)
+      attributes[TANGENT] = np.concatenate((e, w), axis=1)
+    else:
+      attributes[semantic] = arr
+
+  primitive = Primitive(attributes, primitive.indices, primitive.mode,
+                        primitive.material, primitive.extras)
+  return primitive, np.concatenate(errors) if errors else np.zeros(0)
+
+def decode_primitive(primitive):
+  # Turns the vectors of an earlier encode_primitive back into float NORMAL
+  # and TANGENT, so a re-bake neither regenerates normals nor skips them.
+  if NORMAL not in primitive.attributes and \
+     TANGENT not in primitive.attributes:
+    return primitive
+
+  attributes = {}
+  for semantic, arr in primitive.attributes.items():
+    if semantic == NORMAL:
+      attributes["NORMAL"] = decode(arr).astype(np.float32)
+    elif semantic == TANGENT:
+      w = _sign(arr[:, 2])[:, None]
+      attributes["TANGENT"] = np.concatenate((decode(arr[:, :2]), w),
+                                             axis=1).astype(np.float32)
+    else:
+      attributes[semantic] = arr
+  return Primitive(attributes, primitive.indices, primitive.mode,
+                   primitive.material, primitive.extras)
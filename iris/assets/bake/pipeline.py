@@ -0,0 +1,347 @@
+# Optimization stages shared by the bake scripts. Stage modules are imported
+# in run() so scripts can build their argument parser without NumPy.
+
+# Bump when a stage changes what it writes so cached bakes are redone.
+VERSION = 8
+
+def add_arguments(parser):
+  parser.add_argument('--triangles', action='store_true',
+                      help="Unroll strips and merge primitives into one "
+                           "indexed TRIANGLES primitive per material.")
+  parser.add_argument('--weld', type=float, nargs='?', const=1e-6,
+                      metavar='EPSILON',
+                      help="Weld vertices whose attributes match within "
+                           "EPSILON into an indexed vertex buffer.")
+  parser.add_argument('--crease', type=float, metavar='DEGREES',
+                      help="Split generated normals where adjacent faces "
+                           "meet at more than DEGREES (default: smooth).")
+  parser.add_argument('--tangents', action='store_true',
+                      help="Generate MikkTSpace tangents for primitives with "
+                           "NORMAL and TEXCOORD_0 but no TANGENT.")
+  parser.add_argument('--instance', type=float, nargs='?', const=0.1,
+                      metavar='DEGREES',
+                      help="Replace meshes that are rigid transforms of "
+                           "another mesh with that mesh and a node "
+                           "transform. Their normals and tangents may "
+                           "differ by up to DEGREES (default: 0.1).")
+  parser.add_argument('--flatten', action='store_true',
+                      help="Bake static node transforms into the vertices "
+                           "and collapse each scene to as few nodes as "
+                           "possible.")
+  parser.add_argument('--dedup', action='store_true',
+                      help="Merge equal materials, textures, samplers and "
+                           "images, and byte-identical accessors and "
+                           "bufferViews in the written asset.")
+  parser.add_argument('--lod', type=float, nargs='+', metavar='RATIO',
+                      help="Add MSFT_lod levels of detail simplified to each "
+                           "RATIO of the triangles, e.g. 0.5 0.25 0.1.")
+  parser.add_argument('--morton', type=int, choices=(30, 63),
+                      metavar='BITS',
+                      help="Sort _AABB boxes and their per-box shaderRecord "
+                           "data by the 30 or 63-bit Morton code of the box "
+                           "centroids.")
+  parser.add_argument('--blas', type=int, nargs='?', const=65536,
+                      metavar='BOXES',
+                      help="Split _AABB primitives of more than BOXES boxes "
+                           "(default: 65536) into spatially compact "
+                           "primitives, each its own bottom-level "
+                           "acceleration structure.")
+  parser.add_argument('--vcache', action='store_true',
+                      help="Reorder triangles for the post-transform vertex "
+                           "cache (Tipsify).")
+  parser.add_argument('--fetch', action='store_true',
+                      help="Reorder vertices into first-use order for "
+                           "vertex fetch locality.")
+  parser.add_argument('--octahedral', type=int, choices=(8, 16),
+                      metavar='BITS',
+                      help="Store normals and tangents as 2x BITS "
+                           "octahedral vectors (_NORMAL_OCT, _TANGENT_OCT).")
+  parser.add_argument('--quantize', action='store_true',
+                      help="Quantize vertex attributes with "
+                           "KHR_mesh_quantization (int16 positions, int8 "
+                           "normals, uint16 texcoords).")
+  parser.add_argument('--bounds', action='store_true',
+                      help="Store each primitive's bounding sphere in "
+                           "extras.HEV.boundingSphere.")
+  parser.add_argument('--meshlets', action='store_true',
+                      help="Split large indexed primitives into clusters of "
+                           "at most 64 vertices and 124 triangles with "
+                           "bounding spheres and normal cones, stored in a "
+                           "sidecar .meshlets.bin (best after --vcache).")
+  parser.add_argument('--bvh', type=int, nargs='?', const=4, metavar='LEAF',
+                      help="Build a binned SAH tree over each primitive's "
+                           "_AABB boxes with at most LEAF boxes per leaf "
+                           "(default: 4), stored in a sidecar .bvh.bin.")
+  parser.add_argument('--layout', choices=('planar', 'interleaved'),
+                      default='planar',
+                      help="Vertex buffer layout of the written asset.")
+
+def _indexed(args):
+  return args.triangles or args.weld is not None or args.tangents or \
+         args.vcache or args.fetch
+
+def enabled(args):
+  return _indexed(args) or args.octahedral is not None or args.quantize or \
+         args.instance is not None or args.flatten or args.lod or args.dedup or \
+         args.morton is not None or args.blas is not None or args.bounds or \
+         args.meshlets or args.bvh is not None or args.layout != 'planar'
+
+def _primitives(meshes):
+  return [p for mesh in meshes for p in mesh.primitives]
+
+def _vertex_primitives(meshes):
+  return [p for p in _primitives(meshes) if "_AABB" not in p.attributes]
+
+def _apply(meshes, stage, done=None):
+  # Primitives that share geometry across meshes (instances with another
+  # material) are processed once and keep sharing the result.
+  from bake.mesh import Primitive
+
+  done = {} if done is None else done
+  for mesh in meshes:
+    primitives = []
+    for p in mesh.primitives:
+      if "_AABB" in p.attributes:
+        primitives.append(p)  # procedural, no vertices to process
+        continue
+      key = (id(p.attributes), id(p.indices))
+      if key not in done:
+        done[key] = (p, stage(p))
+        primitives.append(done[key][1])
+        continue
+      q = done[key][1]
+      primitives.append(Primitive(q.attributes, q.indices, q.mode, p.material,
+                                  q.extras))
+    mesh.primitives = primitives
+
+def _vertex_bytes(meshes):
+  # Procedural _AABB boxes are not vertices, and arrays shared by several
+  # primitives are written once.
+  arrays = { id(arr): arr for p in _vertex_primitives(meshes)
+             for arr in p.attributes.values() }
+  return sum(arr.nbytes for arr in arrays.values())
+
+def run(gltf, meshes, args):
+  import numpy as np
+
+  import bake.blas
+  import bake.bounds
+  import bake.dedup
+  import bake.flatten
+  import bake.instance
+  import bake.mesh
+  import bake.morton
+  import bake.normals
+  import bake.octahedral
+  import bake.quantize
+  import bake.simplify
+  import bake.tangents
+  import bake.vcache
+  import bake.weld
+
+  # Octahedral vectors from an earlier bake are decoded so every stage sees
+  # float normals and tangents; --octahedral encodes them again at the end.
+  _apply(meshes, bake.octahedral.decode_primitive)
+
+  # Deduplicate materials first so primitives that differed only by a
+  # duplicate material merge below.
+  if args.dedup:
+    before = len(gltf.get("materials", []))
+    remap = bake.dedup.dedup_materials(gltf)
+    for p in _primitives(meshes):
+      if p.material is not None:
+        p.material = remap[p.material]
+    print("dedup: {} -> {} materials".format(before,
+                                             len(gltf.get("materials", []))))
+
+  if _indexed(args):
+    for mesh in meshes:
+      mesh.primitives = bake.mesh.merge_by_material(mesh.primitives)
+
+  if args.weld is not None:
+    before = sum(p.vertex_count for p in _vertex_primitives(meshes))
+    _apply(meshes, lambda p: bake.weld.weld(p, args.weld))
+    after = sum(p.vertex_count for p in _vertex_primitives(meshes))
+    print("weld: {} -> {} vertices".format(before, after))
+
+  # Always ship normals so the loader never falls back to GenerateNormals.
+  missing = sum("NORMAL" not in p.attributes
+                for p in _vertex_primitives(meshes))
+  before = sum(p.vertex_count for p in _vertex_primitives(meshes))
+  _apply(meshes, lambda p: bake.normals.add_normals(p, args.crease))
+  generated = missing - sum("NORMAL" not in p.attributes
+                            for p in _vertex_primitives(meshes))
+  if generated:
+    print("normals: {} primitives, {} -> {} vertices".format(
+      generated, before,
+      sum(p.vertex_count for p in _vertex_primitives(meshes))))
+
+  if args.tangents:
+    before = sum(p.vertex_count for p in _vertex_primitives(meshes))
+    _apply(meshes, bake.tangents.add_tangents)
+    print("tangents: {} -> {} vertices".format(
+      before, sum(p.vertex_count for p in _vertex_primitives(meshes))))
+
+  if args.instance is not None:
+    before = len(meshes)
+    meshes = bake.instance.instance(gltf, meshes, angle=args.instance)
+    geometry = { id(p.attributes) for p in _primitives(meshes) }
+    print("instance: {} -> {} meshes, {} distinct primitives".format(
+      before, len(meshes), len(geometry)))
+
+  if args.flatten:
+    nodes = len(gltf.get("nodes", []))
+    flattened = bake.flatten.flatten(gltf, meshes)
+    if flattened is None:
+      print("flatten: skipped, asset is animated or skinned")
+    else:
+      meshes = flattened
+      print("flatten: {} -> {} nodes, {} primitives".format(
+        nodes, len(gltf["nodes"]), len(_primitives(meshes))))
+
+  # Levels of detail come after flattening, which rewrites the nodes they
+  # hang off, and before the stages that reorder and encode each mesh.
+  if args.lod:
+    before = len(meshes)
+    meshes = bake.simplify.add_lods(gltf, meshes, args.lod)
+    for mesh in meshes[before:]:
+      print("lod: {} {} triangles".format(
+        mesh.name, sum(p.triangle_count for p in mesh.primitives)))
+
+  # Boxes are sorted once they sit in their final meshes and frames.
+  if args.morton is not None:
+    moved, kept = bake.morton.sort_boxes(gltf, meshes, args.morton)
+    print("morton: {} boxes sorted by {}-bit code{}".format(
+      moved, args.morton,
+      ", {} left alone as they share shaderRecord data".format(kept)
+      if kept else ""))
+
+  # Chunks keep the order the boxes were sorted into.
+  if args.blas is not None:
+    split, made = bake.blas.split_boxes(gltf, meshes, args.blas)
+    print("blas: {} primitives -> {} of at most {} boxes".format(
+      split, made, args.blas))
+
+  # Cache simulations per distinct geometry, so instances are simulated
+  # once and the numbers after one stage are the next stage's before.
+  simulated = {}
+
+  def simulate(metric):
+    results = []
+    for p in _vertex_primitives(meshes):
+      key = (metric, id(p.attributes), id(p.indices))
+      if key not in simulated:
+        simulated[key] = (p, metric(p))
+      results.append((p, simulated[key][1]))
+    return results
+
+  def misses(p):
+    return bake.vcache.cache_misses(p.indices)
+
+  if args.vcache:
+    triangles = max(sum(p.triangle_count
+                        for p in _vertex_primitives(meshes)), 1)
+    vertices = max(sum(p.vertex_count for p in _vertex_primitives(meshes)), 1)
+    before = sum(m for _, m in simulate(misses))
+    _apply(meshes, bake.vcache.optimize)
+    after = sum(m for _, m in simulate(misses))
+    print("vcache: ACMR {:.3f} -> {:.3f}, ATVR {:.3f} -> {:.3f}".format(
+      before / triangles, after / triangles, before / vertices,
+      after / vertices))
+
+  if args.fetch:
+    def overfetch():
+      results = simulate(bake.vcache.fetch_overfetch)
+      size = sum(p.vertex_count for p, _ in results)
+      return sum(f * p.vertex_count for p, f in results) / max(size, 1)
+
+    before = overfetch()
+    _apply(meshes, bake.vcache.optimize_fetch)
+    print("fetch: overfetch {:.3f} -> {:.3f}".format(before, overfetch()))
+
+  if args.octahedral is not None:
+    dtype = np.int8 if args.octahedral == 8 else np.int16
+    done = {}
+    for i, mesh in enumerate(meshes):
+      errors = [np.zeros(0)]
+
+      def encode(primitive):
+        primitive, error = bake.octahedral.encode_primitive(primitive, dtype)
+        errors.append(error)
+        return primitive
+
+      _apply([mesh], encode, done)
+      errors = np.concatenate(errors)
+      if len(errors):
+        print("octahedral: {} max {:.4f} mean {:.4f} degrees".format(
+          mesh.name or "mesh{}".format(i), errors.max(), errors.mean()))
+
+  if args.quantize:
+    before = _vertex_bytes(meshes)
+    bake.quantize.quantize(gltf, meshes)
+    print("quantize: {} -> {} vertex bytes".format(before,
+                                                  _vertex_bytes(meshes)))
+
+  # Bounds come last so they describe the positions as written.
+  if args.bounds:
+    _apply(meshes, bake.bounds.add_bounding_sphere)
+    print("bounds: {} bounding spheres".format(
+      len(_vertex_primitives(meshes))))
+
+  return meshes
+
+def save(path, gltf, meshes, args):
+  # Writes the asset, then merges duplicate accessors and bufferViews in
+  # the written file when deduplicating, and adds the cluster and tree
+  # sidecars.
+  import os
+
+  import bake.bvh
+  import bake.dedup
+  import bake.gltf
+  import bake.meshlets
+
+  # Cluster tables index the primitives' vertices, so build them before
+  # writing.
+  tables = bake.meshlets.add_meshlets(meshes) if args.meshlets else []
+
+  bake.gltf.save(path, gltf, meshes, args.layout)
+  if args.dedup:
+    gltf, buffers = bake.gltf.read(path)
+    counts = len(gltf.get("accessors", [])), len(gltf.get("bufferViews", []))
+    data = bake.dedup.dedup_buffers(gltf, buffers)
+    bake.gltf.write(path, gltf, data)
+    print("dedup: {} -> {} accessors, {} -> {} bufferViews".format(
+      counts[0], len(gltf.get("accessors", [])), counts[1],
+      len(gltf.get("bufferViews", []))))
+
+  sidecar = bake.meshlets.sidecar_path(path)
+  clustered = list({ id(t): t for mesh in tables for t in mesh
+                     if t is not None }.values())
+  if clustered:
+    bake.meshlets.write_sidecar(path, tables)
+    clusters = sum(len(t["meshlets"]) for t in clustered)
+    triangles = sum(len(t["triangles"]) for t in clustered)
+    vertices = sum(len(t["vertices"]) for t in clustered)
+    culled = sum(bake.meshlets.culled(t) * len(t["triangles"])
+                 for t in clustered)
+    print("meshlets: {} clusters, {:.1f} vertices and {:.1f} triangles "
+          "each, cones cull {:.1%} of triangles".format(
+            clusters, vertices / clusters, triangles / clusters,
+            culled / triangles))
+  elif os.path.exists(sidecar):
+    os.remove(sidecar)
+
+  sidecar = bake.bvh.sidecar_path(path)
+  tables = bake.bvh.add_bvhs(meshes, args.bvh) if args.bvh is not None \
+           else []
+  trees = list({ id(t): t for mesh in tables for t in mesh
+                 if t is not None }.values())
+  if trees:
+    bake.gltf.write_tables(path, "bvh", tables)
+    for table in trees:
+      stats = bake.bvh.report(bake.bvh.node_array(table))
+      print("bvh: {} boxes, {}".format(len(table["primitives"]),
+                                       bake.bvh.describe(stats)))
+  elif os.path.exists(sidecar):
+    os.remove(sidecar)
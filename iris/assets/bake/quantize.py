@@ -0,0 +1,87 @@
+import numpy as np
+
+from bake.gltf import add_extension, instanced_meshes, transform_mesh_nodes
+from bake.mesh import Primitive
+
+EXTENSION = "KHR_mesh_quantization"
+
+def quantize_unorm(arr, dtype):
+  info = np.iinfo(dtype)
+  return np.round(np.clip(arr, 0, 1) * info.max).astype(dtype)
+
+def quantize_snorm(arr, dtype):
+  info = np.iinfo(dtype)
+  return np.round(np.clip(arr, -1, 1) * info.max).astype(dtype)
+
+def position_transform(mesh):
+  # Uniform scale so the dequantization matrix keeps normals orthogonal.
+  positions = [p.attributes["POSITION"] for p in mesh.primitives
+               if "POSITION" in p.attributes]
+  if not positions:
+    return np.zeros(3), 1.0  # e.g. only procedural _AABB primitives
+  lo = np.min([p.min(axis=0) for p in positions], axis=0).astype(np.float64)
+  hi = np.max([p.max(axis=0) for p in positions], axis=0).astype(np.float64)
+  center = (lo + hi) / 2
+  scale = (hi - lo).max() / 2
+  return center, scale if scale > 0 else 1.0
+
+def quantize_primitive(primitive, center, scale, position_dtype=np.int16,
+                       normal_dtype=np.int8, texcoord_dtype=np.uint16):
+  # A position_dtype of None keeps positions as they are.
+  attributes = {}
+  for semantic, arr in primitive.attributes.items():
+    if arr.dtype != np.float32:
+      attributes[semantic] = arr
+    elif semantic == "POSITION" and position_dtype is not None:
+      attributes[semantic] = quantize_snorm((arr - center) / scale,
+                                            position_dtype)
+    elif semantic in ("NORMAL", "TANGENT"):
+      attributes[semantic] = quantize_snorm(arr, normal_dtype)
+    elif semantic.startswith("TEXCOORD_") and \
+         arr.min() >= 0 and arr.max() <= 1:
+      # Texcoords outside [0, 1] would need KHR_texture_transform.
+      attributes[semantic] = quantize_unorm(arr, texcoord_dtype)
+    else:
+      attributes[semantic] = arr
+
+  return Primitive(attributes, primitive.indices, primitive.mode,
+                   primitive.material)
+
+def dequantization_matrix(center, scale):
+  # Normalized attributes decode to (p - center) / scale in [-1, 1].
+  m = np.diag([scale, scale, scale, 1.0])
+  m[:3, 3] = center
+  return m
+
+def quantize(gltf, meshes, position_dtype=np.int16, normal_dtype=np.int8,
+             texcoord_dtype=np.uint16):
+  # Geometry shared between meshes has the same position transform in each,
+  # so it is quantized once and stays shared. Meshes drawn by
+  # EXT_mesh_gpu_instancing nodes keep float positions: their dequantization
+  # matrix would have to go between the instance transforms and the mesh.
+  instanced = instanced_meshes(gltf)
+  matrices = []
+  done = {}
+  for i, mesh in enumerate(meshes):
+    if i in instanced:
+      center, scale, dtype = np.zeros(3), 1.0, None
+    else:
+      center, scale = position_transform(mesh)
+      dtype = position_dtype
+    primitives = []
+    for p in mesh.primitives:
+      key = (id(p.attributes), dtype is None)
+      if key not in done:
+        done[key] = quantize_primitive(
+          p, center, scale, dtype, normal_dtype, texcoord_dtype)
+      q = done[key]
+      primitives.append(Primitive(q.attributes, q.indices, q.mode, p.material,
+                                  p.extras))
+    mesh.primitives = primitives
+    matrices.append(dequantization_matrix(center, scale))
+
+  # Fold the dequantization into the nodes instancing each mesh.
+  transform_mesh_nodes(gltf, list(enumerate(matrices)))
+
+  add_extension(gltf, EXTENSION, required=True)
+  return meshes
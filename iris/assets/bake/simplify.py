@@ -0,0 +1,382 @@
+import numpy as np
+
+from bake.gltf import TRIANGLES, TRIANGLE_STRIP, TRIANGLE_FAN, add_extension
+from bake.mesh import Mesh, Primitive, index_type, triangulate
+from bake.weld import _quantize, unique_rows
+
+EXTENSION = "MSFT_lod"
+COVERAGE = "MSFT_screencoverage"
+
+SURFACES = (TRIANGLES, TRIANGLE_STRIP, TRIANGLE_FAN)
+
+# Node properties an LOD node copies from the node it stands in for.
+TRANSFORM = ("matrix", "translation", "rotation", "scale")
+
+# Weight of the planes holding borders and attribute seams in place, relative
+# to the area-weighted face planes.
+EDGE_WEIGHT = 10
+
+# Pixel rows of a CAVE wall; an LOD is used once its error is under a pixel.
+SCREEN_HEIGHT = 1200
+
+# Collapses costing up to this fraction more than the one a pass needs are
+# ranked as equal, and rounds of picks per pass among them.
+TOLERANCE = 0.25
+ROUNDS = 4
+
+# Ordered corner pairs (i, j), i != j, of a triangle.
+PAIRS = np.array([(0, 1), (1, 2), (2, 0), (1, 0), (2, 1), (0, 2)])
+
+def _key(a, b, size):
+  return a.astype(np.int64) * size + b
+
+def _unique_pairs(a, b):
+  # Indices of the first of each distinct (a, b) row, grouped by a.
+  order = np.lexsort((b, a))
+  a, b = a[order], b[order]
+  first = np.ones(len(a), dtype=bool)
+  first[1:] = (a[1:] != a[:-1]) | (b[1:] != b[:-1])
+  return order[first]
+
+def _member(values, sorted_set):
+  # np.isin for a sorted array, without its deduplication. The values are
+  # looked up in sorted order, which walks the set instead of jumping about
+  # it and is much faster for large arrays.
+  found = np.zeros(len(values), dtype=bool)
+  if len(sorted_set):
+    order = np.argsort(values)
+    ordered = values[order]
+    at = np.minimum(np.searchsorted(sorted_set, ordered),
+                    len(sorted_set) - 1)
+    found[order] = sorted_set[at] == ordered
+  return found
+
+def _runs(sorted_keys):
+  # Distinct values of a sorted array and how often each occurs.
+  starts = np.flatnonzero(np.diff(sorted_keys, prepend=-1))
+  return sorted_keys[starts], np.diff(starts, append=len(sorted_keys))
+
+def _proper(triangles):
+  return (triangles[:, 0] != triangles[:, 1]) & \
+         (triangles[:, 1] != triangles[:, 2]) & \
+         (triangles[:, 0] != triangles[:, 2])
+
+def _normals(p):
+  return np.cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+
+def _planes(p):
+  # Unit plane and area of each triangle.
+  normal = _normals(p)
+  length = np.linalg.norm(normal, axis=1)
+  unit = normal / np.maximum(length, 1e-30)[:, None]
+  return np.concatenate((unit, -(unit * p[:, 0]).sum(axis=1)[:, None]),
+                        axis=1), length / 2
+
+def _quadrics(planes, weights, corners, size):
+  # Sum of the weighted plane quadrics p p^T at each corner.
+  q = planes[:, :, None] * planes[:, None, :] * weights[:, None, None]
+  q = np.repeat(q.reshape(-1, 16), corners.shape[1], axis=0)
+  return np.stack([np.bincount(corners.ravel(), q[:, k], minlength=size)
+                   for k in range(16)], axis=1).reshape(-1, 4, 4)
+
+def _open(triangles):
+  # Directed edges (a, b), one per corner, and which have no (b, a): mesh
+  # borders, and attribute seams where the faces on either side use
+  # different vertices.
+  a = triangles.ravel()
+  b = triangles[:, [1, 2, 0]].ravel()
+  size = triangles.max(initial=0) + 1
+  return a, b, ~_member(_key(b, a, size), np.sort(_key(a, b, size)))
+
+def _kinds(triangles, pid, size):
+  # The distinct open edges between positions, and the positions that may not
+  # move: corners of borders and seams, and those on edges more than two
+  # triangles share.
+  a, b, open = _open(triangles)
+  pa, pb = pid[a], pid[b]
+  keys = _key(np.minimum(pa, pb), np.maximum(pa, pb), size)
+  shared, counts = _runs(np.sort(keys))
+  edges, _ = _runs(np.sort(keys[open]))
+
+  degree = np.bincount(np.concatenate(divmod(edges, size)), minlength=size)
+  locked = (degree != 0) & (degree != 2)
+  locked[np.concatenate(divmod(shared[counts > 2], size))] = True
+  return edges, degree, locked
+
+def _edge_quadrics(points, triangles, pid, size):
+  # Planes through each open edge, perpendicular to its face and weighted by
+  # its squared length, so collapses along borders and seams keep them
+  # straight.
+  a, b, open = _open(triangles)
+  a, b = pid[a[open]], pid[b[open]]
+  faces = pid[triangles[np.flatnonzero(open) // 3]]
+  normal, _ = _planes(points[faces])
+  edge = points[b] - points[a]
+  length = np.linalg.norm(edge, axis=1)
+  unit = np.cross(edge, normal[:, :3]) / np.maximum(length, 1e-30)[:, None]
+  planes = np.concatenate((unit, -(unit * points[a]).sum(axis=1)[:, None]),
+                          axis=1)
+  return _quadrics(planes, EDGE_WEIGHT * length ** 2, np.stack((a, b), axis=1),
+                   size)
+
+def _rings(corners, size):
+  # The triangles around each position: those of u are
+  # ring[offsets[u]:offsets[u] + valence[u]].
+  ring = np.argsort(corners.ravel(), kind='stable') // 3
+  valence = np.bincount(corners.ravel(), minlength=size)
+  return ring, np.cumsum(valence) - valence, valence
+
+def _flips(points, corners, rings, cu, cv):
+  # Whether collapsing u into v turns one of u's other triangles by more than
+  # about 75 degrees (which also keeps slivers from flipping over a few
+  # passes) or makes it degenerate, and the number of triangles on the edge
+  # it removes.
+  ring, offsets, valence = rings
+  c = np.repeat(np.arange(len(cu)), valence[cu])
+  local = np.arange(len(c)) - np.repeat(np.cumsum(valence[cu]) - valence[cu],
+                                        valence[cu])
+  faces = ring[offsets[cu][c] + local]
+  moved = corners[faces]
+
+  gone = (moved == cv[c][:, None]).any(axis=1)
+  removed = np.bincount(c[gone], minlength=len(cu))
+  c, faces, moved = c[~gone], faces[~gone], moved[~gone]
+  before = _normals(points[corners[faces]])
+  moved = np.where(moved == cu[c][:, None], cv[c][:, None], moved)
+  after = _normals(points[moved])
+  length = np.linalg.norm(before, axis=1) * np.linalg.norm(after, axis=1)
+  turned = (((before * after).sum(axis=1) <= 0.25 * length) &
+            before.any(axis=1)) | ~after.any(axis=1)
+  return np.bincount(c[turned], minlength=len(cu)) > 0, removed
+
+def _collapses(points, quadrics, weights, triangles, pid, size, excess):
+  # One pass of half-edge collapses (u -> v, v stays put) between positions.
+  # Each picked collapse ranks first at both its ends and is the only one
+  # changing its triangles, so they are independent and applied at once.
+  # Returns the vertex remap, the positions removed and kept, and the
+  # collapse errors, or None when nothing can collapse.
+  corners = pid[triangles]
+  edges, degree, locked = _kinds(triangles, pid, size)
+
+  # Every vertex w at u moves to the vertex x at v it shares a triangle with;
+  # u's vertices must each have exactly one such x.
+  pu = corners[:, PAIRS[:, 0]].ravel()
+  pv = corners[:, PAIRS[:, 1]].ravel()
+  w = triangles[:, PAIRS[:, 0]].ravel()
+  x = triangles[:, PAIRS[:, 1]].ravel()
+  rows = _unique_pairs(_key(pu, pv, size), _key(w, x, len(pid)))
+  pu, pv, w, x = pu[rows], pv[rows], w[rows], x[rows]
+  keys = _key(pu, pv, size)
+  candidates, mapped = _runs(keys)
+  cu, cv = divmod(candidates, size)
+  distinct = _unique_pairs(keys, w)
+  unique_w = np.bincount(np.searchsorted(candidates, keys[distinct]),
+                         minlength=len(candidates))
+  used = np.bincount(triangles.ravel(), minlength=len(pid)) > 0
+  wedges = np.bincount(pid[used], minlength=size)
+  valid = (unique_w == mapped) & (mapped == wedges[cu]) & ~locked[cu]
+  # Border and seam positions only slide along their own edges.
+  valid &= (degree[cu] == 0) | _member(
+    _key(np.minimum(cu, cv), np.maximum(cu, cv), size), edges)
+  if not valid.any():
+    return None
+
+  # Collapses that cost at most TOLERANCE more than the one the pass needs to
+  # reach the target count as equally cheap and are ordered by a hash among
+  # themselves, so a pass takes many collapses of a smooth or flat cost
+  # field rather than just its few local minima, and the number of passes
+  # stays bounded as the mesh grows.
+  pool = np.flatnonzero(valid)
+  target = np.concatenate((points[cv[pool]], np.ones((len(pool), 1))),
+                          axis=1)
+  cost = np.full(len(candidates), np.inf)
+  cost[pool] = np.maximum(np.einsum(
+    'ni,nij,nj->n', target, quadrics[cu[pool]] + quadrics[cv[pool]], target),
+    0)
+  need = min(excess // 2, len(pool) - 1)
+  limit = np.partition(cost[pool], need)[need]
+  valid &= cost <= limit * (1 + TOLERANCE)
+  bucket = np.minimum(cost / max(limit * TOLERANCE, 1e-30), 1 << 20)
+  spread = (candidates * 0x9E3779B1) & 0xFFFFFFFF
+
+  # Pick the valid collapses that come first at both their ends and drop
+  # those that would fold a triangle over, a collapse sharing a triangle
+  # with an earlier pick waiting. Each round picks among the collapses
+  # clear of the picks so far.
+  rings = _rings(corners, size)
+  ordered = np.flatnonzero(valid)
+  ordered = ordered[np.argsort(
+    bucket[ordered].astype(np.int64) << 32 | spread[ordered])]
+  rank = np.full(len(candidates), len(ordered))
+  rank[ordered] = np.arange(len(ordered))
+  removed = np.zeros(len(candidates), dtype=np.intp)
+  chosen = []
+  for _ in range(ROUNDS):
+    order = ordered[valid[ordered]]
+    if not len(order):
+      break
+    best = np.full(size, len(ordered))
+    np.minimum.at(best, cu[order], rank[order])
+    np.minimum.at(best, cv[order], rank[order])
+    picked = order[(best[cu[order]] == rank[order]) &
+                   (best[cv[order]] == rank[order])]
+    flipped, removed[picked] = _flips(points, corners, rings, cu[picked],
+                                      cv[picked])
+    valid[picked] = False
+    picked = picked[~flipped]
+
+    # Triangles around u belong to the first pick removing one of their
+    # positions; a pick sharing a triangle with an earlier one waits.
+    removing = np.full(size, len(ordered))
+    removing[cu[picked]] = rank[picked]
+    ranks = removing[corners]
+    owner = ranks.min(axis=1)
+    conflict = (ranks < len(ordered)) & (ranks != owner[:, None])
+    waits = np.zeros(len(candidates), dtype=bool)
+    waits[ordered[ranks[conflict]]] = True
+    picked = picked[~waits[picked]]
+    chosen.append(picked)
+
+    # Later rounds move no position around a picked u and collapse into
+    # no position a pick uses, as picks within a round.
+    blocked = np.zeros(size, dtype=bool)
+    blocked[corners[(removing[corners] < len(ordered)).any(axis=1)]] = True
+    ends = np.zeros(size, dtype=bool)
+    ends[cu[picked]] = ends[cv[picked]] = True
+    valid &= ~blocked[cu] & ~ends[cv]
+
+  picked = np.concatenate(chosen) if chosen else np.zeros(0, dtype=np.intp)
+  if not len(picked):
+    return None
+
+  # Take just enough collapses, first ranked first, to reach the target.
+  picked = picked[np.argsort(rank[picked], kind='stable')]
+  total = np.cumsum(removed[picked])
+  picked = picked[:np.searchsorted(total, excess) + 1]
+
+  remap = np.arange(len(pid))
+  # The rows are sorted by candidate, mapped rows each.
+  take = np.zeros(len(candidates), dtype=bool)
+  take[picked] = True
+  take = np.repeat(take, mapped)
+  remap[w[take]] = x[take]
+  cu, cv = cu[picked], cv[picked]
+  return remap, cu, cv, cost[picked] / np.maximum(weights[cu] + weights[cv],
+                                                  1e-30)
+
+def simplify(primitive, target):
+  # Garland and Heckbert, "Surface Simplification Using Quadric Error
+  # Metrics", SIGGRAPH 1997, with half-edge collapses so the kept vertices
+  # keep their attributes. Collapses work on positions and carry along every
+  # vertex at a position, so attribute seams (UV or normal splits) and
+  # borders are kept: their positions only collapse along them. Returns the
+  # primitive with about target triangles and the error, the largest RMS
+  # distance from a kept position to the planes of the faces it replaced.
+  if primitive.mode not in SURFACES or \
+     "POSITION" not in primitive.attributes or \
+     primitive.attributes["POSITION"].dtype.kind != 'f' or \
+     not primitive.triangle_count:
+    return primitive, 0.0
+  if primitive.mode != TRIANGLES or primitive.indices is None:
+    primitive = triangulate(primitive)
+
+  first, pid = unique_rows(_quantize(primitive.attributes["POSITION"], 0))
+  size = len(first)
+  points = primitive.attributes["POSITION"][first].astype(np.float64)
+  triangles = primitive.indices.astype(np.intp).reshape(-1, 3)
+  triangles = triangles[_proper(pid[triangles])]
+
+  planes, areas = _planes(points[pid[triangles]])
+  quadrics = _quadrics(planes, areas, pid[triangles], size) + \
+             _edge_quadrics(points, triangles, pid, size)
+  weights = np.bincount(pid[triangles].ravel(), np.repeat(areas, 3),
+                        minlength=size)
+
+  error = 0.0
+  while len(triangles) > target:
+    collapses = _collapses(points, quadrics, weights, triangles, pid, size,
+                           len(triangles) - target)
+    if collapses is None:
+      break
+    remap, u, v, errors = collapses
+    np.add.at(quadrics, v, quadrics[u])
+    np.add.at(weights, v, weights[u])
+    triangles = remap[triangles]
+    triangles = triangles[_proper(pid[triangles])]
+    error = max(error, errors.max())
+
+  used, indices = np.unique(triangles, return_inverse=True)
+  attributes = { semantic: np.ascontiguousarray(arr[used])
+                 for semantic, arr in primitive.attributes.items() }
+  return Primitive(attributes, indices.ravel().astype(index_type(len(used))),
+                   TRIANGLES, primitive.material, primitive.extras), \
+         float(np.sqrt(error))
+
+def _diameter(mesh):
+  points = [p.attributes["POSITION"] for p in mesh.primitives
+            if "POSITION" in p.attributes]
+  if not points:
+    return 0.0
+  points = np.concatenate(points)
+  return float(np.linalg.norm(points.max(axis=0) - points.min(axis=0)))
+
+def lod_chain(mesh, ratios, min_reduction=0.9, name=None):
+  # Meshes simplified to each ratio of mesh's triangles, each from the one
+  # before, with their accumulated errors, named after name (by default the
+  # mesh's). The chain stops early once a level no longer removes a tenth of
+  # the triangles.
+  base = [p.triangle_count for p in mesh.primitives]
+  levels = []
+  current, total = mesh.primitives, 0.0
+  for ratio in sorted(ratios, reverse=True):
+    results = [simplify(p, max(int(count * ratio), 1))
+               for p, count in zip(current, base)]
+    primitives = [p for p, _ in results]
+    before = sum(p.triangle_count for p in current)
+    if sum(p.triangle_count for p in primitives) > min_reduction * before:
+      break
+    total += max([e for _, e in results], default=0.0)
+    levels.append((Mesh(primitives, "{}_LOD{}".format(
+      name or mesh.name or "mesh", len(levels) + 1)), total))
+    current = primitives
+  return levels
+
+def screen_coverage(diameter, errors, height=SCREEN_HEIGHT):
+  # MSFT_screencoverage: level i is drawn while the mesh covers at least
+  # coverage[i] of the screen height, which is where level i + 1's error
+  # would reach a pixel. The last level is never culled.
+  coverage = [min(1.0, diameter / (e * height)) if e > 0 else 1.0
+              for e in errors]
+  return np.minimum.accumulate(coverage + [0.0]).tolist()
+
+def add_lods(gltf, meshes, ratios, height=SCREEN_HEIGHT):
+  # Builds an LOD chain for every mesh nodes use and points the nodes at it
+  # with MSFT_lod. The LOD nodes copy their node's transform and are not in
+  # any scene. Returns the meshes with the LOD meshes appended.
+  meshes = list(meshes)
+  nodes = gltf.get("nodes", [])
+  chains = {}
+  for node in list(nodes):
+    if "mesh" not in node or node.get("extensions", {}).get(EXTENSION):
+      continue
+    i = node["mesh"]
+    if i not in chains:
+      levels = lod_chain(meshes[i], ratios,
+                         name=meshes[i].name or "mesh{}".format(i))
+      chains[i] = [len(meshes) + k for k in range(len(levels))], \
+                  screen_coverage(_diameter(meshes[i]),
+                                  [e for _, e in levels], height)
+      meshes.extend(mesh for mesh, _ in levels)
+
+    ids, coverage = chains[i]
+    if not ids:
+      continue
+    lods = []
+    for mesh in ids:
+      lods.append(len(nodes))
+      nodes.append(dict({ key: node[key] for key in TRANSFORM if key in node },
+                        mesh=mesh))
+    node.setdefault("extensions", {})[EXTENSION] = { "ids": lods }
+    node.setdefault("extras", {})[COVERAGE] = coverage
+    add_extension(gltf, EXTENSION)
+  return meshes
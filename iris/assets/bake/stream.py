@@ -0,0 +1,253 @@
+# Streaming bake for geometry larger than memory. Source geometry arrives as
+# a generator of chunks; each attribute is spooled to its own temporary file
+# as it is read and its bounds are tracked per chunk, so peak memory is one
+# chunk whatever the size of the model. The bufferView offsets are fixed up
+# once every chunk has been seen, when the spools are copied into the buffer.
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from bake.gltf import ARRAY_BUFFER, ELEMENT_ARRAY_BUFFER, POINTS, TRIANGLES, \
+                      _normalized, _padded_rows, add_accessor, write_glb
+
+# GLB stores chunk lengths in 32 bits.
+GLB_LIMIT = 0xFFFFFFFF - (1 << 20)
+
+class Spool:
+  # One attribute's data as it streams in: element type, count and bounds.
+  def __init__(self, directory, vertex=True):
+    self.fh = tempfile.TemporaryFile(dir=directory)
+    self.vertex = vertex
+    self.first = None
+    self.count = 0
+    self.lo = None
+    self.hi = None
+
+  def write(self, arr, bounds=False):
+    arr = np.ascontiguousarray(arr)
+    if self.first is None:
+      self.first = arr[:0]
+    elif arr.dtype != self.first.dtype or \
+         arr.shape[1:] != self.first.shape[1:]:
+      raise ValueError("chunk of {} {} does not match {} {}".format(
+        arr.dtype, arr.shape[1:], self.first.dtype, self.first.shape[1:]))
+
+    if bounds and len(arr):
+      lo, hi = arr.min(axis=0), arr.max(axis=0)
+      self.lo = lo if self.lo is None else np.minimum(self.lo, lo)
+      self.hi = hi if self.hi is None else np.maximum(self.hi, hi)
+    if self.vertex and self.stride != self.size:
+      arr = _padded_rows(arr, self.stride)
+    self.fh.write(arr.data)
+    self.count += len(arr)
+
+  @property
+  def size(self):
+    return self.first.itemsize * int(np.prod(self.first.shape[1:]))
+
+  @property
+  def stride(self):
+    # Vertex elements start on 4-byte boundaries, e.g. RGB bytes use 4.
+    return -(-self.size // 4) * 4 if self.vertex else self.size
+
+  @property
+  def byteLength(self):
+    return self.count * self.stride
+
+def spool(chunks, directory=None):
+  # Drains chunks, dicts of attribute arrays where "indices" holds vertex
+  # indices counted from the first vertex of the first chunk.
+  spools = {}
+  for chunk in chunks:
+    for semantic, arr in chunk.items():
+      if semantic not in spools:
+        spools[semantic] = Spool(directory, semantic != "indices")
+      if semantic == "indices":
+        arr = np.asarray(arr, dtype=np.uint32).ravel()
+      spools[semantic].write(arr, semantic == "POSITION")
+  return spools
+
+def layout(gltf, spools):
+  # Adds a bufferView and accessor for each (name, spool), laid out back to
+  # back in buffer 0 in that order. Returns the accessor indices and the
+  # buffer length.
+  byteLength = 0
+  accessors = []
+  for name, s in spools:
+    byteLength += -byteLength % 4
+    gltf["bufferViews"].append({
+      "buffer": 0,
+      "byteOffset": byteLength,
+      "byteLength": s.byteLength,
+      "target": ARRAY_BUFFER if s.vertex else ELEMENT_ARRAY_BUFFER
+    })
+    if s.stride != s.size:
+      gltf["bufferViews"][-1]["byteStride"] = s.stride
+    byteLength += s.byteLength
+    accessors.append(add_accessor(gltf, len(gltf["bufferViews"]) - 1, 0,
+                                  s.first, s.lo, s.hi, name.lower(),
+                                  s.vertex and _normalized(name, s.first),
+                                  s.count))
+  return accessors, byteLength
+
+def write_spools(path, gltf, spools, byteLength, directory=None):
+  # Writes gltf with the spools concatenated, as laid out, into its buffer:
+  # GLB or .gltf with .bin by extension. The spools are closed.
+  def copy(fh):
+    written = 0
+    for s in spools:
+      fh.write(bytes(-written % 4))
+      written += -written % 4
+      s.fh.seek(0)
+      shutil.copyfileobj(s.fh, fh, 1 << 24)
+      written += s.byteLength
+      s.fh.close()
+
+  if os.path.splitext(path)[1] == ".glb":
+    if byteLength > GLB_LIMIT:
+      raise ValueError("{}: {} bytes do not fit in a GLB, write .gltf "
+                       "instead".format(path, byteLength))
+    gltf["buffers"] = [{ "byteLength": byteLength }]
+    with tempfile.TemporaryFile(dir=directory) as binFile:
+      copy(binFile)
+      binFile.seek(0)
+      with open(path, 'wb') as fh:
+        write_glb(fh, gltf, binFile, byteLength)
+  else:
+    uri = os.path.splitext(os.path.basename(path))[0] + ".bin"
+    gltf["buffers"] = [{ "byteLength": byteLength, "uri": uri }]
+    with open(os.path.join(os.path.dirname(path), uri), 'wb') as fh:
+      copy(fh)
+    with open(path, 'w') as fh:
+      json.dump(gltf, fh, indent=2)
+
+def bake(path, chunks, gltf=None, material=None, name=None, directory=None):
+  # Writes the streamed geometry as one primitive of a one-mesh asset, GLB
+  # or .gltf with .bin by extension. The attributes are planar, one view
+  # each, followed by the indices.
+  gltf = dict(gltf or {}, asset={ "version": "2.0" }, accessors=[],
+              bufferViews=[], buffers=[], meshes=[])
+  if "scenes" not in gltf:
+    gltf.update(scene=0, scenes=[{ "nodes": [0] }], nodes=[{ "mesh": 0 }])
+
+  spools = spool(chunks, directory)
+  semantics = [s for s in spools if s != "indices"]
+  if "POSITION" not in semantics:
+    raise ValueError("{}: no POSITION chunks".format(path))
+
+  # Now that the sizes are known, lay out the views back to back.
+  order = semantics + ["indices"] * ("indices" in spools)
+  accessors, byteLength = layout(gltf, [(s, spools[s]) for s in order])
+  primitive = { "attributes": dict(zip(semantics, accessors)) }
+  if "indices" in spools:
+    primitive["indices"] = accessors[-1]
+
+  primitive["mode"] = TRIANGLES if "indices" in spools else POINTS
+  if material is not None:
+    primitive["material"] = material
+  gltf["meshes"].append({ "primitives": [primitive] })
+  if name is not None:
+    gltf["meshes"][0]["name"] = name
+
+  write_spools(path, gltf, [spools[s] for s in order], byteLength, directory)
+  return gltf
+
+PLY_TYPES = {
+  "char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1",
+  "short": "i2", "int16": "i2", "ushort": "u2", "uint16": "u2",
+  "int": "i4", "int32": "i4", "uint": "u4", "uint32": "u4",
+  "float": "f4", "float32": "f4", "double": "f8", "float64": "f8"
+}
+
+PLY_ATTRIBUTES = {
+  "POSITION": ("x", "y", "z"),
+  "NORMAL": ("nx", "ny", "nz"),
+  "COLOR_0": ("red", "green", "blue")
+}
+
+def _ply_header(fh):
+  if fh.readline().strip() != b"ply":
+    raise ValueError("{}: not a PLY file".format(fh.name))
+
+  elements = []
+  order = "<"
+  while True:
+    line = fh.readline()
+    if not line:
+      raise ValueError("{}: truncated PLY header".format(fh.name))
+    words = line.decode('ascii').split()
+    if not words or words[0] in ("comment", "obj_info"):
+      continue
+    if words[0] == "end_header":
+      return elements, order, fh.tell()
+    if words[0] == "format":
+      if words[1] not in ("binary_little_endian", "binary_big_endian"):
+        raise ValueError("{}: {} PLY is not supported".format(fh.name,
+                                                              words[1]))
+      order = "<" if words[1] == "binary_little_endian" else ">"
+    elif words[0] == "element":
+      elements.append((words[1], int(words[2]), []))
+    elif words[0] == "property" and words[1] == "list":
+      elements[-1][2].append((words[4], (PLY_TYPES[words[2]],
+                                         PLY_TYPES[words[3]])))
+    elif words[0] == "property":
+      elements[-1][2].append((words[2], PLY_TYPES[words[1]]))
+
+def read_ply(path, chunk=1 << 20):
+  # Yields chunks of a binary PLY: vertices with POSITION, NORMAL and COLOR_0
+  # where present, then triangle indices. Faces must all be triangles. Each
+  # chunk is read on its own so only one is resident at a time.
+  with open(path, 'rb') as fh:
+    elements, order, _ = _ply_header(fh)
+
+    for element, count, properties in elements:
+      if element == "face":
+        if len(properties) != 1 or not isinstance(properties[0][1], tuple):
+          raise ValueError("{}: faces must only hold a vertex index "
+                           "list".format(path))
+        count_type, index_type = properties[0][1]
+        dtype = np.dtype([("n", order + count_type),
+                          ("v", order + index_type, 3)])
+      elif any(isinstance(t, tuple) for _, t in properties):
+        raise ValueError("{}: list property in {}".format(path, element))
+      else:
+        dtype = np.dtype([(p, order + t) for p, t in properties])
+
+      for start in range(0, count, chunk):
+        rows = np.fromfile(fh, dtype, min(chunk, count - start))
+        if element == "face":
+          if (rows["n"] != 3).any():
+            raise ValueError("{}: faces must be triangles".format(path))
+          yield { "indices": rows["v"].astype(np.uint32) }
+        elif element == "vertex":
+          # 8-bit colors stay normalized bytes, everything else is float.
+          yield { semantic: np.stack([rows[p] for p in names], axis=1)
+                              .astype(np.uint8 if dtype[names[0]] == np.uint8
+                                      else np.float32)
+                  for semantic, names in PLY_ATTRIBUTES.items()
+                  if all(p in dtype.names for p in names) }
+
+def main():
+  parser = argparse.ArgumentParser(
+    prog="python3 -m bake.stream",
+    description="Bake a binary PLY capture in bounded memory")
+  parser.add_argument('input', help="Input binary .ply file.")
+  parser.add_argument('output', help="Output .gltf or .glb file.")
+  parser.add_argument('--chunk', type=int, default=1 << 20, metavar='ROWS',
+                      help="Vertices or faces read per chunk.")
+  parser.add_argument('--tmpdir', metavar='DIR',
+                      help="Directory for the temporary attribute spools.")
+  args = parser.parse_args()
+
+  gltf = bake(args.output, read_ply(args.input, args.chunk),
+              directory=args.tmpdir)
+  print("stream: {} accessors, {} bytes".format(
+    len(gltf["accessors"]), gltf["buffers"][0]["byteLength"]))
+
+if __name__ == "__main__":
+  sys.exit(main())
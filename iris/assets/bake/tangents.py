@@ -0,0 +1,80 @@
+import numpy as np
+
+from bake.gltf import TRIANGLES
+from bake.mesh import Primitive, index_type, triangulate
+
+def _normalize(v):
+  length = np.linalg.norm(v, axis=-1, keepdims=True)
+  return np.divide(v, length, out=np.zeros_like(v), where=length > 1e-20)
+
+def _project(v, n):
+  return v - n * (v * n).sum(axis=-1, keepdims=True)
+
+def generate_tangents(positions, normals, texcoords, indices):
+  # Follows MikkTSpace (Mikkelsen 2008, as used by genTangSpaceDefault):
+  # per-face unit tangents from the UV derivatives, projected into each
+  # corner's normal plane, weighted by the corner angle and accumulated per
+  # vertex and face orientation. Vertices shared by faces with mirrored UVs
+  # are split so each copy gets its own handedness.
+  corners = np.asarray(indices, dtype=np.intp).reshape(-1, 3)
+  p = positions[corners].astype(np.float64)
+  n = _normalize(normals[corners].astype(np.float64))
+  uv = texcoords[corners].astype(np.float64)
+
+  d1 = p[:, 1] - p[:, 0]
+  d2 = p[:, 2] - p[:, 0]
+  t21 = uv[:, 1] - uv[:, 0]
+  t31 = uv[:, 2] - uv[:, 0]
+  area = t21[:, 0] * t31[:, 1] - t21[:, 1] * t31[:, 0]
+  preserving = area >= 0
+
+  sdir = t31[:, 1, None] * d1 - t21[:, 1, None] * d2
+  sdir = _normalize(sdir) * np.where(preserving, 1.0, -1.0)[:, None]
+
+  # Corner angles measured in the corner's tangent plane.
+  e1 = _normalize(_project(np.roll(p, -1, axis=1) - p, n))
+  e2 = _normalize(_project(np.roll(p, 1, axis=1) - p, n))
+  angle = np.arccos(np.clip((e1 * e2).sum(axis=-1), -1, 1))
+
+  contribution = _normalize(_project(sdir[:, None, :], n)) * angle[..., None]
+
+  keys = corners * 2 + (~preserving)[:, None]
+  groups, inverse = np.unique(keys.ravel(), return_inverse=True)
+  inverse = inverse.ravel()
+  sums = np.stack([np.bincount(inverse, contribution[..., k].ravel(),
+                               minlength=len(groups)) for k in range(3)],
+                  axis=1)
+
+  vertices = groups // 2
+  normal = _normalize(normals[vertices].astype(np.float64))
+  tangent = _normalize(_project(sums, normal))
+
+  # Fall back to any unit vector orthogonal to the normal where no face
+  # contributed (degenerate UVs).
+  missing = ~tangent.any(axis=1)
+  if missing.any():
+    axis = np.where(np.abs(normal[missing, :1]) < 0.9, [[1.0, 0, 0]],
+                    [[0, 1.0, 0]])
+    tangent[missing] = _normalize(np.cross(normal[missing], axis))
+
+  w = np.where(groups % 2 == 0, 1.0, -1.0)
+  tangents = np.concatenate((tangent, w[:, None]), axis=1).astype(np.float32)
+  return vertices, tangents, inverse
+
+def add_tangents(primitive, texcoord="TEXCOORD_0"):
+  if "TANGENT" in primitive.attributes or \
+     "NORMAL" not in primitive.attributes or \
+     texcoord not in primitive.attributes:
+    return primitive
+  if primitive.mode != TRIANGLES or primitive.indices is None:
+    primitive = triangulate(primitive)
+
+  vertices, tangents, indices = generate_tangents(
+    primitive.attributes["POSITION"], primitive.attributes["NORMAL"],
+    primitive.attributes[texcoord], primitive.indices)
+
+  attributes = { semantic: np.ascontiguousarray(arr[vertices])
+                 for semantic, arr in primitive.attributes.items() }
+  attributes["TANGENT"] = tangents
+  return Primitive(attributes, indices.astype(index_type(len(vertices))),
+                   TRIANGLES, primitive.material, primitive.extras)
@@ -0,0 +1,89 @@
+# Checks of what the bake stages and the generator scripts promise. Most
+# stages only reorder data, so they must keep every triangle, box and shader
+# record, only moving them around.
+#
+#   cd iris/assets && python3 -m unittest discover bake/tests
+import numpy as np
+
+from bake.flatten import world_matrices
+from bake.gltf import RAYTRACING, TRIANGLES
+from bake.mesh import Mesh, Primitive, triangulate
+
+def grid(n=8, seed=0):
+  # An n x n quad grid over a bumpy height field as an indexed primitive,
+  # with its vertices and triangles shuffled.
+  rng = np.random.default_rng(seed)
+  v = np.arange((n + 1) * (n + 1)).reshape(n + 1, n + 1)
+  a, b = v[:-1, :-1].ravel(), v[:-1, 1:].ravel()
+  c, d = v[1:, :-1].ravel(), v[1:, 1:].ravel()
+  triangles = np.concatenate((np.stack((a, b, c), axis=1),
+                              np.stack((b, d, c), axis=1)))
+  x, y = np.meshgrid(np.arange(n + 1), np.arange(n + 1))
+  z = np.sin(x * 0.7) * np.cos(y * 0.5)
+  positions = np.stack((x.ravel(), y.ravel(), z.ravel()), axis=1)
+
+  perm = rng.permutation(len(positions))
+  inverse = np.empty_like(perm)
+  inverse[perm] = np.arange(len(perm))
+  triangles = inverse[triangles][rng.permutation(len(triangles))]
+  return Primitive({ "POSITION": positions[perm].astype(np.float32) },
+                   triangles.ravel().astype(np.uint16))
+
+def boxes(count, seed=0):
+  # count random (min, max) pairs as _AABB rows.
+  rng = np.random.default_rng(seed)
+  lo = rng.uniform(-10, 10, (count, 3))
+  hi = lo + rng.uniform(0.1, 1, (count, 3))
+  return np.stack((lo, hi), axis=1).reshape(-1, 3).astype(np.float32)
+
+def box_scene(count, seed=0):
+  # One _AABB primitive with a per-box albedo in its material's record.
+  rng = np.random.default_rng(seed)
+  albedo = rng.uniform(0, 1, (count, 3)).astype(np.float32)
+  record = { "hitShaders": 0, "shaderRecord": { "albedo": albedo } }
+  gltf = { "materials": [{ "name": "lambertian",
+                           "extensions": { RAYTRACING: record } }] }
+  return gltf, [Mesh([Primitive({ "_AABB": boxes(count, seed) },
+                                material=0)])]
+
+def box_records(gltf, meshes):
+  # Every box with the albedo its shader record offset points at, as sorted
+  # rows.
+  rows = []
+  for mesh in meshes:
+    for p in mesh.primitives:
+      record = gltf["materials"][p.material]["extensions"][RAYTRACING] \
+                   ["shaderRecord"]
+      offset = (p.extras or {}).get("HEV", {}).get("shaderRecordOffset", 0)
+      pairs = p.attributes["_AABB"].reshape(-1, 6)
+      albedo = record["albedo"][offset:offset + len(pairs)]
+      rows.append(np.concatenate((pairs, albedo), axis=1))
+  rows = np.concatenate(rows)
+  return rows[np.lexsort(rows.T[::-1])]
+
+def triangle_set(primitive, matrix=None, decimals=4):
+  # The triangles of a primitive as sorted rows of corner positions, each
+  # rotated to start at its smallest corner so the winding is kept.
+  if primitive.indices is None or primitive.mode != TRIANGLES:
+    primitive = triangulate(primitive)
+  points = primitive.attributes["POSITION"].astype(np.float64)
+  if matrix is not None:
+    points = points @ matrix[:3, :3].T + matrix[:3, 3]
+  corners = np.round(points, decimals)[
+    primitive.indices.astype(np.intp).reshape(-1, 3)]
+  rows = []
+  for t in corners:
+    first = min(range(3), key=lambda k: tuple(t[k]))
+    rows.append(tuple(np.roll(t, -first, axis=0).ravel()))
+  return sorted(rows)
+
+def world_triangles(gltf, meshes):
+  # The triangle_set of every primitive every scene draws, in world space.
+  rows = []
+  nodes = gltf.get("nodes", [])
+  for scene in gltf.get("scenes", []):
+    for i, matrix in world_matrices(gltf, scene):
+      if "mesh" in nodes[i]:
+        for p in meshes[nodes[i]["mesh"]].primitives:
+          rows += triangle_set(p, matrix)
+  return sorted(rows)
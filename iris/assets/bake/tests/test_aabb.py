@@ -0,0 +1,88 @@
+import unittest
+
+import numpy as np
+
+from bake import aabb
+
+def _corners(lo, hi):
+  # The 8 corners of each box, (N, 8, 3).
+  pick = np.array([(x, y, z) for x in (0, 1) for y in (0, 1)
+                   for z in (0, 1)])
+  return np.where(pick, hi[:, None], lo[:, None])
+
+def _rotations(count, rng):
+  q, r = np.linalg.qr(rng.normal(size=(count, 3, 3)))
+  return q * np.sign(np.diagonal(r, axis1=1, axis2=2))[:, None]
+
+class Builders(unittest.TestCase):
+  # Each builder matches the box of the shape's extreme points.
+  def setUp(self):
+    self.rng = np.random.default_rng(6)
+
+  def test_spheres(self):
+    center = self.rng.normal(size=(100, 3)) * 10
+    radius = self.rng.uniform(0.1, 2, 100)
+    lo, hi = aabb.spheres(center, radius)
+    np.testing.assert_allclose(hi - lo, np.repeat(2 * radius[:, None], 3, 1))
+    np.testing.assert_allclose((lo + hi) / 2, center)
+    lo, hi = aabb.spheres(center, 0.5)
+    np.testing.assert_allclose(hi - lo, 1)
+
+  def test_boxes(self):
+    center = self.rng.normal(size=(100, 3))
+    half = self.rng.uniform(0.1, 1, (100, 3))
+    rotation = _rotations(100, self.rng)
+    lo, hi = aabb.boxes(center, half, rotation)
+    points = np.einsum('nij,nkj->nki', rotation,
+                       _corners(-half, half)) + center[:, None]
+    np.testing.assert_allclose(lo, points.min(axis=1))
+    np.testing.assert_allclose(hi, points.max(axis=1))
+
+  def test_capsules(self):
+    a = self.rng.normal(size=(100, 3))
+    b = self.rng.normal(size=(100, 3))
+    lo, hi = aabb.capsules(a, b, 0.25)
+    np.testing.assert_allclose(lo, np.minimum(a, b) - 0.25)
+    np.testing.assert_allclose(hi, np.maximum(a, b) + 0.25)
+
+  def test_glyphs(self):
+    shapes = [self.rng.normal(size=(20, 3)) for _ in range(2)]
+    bounds = [aabb.glyph_bounds(s) for s in shapes]
+    matrices = np.zeros((50, 4, 4))
+    matrices[:, :3, :3] = _rotations(50, self.rng) * \
+                          self.rng.uniform(0.5, 2, (50, 1, 3))
+    matrices[:, :3, 3] = self.rng.normal(size=(50, 3)) * 5
+    matrices[:, 3, 3] = 1
+    glyph = self.rng.integers(2, size=50)
+    lo, hi = aabb.glyphs(matrices, [b[0] for b in bounds],
+                         [b[1] for b in bounds], glyph)
+    for k in range(50):
+      corners = _corners(*(np.array(b)[None] for b in bounds[glyph[k]]))[0]
+      points = corners @ matrices[k, :3, :3].T + matrices[k, :3, 3]
+      np.testing.assert_allclose(lo[k], points.min(axis=0))
+      np.testing.assert_allclose(hi[k], points.max(axis=0))
+      # The shape's own vertices lie inside its box.
+      placed = shapes[glyph[k]] @ matrices[k, :3, :3].T + matrices[k, :3, 3]
+      self.assertTrue((placed >= lo[k] - 1e-9).all())
+      self.assertTrue((placed <= hi[k] + 1e-9).all())
+
+class Pack(unittest.TestCase):
+  def test_outward(self):
+    # Float32 rounding never shrinks a box.
+    rng = np.random.default_rng(7)
+    lo, hi = aabb.spheres(rng.normal(size=(1000, 3)) * 1e3,
+                          rng.uniform(0.1, 1, 1000))
+    data = aabb.pack(lo, hi)
+    self.assertEqual(data.dtype, np.float32)
+    self.assertEqual(data.shape, (2000, 3))
+    packed_lo, packed_hi = aabb.unpack(data)
+    self.assertTrue((packed_lo <= lo).all())
+    self.assertTrue((packed_hi >= hi).all())
+    self.assertLess(np.abs(packed_lo - lo).max(), 1e-3)
+
+  def test_mismatch(self):
+    with self.assertRaises(ValueError):
+      aabb.pack(np.zeros((3, 3)), np.zeros((2, 3)))
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,75 @@
+import argparse
+import os
+import signal
+import tempfile
+import unittest
+
+from bake import batch, cache, gltf, pipeline
+from bake.mesh import Mesh
+from bake.tests import grid, triangle_set
+
+def _args(*options, timeout=600):
+  parser = argparse.ArgumentParser()
+  pipeline.add_arguments(parser)
+  cache.add_arguments(parser)
+  args = parser.parse_args(list(options))
+  args.timeout = timeout
+  return args
+
+def _models(directory):
+  # models/a.gltf and models/sub/b.glb, each a grid.
+  models = os.path.join(directory, "models")
+  os.makedirs(os.path.join(models, "sub"))
+  for path in ("a.gltf", os.path.join("sub", "b.glb")):
+    gltf.save(os.path.join(models, path), { "asset": { "version": "2.0" } },
+              [Mesh([grid()])])
+  return models
+
+class Batch(unittest.TestCase):
+  def test_discover(self):
+    with tempfile.TemporaryDirectory() as directory:
+      models = _models(directory)
+      os.makedirs(os.path.join(models, "baked"))
+      gltf.save(os.path.join(models, "baked", "c.glb"),
+                { "asset": { "version": "2.0" } }, [Mesh([grid()])])
+      assets = list(batch.discover([models], os.path.join(models, "baked")))
+    self.assertEqual([output for _, output in assets],
+                     [os.path.join("models", "a.gltf"),
+                      os.path.join("models", "sub", "b.glb")])
+
+  def test_bake_asset(self):
+    with tempfile.TemporaryDirectory() as directory:
+      models = _models(directory)
+      output = os.path.join(directory, "baked", "a.glb")
+      entry = batch.bake_asset(_args("--vcache", "--no-cache"),
+                               os.path.join(models, "a.gltf"), output)
+      self.assertEqual(entry["status"], "ok", entry.get("error"))
+      self.assertEqual(entry["outputBytes"], os.path.getsize(output))
+      _, (mesh,) = gltf.load(output)
+      self.assertEqual(triangle_set(mesh.primitives[0]),
+                       triangle_set(grid()))
+
+  def test_failed(self):
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, "broken.gltf")
+      with open(path, 'w') as fh:
+        fh.write("{")
+      entry = batch.bake_asset(_args("--no-cache"), path,
+                               os.path.join(directory, "out.glb"))
+      self.assertEqual(entry["status"], "failed")
+      self.assertTrue(entry["error"].startswith("JSONDecodeError"))
+
+  @unittest.skipUnless(hasattr(signal, "SIGALRM"), "needs SIGALRM")
+  def test_timeout(self):
+    # The alarm fires inside the bake, through the cache's file handling.
+    with tempfile.TemporaryDirectory() as directory:
+      models = _models(directory)
+      args = _args("--vcache", "--cache", os.path.join(directory, "cache"),
+                   timeout=1e-6)
+      entry = batch.bake_asset(args, os.path.join(models, "a.gltf"),
+                               os.path.join(directory, "baked", "a.glb"))
+    self.assertEqual(entry["status"], "timeout")
+    self.assertEqual(entry["error"], "took longer than 1e-06s")
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+import numpy as np
+
+from bake import blas
+from bake.gltf import RAYTRACING
+from bake.tests import box_records, box_scene, boxes
+
+class Partition(unittest.TestCase):
+  def test_chunks(self):
+    # Every box lands in one chunk, and all chunks but one are full.
+    pairs = boxes(1000).reshape(-1, 2, 3)
+    chunks = blas.partition(pairs, 300)
+    self.assertEqual(sorted(np.concatenate(chunks).tolist()),
+                     list(range(1000)))
+    self.assertEqual(sorted(len(c) for c in chunks), [100, 300, 300, 300])
+
+  def test_compact(self):
+    # Two far apart clouds never share a chunk.
+    pairs = boxes(200).reshape(-1, 2, 3)
+    pairs[100:] += 1000
+    for chunk in blas.partition(pairs, 100):
+      self.assertEqual(len(set((chunk >= 100).tolist())), 1)
+
+  def test_empty_chunks(self):
+    with self.assertRaises(ValueError):
+      blas.partition(boxes(10), 0)
+
+class Split(unittest.TestCase):
+  def test_split_boxes(self):
+    # Chunks share the material, whose records follow the boxes into chunk
+    # order, each chunk pointing at its first box's records.
+    gltf, meshes = box_scene(1000)
+    before = box_records(gltf, meshes)
+    split, made = blas.split_boxes(gltf, meshes, 300)
+    self.assertEqual((split, made), (1, 4))
+    self.assertEqual(len(gltf["materials"]), 1)
+    offsets = []
+    for p in meshes[0].primitives:
+      self.assertLessEqual(len(p.attributes["_AABB"]) // 2, 300)
+      self.assertEqual(p.material, 0)
+      offsets.append(p.extras["HEV"]["shaderRecordOffset"])
+    counts = [len(p.attributes["_AABB"]) // 2 for p in meshes[0].primitives]
+    self.assertEqual(offsets, (np.cumsum(counts) - counts).tolist())
+    np.testing.assert_array_equal(box_records(gltf, meshes), before)
+
+  def test_small(self):
+    gltf, meshes = box_scene(100)
+    primitive = meshes[0].primitives[0]
+    self.assertEqual(blas.split_boxes(gltf, meshes, 300), (0, 0))
+    self.assertIs(meshes[0].primitives[0], primitive)
+    self.assertNotIn("HEV", primitive.extras or {})
+    self.assertEqual(len(gltf["materials"][0]["extensions"][RAYTRACING]
+                         ["shaderRecord"]["albedo"]), 100)
+
+if __name__ == "__main__":
+  unittest.main()
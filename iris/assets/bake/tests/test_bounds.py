@@ -0,0 +1,52 @@
+import unittest
+
+import numpy as np
+
+from bake import bounds
+from bake.mesh import Primitive
+from bake.tests import grid
+
+def _ball(count, seed=0):
+  rng = np.random.default_rng(seed)
+  n = rng.normal(size=(count, 3))
+  n /= np.linalg.norm(n, axis=1, keepdims=True)
+  return n * rng.random((count, 1)) ** (1 / 3)
+
+class BoundingSphere(unittest.TestCase):
+  def _contains(self, points, center, radius):
+    self.assertEqual(center.dtype, np.float32)
+    d = np.linalg.norm(np.asarray(points, dtype=np.float64) - center, axis=1)
+    self.assertLessEqual(d.max(), np.float32(radius))
+
+  def test_contains(self):
+    rng = np.random.default_rng(1)
+    clusters = np.concatenate((rng.normal(size=(5000, 3)) * 0.01,
+                               rng.normal(size=(20, 3)) * 100 + 1e4))
+    for points in (_ball(20000) * 1e3 + 5e4, clusters,
+                   grid(32).attributes["POSITION"], np.ones((1, 3))):
+      self._contains(points, *bounds.bounding_sphere(points))
+
+  def test_tight(self):
+    # The points fill the unit ball, so the minimal sphere has radius ~1.
+    center, radius = bounds.bounding_sphere(_ball(100000))
+    self.assertLess(radius, 1.001)
+    self.assertLess(np.linalg.norm(center), 0.01)
+
+  def test_quantized(self):
+    # Normalized positions are bounded as the loader decodes them.
+    rng = np.random.default_rng(2)
+    positions = rng.integers(-32767, 32768, (1000, 3), dtype=np.int16)
+    p = bounds.add_bounding_sphere(Primitive({ "POSITION": positions },
+                                             extras={ "HEV": { "tag": 1 } }))
+    sphere = p.extras["HEV"]["boundingSphere"]
+    self.assertEqual(p.extras["HEV"]["tag"], 1)
+    self._contains(bounds.decoded_positions(p),
+                   np.array(sphere[:3], dtype=np.float32), sphere[3])
+    self.assertLess(sphere[3], 2)
+
+  def test_empty(self):
+    center, radius = bounds.bounding_sphere(np.zeros((0, 3)))
+    self.assertEqual(radius, 0)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+import numpy as np
+
+from bake import bvh
+from bake.mesh import Mesh, Primitive
+from bake.tests import boxes
+
+class Build(unittest.TestCase):
+  def test_tree(self):
+    # Every box is in one leaf, and every node holds its boxes or children.
+    data = boxes(1000)
+    pairs = data.reshape(-1, 2, 3)
+    nodes, primitives = bvh.build(data, leaf=4)
+    self.assertEqual(sorted(primitives.tolist()), list(range(len(pairs))))
+
+    nodes = nodes.view(bvh.NODE).ravel()
+    for node in nodes:
+      if node["count"]:
+        inside = pairs[primitives[node["first"]:
+                                  node["first"] + node["count"]]]
+      else:
+        children = nodes[node["first"]:node["first"] + 2]
+        inside = np.stack((children["min"], children["max"]), axis=1)
+      self.assertTrue((inside[:, 0] >= node["min"]).all())
+      self.assertTrue((inside[:, 1] <= node["max"]).all())
+
+    # Far cheaper to trace than one leaf of every box.
+    stats = bvh.report(nodes)
+    self.assertEqual(stats["leaves"], (len(nodes) + 1) // 2)
+    self.assertEqual(sum(k * n for k, n in enumerate(stats["leafBoxes"])),
+                     len(pairs))
+    self.assertLessEqual(stats["maxLeafBoxes"], 4)
+    self.assertLess(stats["sahCost"], len(pairs) / 10)
+
+  def test_empty(self):
+    nodes, primitives = bvh.build(np.zeros((0, 3), dtype=np.float32))
+    self.assertEqual(len(nodes), 1)
+    self.assertEqual(len(primitives), 0)
+
+  def test_add_bvhs(self):
+    # Primitives sharing boxes share a tree; meshes without boxes get none.
+    data = boxes(100)
+    tables = bvh.add_bvhs([Mesh([Primitive({ "_AABB": data })]),
+                           Mesh([Primitive({ "_AABB": data })]),
+                           Mesh([Primitive({ "POSITION": data })])])
+    self.assertIs(tables[1][0], tables[0][0])
+    self.assertIsNone(tables[2][0])
+    self.assertEqual(bvh.node_array(tables[0][0])["count"].sum(), 100)
+
+if __name__ == "__main__":
+  unittest.main()
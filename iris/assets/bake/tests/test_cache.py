@@ -0,0 +1,73 @@
+import argparse
+import os
+import tempfile
+import unittest
+
+from bake import cache
+
+def _args(directory, **options):
+  args = argparse.Namespace(cache=os.path.join(directory, "cache"),
+                            cache_size=1024, no_cache=False, jobs=4,
+                            quantize=False)
+  for name, value in options.items():
+    setattr(args, name, value)
+  return args
+
+def _write(path, data):
+  with open(path, 'wb') as fh:
+    fh.write(data)
+
+class Cache(unittest.TestCase):
+  def test_key(self):
+    with tempfile.TemporaryDirectory() as directory:
+      source = os.path.join(directory, "in.gltf")
+      _write(source, b"{}")
+      output = os.path.join(directory, "out.glb")
+      k = cache.key([source], _args(directory), output)
+      # Options that only steer the cache or a batch leave the key alone.
+      self.assertEqual(cache.key([source], _args(directory, jobs=1), output),
+                       k)
+      self.assertNotEqual(
+        cache.key([source], _args(directory, quantize=True), output), k)
+      self.assertNotEqual(cache.key([source], _args(directory),
+                                    os.path.join(directory, "out.gltf")), k)
+      _write(source, b"{ }")
+      self.assertNotEqual(cache.key([source], _args(directory), output), k)
+
+  def test_bake(self):
+    with tempfile.TemporaryDirectory() as directory:
+      source = os.path.join(directory, "in.gltf")
+      output = os.path.join(directory, "out.glb")
+      _write(source, b"{}")
+      runs = []
+      def run():
+        runs.append(1)
+        _write(output, b"baked")
+
+      args = _args(directory)
+      self.assertFalse(cache.bake(args, [source], output, run))
+      os.remove(output)
+      self.assertTrue(cache.bake(args, [source], output, run))
+      self.assertEqual(len(runs), 1)
+      with open(output, 'rb') as fh:
+        self.assertEqual(fh.read(), b"baked")
+
+      args.no_cache = True
+      self.assertFalse(cache.bake(args, [source], output, run))
+      self.assertEqual(len(runs), 2)
+
+  def test_evict(self):
+    # Entries beyond the size limit go least recently used first.
+    with tempfile.TemporaryDirectory() as directory:
+      store = cache.Cache(os.path.join(directory, "cache"), size=3.5 / 1024)
+      path = os.path.join(directory, "out.glb")
+      _write(path, bytes(1024))
+      for k in ("a", "b", "c"):
+        store.store(k, [path])
+        os.utime(os.path.join(store.directory, k), (0, ord(k)))
+      self.assertTrue(store.restore("a", path))
+      store.store("d", [path])
+      self.assertEqual(sorted(os.listdir(store.directory)), ["a", "c", "d"])
+
+if __name__ == "__main__":
+  unittest.main()
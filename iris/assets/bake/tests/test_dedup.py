@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from bake import dedup, gltf
+from bake.mesh import Mesh
+from bake.tests import grid, triangle_set
+
+class Materials(unittest.TestCase):
+  def test_merge(self):
+    document = {
+      "images": [{ "uri": "a.png" }, { "uri": "b.png" },
+                 { "uri": "a.png", "name": "copy" }],
+      "samplers": [{ "magFilter": 9729 }, { "magFilter": 9729 }],
+      "textures": [{ "source": 0, "sampler": 0 }, { "source": 1 },
+                   { "source": 2, "sampler": 1 }],
+      "materials": [
+        { "name": "red", "pbrMetallicRoughness": {
+          "baseColorTexture": { "index": 0 } } },
+        { "name": "green", "normalTexture": { "index": 1 } },
+        { "name": "blue", "pbrMetallicRoughness": {
+          "baseColorTexture": { "index": 2 } } }] }
+
+    remap = dedup.dedup_materials(document)
+    self.assertEqual(remap, [0, 1, 0])
+    self.assertEqual(len(document["images"]), 2)
+    self.assertEqual(len(document["samplers"]), 1)
+    self.assertEqual(document["textures"],
+                     [{ "source": 0, "sampler": 0 }, { "source": 1 }])
+    self.assertEqual(document["materials"][1]["normalTexture"]["index"], 1)
+
+class Buffers(unittest.TestCase):
+  def test_merge(self):
+    # Two meshes with equal but separately written geometry.
+    a, b = grid(), grid()
+    b.material = 1
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, "mesh.gltf")
+      gltf.save(path, { "asset": { "version": "2.0" } },
+                [Mesh([a]), Mesh([b])])
+      document, buffers = gltf.read(path)
+    accessors = len(document["accessors"])
+
+    data = dedup.dedup_buffers(document, buffers)
+    self.assertEqual(len(document["accessors"]), accessors // 2)
+    self.assertEqual(document["buffers"], [{ "byteLength": len(data) }])
+    views = document["bufferViews"]
+    self.assertTrue(all(view["byteOffset"] % 4 == 0 for view in views))
+
+    _, meshes = gltf.decode(document, [data])
+    first, second = (mesh.primitives[0] for mesh in meshes)
+    self.assertEqual(triangle_set(first), triangle_set(a))
+    self.assertEqual(triangle_set(second), triangle_set(a))
+    self.assertEqual(second.material, 1)
+    np.testing.assert_array_equal(first.indices, a.indices)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+
+from bake import flatten, normals
+from bake.gltf import set_node_matrix
+from bake.mesh import Mesh, Primitive
+from bake.tests import grid, world_triangles
+
+def _rotation(angle, axis):
+  c, s = np.cos(angle), np.sin(angle)
+  i, j = [k for k in range(3) if k != axis]
+  matrix = np.eye(4)
+  matrix[[i, i, j, j], [i, j, i, j]] = c, -s, s, c
+  return matrix
+
+class Flatten(unittest.TestCase):
+  def test_world_triangles(self):
+    # Mesh 0 is drawn twice so it stays instanced; mesh 1 is baked.
+    p = grid()
+    moved = Primitive({ "POSITION": p.attributes["POSITION"] + 20 },
+                      p.indices)
+    gltf = { "scene": 0, "scenes": [{ "nodes": [0, 1] }],
+             "nodes": [{ "mesh": 0, "children": [2] }, { "mesh": 1 },
+                       { "mesh": 0 }] }
+    set_node_matrix(gltf["nodes"][0], _rotation(0.3, 2))
+    set_node_matrix(gltf["nodes"][2], _rotation(-1.1, 0))
+    meshes = [Mesh([p]), Mesh([moved])]
+    before = world_triangles(gltf, meshes)
+
+    meshes = flatten.flatten(gltf, meshes)
+    self.assertEqual(world_triangles(gltf, meshes), before)
+    self.assertEqual(len(meshes), 2)
+    self.assertEqual(len(gltf["nodes"]), 3)
+    self.assertTrue(all("children" not in node for node in gltf["nodes"]))
+
+  def test_mirrored(self):
+    # A mirroring node transform reverses the winding of the baked triangles
+    # so their faces still point along their normals.
+    p = normals.add_normals(grid())
+    gltf = { "scene": 0, "scenes": [{ "nodes": [0] }],
+             "nodes": [{ "mesh": 0 }] }
+    set_node_matrix(gltf["nodes"][0], np.diag([1.0, -2, 1, 1]))
+
+    (mesh,) = flatten.flatten(gltf, [Mesh([p])])
+    (q,) = mesh.primitives
+    corners = q.attributes["POSITION"][q.indices.reshape(-1, 3)]
+    face = np.cross(corners[:, 1] - corners[:, 0],
+                    corners[:, 2] - corners[:, 0])
+    vertex = q.attributes["NORMAL"][q.indices.reshape(-1, 3)].sum(axis=1)
+    self.assertTrue(((face * vertex).sum(axis=1) > 0).all())
+    self.assertNotIn("matrix", gltf["nodes"][0])
+
+  def test_animated(self):
+    gltf = { "nodes": [{ "mesh": 0 }], "animations": [{ "samplers": [] }] }
+    self.assertIsNone(flatten.flatten(gltf, [Mesh([grid()])]))
+
+if __name__ == "__main__":
+  unittest.main()
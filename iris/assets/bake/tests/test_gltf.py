@@ -0,0 +1,113 @@
+import os
+import struct
+import tempfile
+import unittest
+
+import numpy as np
+
+from bake import gltf
+from bake.mesh import Mesh, Primitive
+from bake.tests import grid
+
+def _mesh():
+  # Two vertex formats: float positions and texcoords, and one with byte
+  # normals whose 3-byte elements need padding.
+  a = grid()
+  rng = np.random.default_rng(1)
+  a.attributes["TEXCOORD_0"] = rng.random((a.vertex_count, 2),
+                                          dtype=np.float32)
+  b = grid(4, seed=2)
+  b.attributes["NORMAL"] = rng.integers(-127, 128, (b.vertex_count, 3),
+                                        dtype=np.int8)
+  return Mesh([a, b, Primitive(dict(a.attributes), a.indices[::-1].copy())])
+
+def _round_trip(name, mesh, layout):
+  with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, name)
+    gltf.save(path, { "asset": { "version": "2.0" } }, [mesh], layout)
+    document, _ = gltf.read(path)
+    _, meshes = gltf.load(path)
+  return document, meshes[0]
+
+def _assert_same(test, mesh, loaded):
+  test.assertEqual(len(loaded.primitives), len(mesh.primitives))
+  for p, q in zip(mesh.primitives, loaded.primitives):
+    test.assertEqual(sorted(q.attributes), sorted(p.attributes))
+    for semantic, arr in p.attributes.items():
+      test.assertEqual(q.attributes[semantic].dtype, arr.dtype)
+      np.testing.assert_array_equal(q.attributes[semantic], arr)
+    np.testing.assert_array_equal(q.indices, p.indices)
+
+class Layout(unittest.TestCase):
+
+  def test_planar(self):
+    mesh = _mesh()
+    _, loaded = _round_trip("planar.gltf", mesh, "planar")
+    _assert_same(self, mesh, loaded)
+
+  def test_interleaved(self):
+    mesh = _mesh()
+    document, loaded = _round_trip("interleaved.gltf", mesh, "interleaved")
+    _assert_same(self, mesh, loaded)
+
+    # One strided view per vertex format, every attribute 4-byte aligned
+    # within it and the stride covering all of them.
+    views = document["bufferViews"]
+    vertex = [v for v in views if v.get("target") == gltf.ARRAY_BUFFER]
+    self.assertEqual(len(vertex), 2)
+    for primitive in document["meshes"][0]["primitives"]:
+      for index in primitive["attributes"].values():
+        accessor = document["accessors"][index]
+        view = views[accessor["bufferView"]]
+        offset = accessor.get("byteOffset", 0)
+        size = np.dtype(gltf.COMPONENT_DTYPES[
+          accessor["componentType"]]).itemsize * \
+          gltf.TYPE_COMPONENTS[accessor["type"]]
+        self.assertEqual(offset % 4, 0)
+        self.assertEqual(view["byteStride"] % 4, 0)
+        self.assertLessEqual(offset % view["byteStride"] + size,
+                             view["byteStride"])
+
+class Glb(unittest.TestCase):
+  def test_round_trip(self):
+    mesh = _mesh()
+    image = np.frombuffer(b"\x89PNG not really", dtype=np.uint8)
+    document = { "asset": { "version": "2.0" },
+                 "images": [{ "mimeType": "image/png", "bufferView": image }] }
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, "mesh.glb")
+      gltf.save(path, document, [mesh])
+      with open(path, 'rb') as fh:
+        data = fh.read()
+      self.assertEqual(os.listdir(directory), ["mesh.glb"])
+      loaded, buffers = gltf.read(path)
+      decoded, meshes = gltf.load(path)
+
+    # Header length matches the file; both chunks start and end on 4 bytes.
+    magic, version, length = struct.unpack_from('<3I', data)
+    self.assertEqual((magic, version, length),
+                     (gltf.GLB_MAGIC, 2, len(data)))
+    jsonLength, _ = struct.unpack_from('<2I', data, 12)
+    binLength, chunkType = struct.unpack_from('<2I', data, 20 + jsonLength)
+    self.assertEqual(chunkType, gltf.GLB_CHUNK_BIN)
+    self.assertEqual(jsonLength % 4, 0)
+    self.assertEqual(binLength % 4, 0)
+    self.assertEqual(28 + jsonLength + binLength, len(data))
+
+    # Accessors are aligned to their component size within the BIN chunk.
+    for accessor in loaded["accessors"]:
+      view = loaded["bufferViews"][accessor["bufferView"]]
+      offset = view.get("byteOffset", 0) + accessor.get("byteOffset", 0)
+      size = np.dtype(gltf.COMPONENT_DTYPES[
+        accessor["componentType"]]).itemsize
+      self.assertEqual(offset % size, 0)
+    self.assertNotIn("uri", loaded["buffers"][0])
+    self.assertGreaterEqual(len(buffers[0]),
+                            loaded["buffers"][0]["byteLength"])
+
+    _assert_same(self, mesh, meshes[0])
+    np.testing.assert_array_equal(decoded["images"][0]["bufferView"], image)
+    self.assertNotIn("uri", decoded["images"][0])
+
+if __name__ == "__main__":
+  unittest.main()
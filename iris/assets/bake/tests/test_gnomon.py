@@ -0,0 +1,43 @@
+import filecmp
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+GNOMON = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                      os.pardir, "models", "Gnomon", "gnomon.py")
+
+def _bake(directory, *args):
+  # Runs gnomon.py in directory, which it writes its output to.
+  subprocess.run([sys.executable, GNOMON, "--gltf", "--no-cache"] +
+                 list(args), cwd=directory, check=True)
+
+def _read(path):
+  # The glTF JSON with accessor bounds as float32: the NumPy path reports
+  # the bounds of the stored floats rather than of the source doubles.
+  with open(path) as fh:
+    gltf = json.load(fh)
+  for accessor in gltf["accessors"]:
+    for key in ("min", "max"):
+      if key in accessor:
+        accessor[key] = np.float32(accessor[key]).tolist()
+  return gltf
+
+class Gnomon(unittest.TestCase):
+  def test_numpy_matches_struct(self):
+    with tempfile.TemporaryDirectory() as struct, \
+         tempfile.TemporaryDirectory() as numpy:
+      _bake(struct)
+      _bake(numpy, "--numpy")
+      self.assertTrue(filecmp.cmp(os.path.join(struct, "gnomon.bin"),
+                                  os.path.join(numpy, "gnomon.bin"),
+                                  shallow=False))
+      self.assertEqual(_read(os.path.join(numpy, "gnomon.gltf")),
+                       _read(os.path.join(struct, "gnomon.gltf")))
+
+if __name__ == "__main__":
+  unittest.main()
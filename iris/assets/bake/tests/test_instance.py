@@ -0,0 +1,101 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+from bake import gltf, instance
+from bake.mesh import Mesh, Primitive
+from bake.tests import grid, world_triangles
+from bake.tests.test_gnomon import GNOMON
+
+def _rotation(angle, axis):
+  c, s = np.cos(angle), np.sin(angle)
+  i, j = [k for k in range(3) if k != axis]
+  matrix = np.eye(4)
+  matrix[[i, i, j, j], [i, j, i, j]] = c, -s, s, c
+  return matrix
+
+def _moved(primitive, matrix):
+  points = primitive.attributes["POSITION"].astype(np.float64)
+  return Primitive({ "POSITION": (points @ matrix[:3, :3].T +
+                                  matrix[:3, 3]).astype(np.float32) },
+                   primitive.indices)
+
+def _collapse(a, b):
+  # Runs instance() over one node per mesh, returning the meshes and whether
+  # the scene still draws the same triangles, up to float32 rounding.
+  document = { "scene": 0, "scenes": [{ "nodes": [0, 1] }],
+               "nodes": [{ "mesh": 0 }, { "mesh": 1 }] }
+  meshes = [Mesh([a]), Mesh([b])]
+  before = world_triangles(document, meshes)
+  meshes = instance.instance(document, meshes)
+  after = world_triangles(document, meshes)
+  return meshes, np.allclose(np.array(after), np.array(before), atol=2e-4)
+
+class Instance(unittest.TestCase):
+  def test_rigid_copy(self):
+    p = grid()
+    matrix = _rotation(0.5, 1)
+    matrix[:3, 3] = (5, -2, 7)
+    meshes, same = _collapse(p, _moved(p, matrix))
+    self.assertEqual(len(meshes), 1)
+    self.assertTrue(same)
+
+  def test_reordered_copy(self):
+    # The copy stores its vertices and triangles in another order and starts
+    # each triangle at another corner.
+    p = grid()
+    matrix = _rotation(-1.2, 2)
+    matrix[:3, 3] = (0, 3, -1)
+    rng = np.random.default_rng(4)
+    perm = rng.permutation(p.vertex_count)
+    inverse = np.empty_like(perm)
+    inverse[perm] = np.arange(len(perm))
+    triangles = inverse[p.indices.reshape(-1, 3)]
+    triangles = np.roll(triangles[rng.permutation(len(triangles))], 1,
+                        axis=1)
+    copy = _moved(Primitive({ "POSITION": p.attributes["POSITION"][perm] },
+                            triangles.ravel().astype(p.indices.dtype)),
+                  matrix)
+    meshes, same = _collapse(p, copy)
+    self.assertEqual(len(meshes), 1)
+    self.assertTrue(same)
+
+  def test_mirrored_copy(self):
+    # A reflection is not a rigid transform.
+    p = grid()
+    matrix = np.diag([-1.0, 1, 1, 1])
+    meshes, same = _collapse(p, _moved(p, matrix))
+    self.assertEqual(len(meshes), 2)
+    self.assertTrue(same)
+
+  def test_gnomon(self):
+    # The three arrows differ only by rotation and material; their cone
+    # tips' normals are up to about 100 degrees apart.
+    with tempfile.TemporaryDirectory() as directory:
+      args = [sys.executable, GNOMON, "--gltf", "--no-cache", "--triangles"]
+      path = os.path.join(directory, "gnomon.gltf")
+      subprocess.run(args, cwd=directory, check=True)
+      before = world_triangles(*gltf.load(path))
+      subprocess.run(args + ["--instance", "120"], cwd=directory,
+                     check=True, stdout=subprocess.DEVNULL)
+      document, _ = gltf.read(path)
+      after = world_triangles(*gltf.load(path))
+
+    arrows = [document["meshes"][i]["primitives"][0] for i in range(3)]
+    for arrow in arrows[1:]:
+      self.assertEqual(arrow["attributes"], arrows[0]["attributes"])
+      self.assertEqual(arrow["indices"], arrows[0]["indices"])
+    self.assertEqual(sorted(arrow["material"] for arrow in arrows),
+                     [0, 1, 2])
+    nodes = [node for node in document["nodes"] if node.get("mesh") in
+             (0, 1, 2)]
+    self.assertEqual(len(nodes), 3)
+    self.assertEqual(sum("matrix" in node for node in nodes), 2)
+    np.testing.assert_allclose(np.array(after), np.array(before), atol=2e-4)
+
+if __name__ == "__main__":
+  unittest.main()
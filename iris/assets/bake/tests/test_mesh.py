@@ -0,0 +1,58 @@
+import unittest
+
+import numpy as np
+
+from bake.gltf import TRIANGLE_FAN, TRIANGLE_STRIP
+from bake.mesh import Primitive, merge_by_material, triangulate
+from bake.tests import triangle_set
+
+def _normals(primitive):
+  # Each triangle's face normal, unnormalized.
+  p = primitive.attributes["POSITION"][
+    primitive.indices.astype(np.intp).reshape(-1, 3)]
+  return np.cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+
+def _strip(count, x=0):
+  # A counter-clockwise zig-zag strip in the z = 0 plane.
+  k = np.arange(count)
+  return Primitive({ "POSITION": np.stack(
+    (x + k // 2, 1 - k % 2, np.zeros(count)), axis=1).astype(np.float32) },
+    mode=TRIANGLE_STRIP)
+
+class Triangulate(unittest.TestCase):
+  def test_strip_winding(self):
+    p = triangulate(_strip(9))
+    self.assertEqual(len(p.indices), 7 * 3)
+    self.assertTrue((_normals(p)[:, 2] > 0).all())
+
+  def test_fan_winding(self):
+    angle = np.linspace(0, np.pi, 7)
+    ring = np.stack((np.cos(angle), np.sin(angle), np.zeros(7)), axis=1)
+    p = triangulate(Primitive({ "POSITION": np.concatenate(
+      ([[0, 0, 0]], ring)).astype(np.float32) }, mode=TRIANGLE_FAN))
+    self.assertEqual(len(p.indices), 6 * 3)
+    self.assertTrue((_normals(p)[:, 2] > 0).all())
+    self.assertTrue((p.indices.reshape(-1, 3)[:, 0] == 0).all())
+
+  def test_indexed_strip_drops_degenerates(self):
+    # Two strips joined by repeating the last and first vertices.
+    p = _strip(8)
+    p.indices = np.array([0, 1, 2, 3, 3, 4, 4, 5, 6, 7], np.uint16)
+    p = triangulate(p)
+    self.assertEqual(len(p.indices), 4 * 3)
+    self.assertTrue((_normals(p)[:, 2] > 0).all())
+
+  def test_merge_by_material(self):
+    strips = [_strip(5 + k, x=10 * k) for k in range(4)]
+    for k, p in enumerate(strips):
+      p.material = k % 2
+    merged = merge_by_material(strips)
+    self.assertEqual([p.material for p in merged], [0, 1])
+    for p in merged:
+      self.assertTrue((_normals(p)[:, 2] > 0).all())
+      self.assertEqual(triangle_set(p), sorted(
+        sum((triangle_set(s) for s in strips if s.material == p.material),
+            [])))
+
+if __name__ == "__main__":
+  unittest.main()
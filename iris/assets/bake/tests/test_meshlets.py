@@ -0,0 +1,71 @@
+import unittest
+
+import numpy as np
+
+from bake import meshlets, vcache
+from bake.mesh import Mesh
+from bake.tests import grid
+
+class Meshlets(unittest.TestCase):
+  def setUp(self):
+    self.primitive = vcache.optimize(grid(32))
+    self.table = meshlets.meshlets(self.primitive)
+
+  def test_tables(self):
+    # The clusters respect the limits and rebuild the index buffer in order.
+    table = self.table
+    indices = self.primitive.indices.reshape(-1, 3)
+    triangle_offset = 0
+    for vertexOffset, vertexCount, triangleOffset, triangleCount in \
+        table["meshlets"].tolist():
+      self.assertLessEqual(vertexCount, meshlets.MAX_VERTICES)
+      self.assertLessEqual(triangleCount, meshlets.MAX_TRIANGLES)
+      self.assertEqual(triangleOffset, triangle_offset)
+      triangle_offset += triangleCount
+      local = table["triangles"][triangleOffset:
+                                 triangleOffset + triangleCount]
+      self.assertLess(local.max(), vertexCount)
+      vertices = table["vertices"][vertexOffset:vertexOffset + vertexCount]
+      np.testing.assert_array_equal(vertices[local], indices[
+        triangleOffset:triangleOffset + triangleCount])
+    self.assertEqual(triangle_offset, len(indices))
+
+  def test_bounds(self):
+    # Spheres hold their cluster's vertices, and a cluster the cone test
+    # culls has no triangle facing the eye.
+    table = self.table
+    positions = self.primitive.attributes["POSITION"].astype(np.float64)
+    triangles = positions[self.primitive.indices.reshape(-1, 3)]
+    normals = np.cross(triangles[:, 1] - triangles[:, 0],
+                       triangles[:, 2] - triangles[:, 0])
+    eyes = meshlets.viewpoints(positions.mean(axis=0), 20) + \
+           np.random.default_rng(5).normal(size=(26, 3))
+    culled = 0
+    for cluster, (vertexOffset, vertexCount, triangleOffset,
+                  triangleCount) in enumerate(table["meshlets"].tolist()):
+      bounds = table["bounds"][cluster].astype(np.float64)
+      points = positions[table["vertices"][vertexOffset:
+                                           vertexOffset + vertexCount]]
+      self.assertLessEqual(
+        np.linalg.norm(points - bounds[:3], axis=1).max(), bounds[3] + 1e-5)
+      faces = slice(triangleOffset, triangleOffset + triangleCount)
+      one = { "meshlets": table["meshlets"][cluster:cluster + 1],
+              "bounds": bounds[None] }
+      for eye in eyes:
+        if meshlets.culled(one, eye[None]):
+          culled += 1
+          facing = (normals[faces] *
+                    (eye - triangles[faces, 0])).sum(axis=1)
+          self.assertTrue((facing <= 1e-9).all())
+    self.assertGreater(culled, 0)
+
+  def test_add_meshlets(self):
+    # Small primitives get no table; shared geometry shares its table.
+    small = grid(2)
+    tables = meshlets.add_meshlets([Mesh([self.primitive, small]),
+                                    Mesh([self.primitive])])
+    self.assertIsNone(tables[0][1])
+    self.assertIs(tables[1][0], tables[0][0])
+
+if __name__ == "__main__":
+  unittest.main()
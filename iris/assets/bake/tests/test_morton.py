@@ -0,0 +1,67 @@
+import unittest
+
+import numpy as np
+
+from bake import morton
+from bake.gltf import RAYTRACING
+from bake.mesh import Primitive
+from bake.tests import box_records, box_scene
+
+class Codes(unittest.TestCase):
+  def test_interleave(self):
+    # x takes the highest bit of each triple, z the lowest.
+    lo, hi = np.zeros(3), np.full(3, 1 << 10)
+    points = np.array([(1, 0, 0), (0, 1, 0), (0, 0, 1), (3, 5, 6)]) + 0.5
+    self.assertEqual(morton.codes(points, lo, hi).tolist(),
+                     [4, 2, 1, 0b011101110])
+    self.assertEqual(morton.codes(points, lo, hi, 63).dtype, np.uint64)
+    with self.assertRaises(ValueError):
+      morton.codes(points, lo, hi, 32)
+
+class Sort(unittest.TestCase):
+  def test_sort_boxes(self):
+    # Boxes move with their albedos into Morton order.
+    gltf, meshes = box_scene(500)
+    before = box_records(gltf, meshes)
+    moved, kept = morton.sort_boxes(gltf, meshes, 30)
+    self.assertEqual((moved, kept), (500, 0))
+    np.testing.assert_array_equal(box_records(gltf, meshes), before)
+
+    pairs = meshes[0].primitives[0].attributes["_AABB"].reshape(-1, 2, 3)
+    centroid = pairs.astype(np.float64).mean(axis=1)
+    code = morton.codes(centroid, centroid.min(axis=0), centroid.max(axis=0))
+    self.assertTrue((np.diff(code.astype(np.int64)) >= 0).all())
+
+  def test_shared_records(self):
+    # Two primitives indexing one material's per-box records stay put.
+    gltf, meshes = box_scene(100)
+    p = meshes[0].primitives[0]
+    other = Primitive({ "_AABB": p.attributes["_AABB"][::-1].copy() },
+                      material=0)
+    meshes[0].primitives.append(other)
+    albedo = gltf["materials"][0]["extensions"][RAYTRACING] \
+                 ["shaderRecord"]["albedo"].copy()
+    self.assertEqual(morton.sort_boxes(gltf, meshes), (0, 200))
+    np.testing.assert_array_equal(gltf["materials"][0]["extensions"]
+                                  [RAYTRACING]["shaderRecord"]["albedo"],
+                                  albedo)
+
+  def test_sort_chunks(self):
+    # The spooled sort of a stream matches sorting it in memory.
+    rng = np.random.default_rng(8)
+    points = rng.normal(size=(5000, 3))
+    ids = np.arange(len(points))
+    lo, hi = points.min(axis=0), points.max(axis=0)
+    for bits in morton.BITS:
+      chunks = ({ "point": points[k:k + 700], "id": ids[k:k + 700] }
+                for k in range(0, len(points), 700))
+      result = list(morton.sort_chunks(chunks, lambda c: c["point"], lo, hi,
+                                       bits, buckets=16))
+      merged = np.concatenate([c["id"] for c in result])
+      code = morton.codes(points, lo, hi, bits)
+      np.testing.assert_array_equal(code[merged],
+                                    np.sort(code, kind='stable'))
+      self.assertEqual(sorted(merged.tolist()), ids.tolist())
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+import numpy as np
+
+from bake import normals
+from bake.mesh import Primitive
+from bake.tests import grid, triangle_set
+
+def _roof():
+  # Two 45 degree slopes meeting at a ridge along x = 2.
+  p = grid(4)
+  positions = p.attributes["POSITION"].copy()
+  positions[:, 2] = -np.abs(positions[:, 0] - 2)
+  return Primitive({ "POSITION": positions }, p.indices,
+                   extras={ "HEV": { "tag": 1 } })
+
+class Normals(unittest.TestCase):
+  def test_smooth(self):
+    p = _roof()
+    q = normals.add_normals(p)
+    self.assertEqual(triangle_set(q), triangle_set(p))
+    self.assertEqual(q.vertex_count, p.vertex_count)
+    self.assertEqual(q.extras, p.extras)
+    x = q.attributes["POSITION"][:, 0]
+    n = q.attributes["NORMAL"]
+    # The ridge averages both slopes, weighted by the faces around it.
+    self.assertTrue((np.abs(n[x == 2, 1]) < 1e-6).all())
+    self.assertTrue((n[x == 2, 2] > 0.75).all())
+    s = 0.5 ** 0.5
+    np.testing.assert_allclose(n[x < 2], np.tile([-s, 0, s],
+                                                 ((x < 2).sum(), 1)),
+                               atol=1e-6)
+
+  def test_area_weighted(self):
+    # A vertex shared by a large and a small face leans toward the large one.
+    positions = np.float32([[0, 0, 0], [4, 0, 0], [0, 4, 0], [0, 0, 1],
+                            [0, -1, 0]])
+    p = Primitive({ "POSITION": positions },
+                  np.uint16([0, 1, 2, 0, 3, 4]))
+    n = normals.add_normals(p).attributes["NORMAL"][0]
+    expected = np.array([0, 0, 16]) + np.array([1, 0, 0])
+    np.testing.assert_allclose(n, expected / np.linalg.norm(expected),
+                               atol=1e-6)
+
+  def test_crease(self):
+    # Faces 90 degrees apart: a 60 degree crease splits the ridge, one copy
+    # per slope with that slope's normal; a 120 degree one keeps it smooth.
+    p = _roof()
+    q = normals.add_normals(p, crease=60)
+    self.assertEqual(triangle_set(q), triangle_set(p))
+    self.assertEqual(q.vertex_count, p.vertex_count + 5)
+    x = q.attributes["POSITION"][:, 0]
+    n = q.attributes["NORMAL"]
+    s = 0.5 ** 0.5
+    self.assertEqual(sorted(map(tuple, np.round(n[x == 2], 4))),
+                     [(-0.7071, 0, 0.7071)] * 5 + [(0.7071, 0, 0.7071)] * 5)
+    np.testing.assert_allclose(n[x > 2], np.tile([s, 0, s],
+                                                 ((x > 2).sum(), 1)),
+                               atol=1e-6)
+
+    q = normals.add_normals(p, crease=120)
+    self.assertEqual(q.vertex_count, p.vertex_count)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+
+import numpy as np
+
+from bake import quantize
+from bake.flatten import world_matrices
+from bake.gltf import INSTANCING, set_node_matrix
+from bake.mesh import Mesh
+from bake.tests import grid
+
+def _dequantized(arr):
+  # Normalized integers as the loader reads them.
+  if arr.dtype.kind == 'f':
+    return arr.astype(np.float64)
+  return np.maximum(arr / np.iinfo(arr.dtype).max, -1)
+
+def _world_positions(gltf, meshes):
+  # The world positions of every primitive the scene draws, ordered by
+  # their first vertex since quantize may move a mesh to a new node.
+  nodes = gltf["nodes"]
+  positions = []
+  for i, matrix in world_matrices(gltf, gltf["scenes"][0]):
+    if "mesh" in nodes[i]:
+      for p in meshes[nodes[i]["mesh"]].primitives:
+        points = _dequantized(p.attributes["POSITION"])
+        positions.append(points @ matrix[:3, :3].T + matrix[:3, 3])
+  return sorted(positions, key=lambda points: tuple(points[0].round(1)))
+
+def _scene():
+  rng = np.random.default_rng(3)
+  p = grid(16)
+  p.attributes["POSITION"] = p.attributes["POSITION"] * 40 - 100
+  normals = rng.normal(size=(p.vertex_count, 3))
+  p.attributes["NORMAL"] = (normals / np.linalg.norm(normals, axis=1,
+                                                     keepdims=True)) \
+                             .astype(np.float32)
+  p.attributes["TEXCOORD_0"] = rng.random((p.vertex_count, 2),
+                                          dtype=np.float32)
+  # The first node has a child, so its mesh moves to a new child node.
+  gltf = { "scene": 0, "scenes": [{ "nodes": [0] }],
+           "nodes": [{ "mesh": 0, "children": [1] }, { "mesh": 0 }] }
+  matrix = np.eye(4)
+  matrix[:3, 3] = (1, 2, 3)
+  set_node_matrix(gltf["nodes"][1], matrix)
+  return gltf, [Mesh([p])]
+
+class Quantize(unittest.TestCase):
+  def test_error_bound(self):
+    gltf, meshes = _scene()
+    before = _world_positions(gltf, meshes)
+    p = meshes[0].primitives[0]
+    center, scale = quantize.position_transform(meshes[0])
+
+    meshes = quantize.quantize(gltf, meshes)
+    q = meshes[0].primitives[0]
+    self.assertEqual(q.attributes["POSITION"].dtype, np.int16)
+    self.assertEqual(q.attributes["NORMAL"].dtype, np.int8)
+    self.assertEqual(q.attributes["TEXCOORD_0"].dtype, np.uint16)
+    self.assertIn(quantize.EXTENSION, gltf["extensionsRequired"])
+
+    # Half a step of each normalized type, with slack for float32 input.
+    after = _world_positions(gltf, meshes)
+    self.assertEqual(len(after), len(before))
+    for a, b in zip(after, before):
+      error = np.abs(a - b).max()
+      self.assertLessEqual(error, scale / 32767 / 2 + 1e-4)
+    for semantic, step in (("NORMAL", 127), ("TEXCOORD_0", 65535)):
+      error = np.abs(_dequantized(q.attributes[semantic]) -
+                     p.attributes[semantic]).max()
+      self.assertLessEqual(error, 1 / step / 2 + 1e-6)
+
+  def test_instanced(self):
+    # Instance transforms apply between the node's and the mesh's, so the
+    # mesh keeps float positions and the node keeps its transform.
+    gltf, meshes = _scene()
+    gltf["nodes"][1]["extensions"] = { INSTANCING: { "attributes": {
+      "TRANSLATION": np.zeros((2, 3), dtype=np.float32) } } }
+    matrix = list(gltf["nodes"][1]["matrix"])
+    positions = meshes[0].primitives[0].attributes["POSITION"]
+
+    meshes = quantize.quantize(gltf, meshes)
+    q = meshes[0].primitives[0]
+    np.testing.assert_array_equal(q.attributes["POSITION"], positions)
+    self.assertEqual(q.attributes["NORMAL"].dtype, np.int8)
+    self.assertEqual(gltf["nodes"][1]["matrix"], matrix)
+    self.assertEqual(len(gltf["nodes"]), 2)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+
+from bake import simplify
+from bake.mesh import Mesh, Primitive
+from bake.tests import grid
+
+def _area(primitive):
+  # The signed area the triangles cover in the xy plane.
+  corners = primitive.attributes["POSITION"][
+    primitive.indices.astype(np.intp).reshape(-1, 3)].astype(np.float64)
+  a, b = corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]
+  return (a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]).sum() / 2
+
+class Simplify(unittest.TestCase):
+  def test_target(self):
+    # Borders only collapse along themselves, so the outline is kept.
+    p = grid(32)
+    q, error = simplify.simplify(p, p.triangle_count // 4)
+    self.assertLessEqual(q.triangle_count, p.triangle_count // 4)
+    self.assertGreater(q.triangle_count, p.triangle_count // 8)
+    self.assertAlmostEqual(_area(q), _area(p), places=3)
+    self.assertGreater(error, 0)
+    self.assertLess(error, 1)
+
+  def test_plane(self):
+    # A flat grid collapses to a few triangles without error.
+    p = grid(16)
+    positions = p.attributes["POSITION"].copy()
+    positions[:, 2] = 0
+    p = Primitive({ "POSITION": positions }, p.indices, material=3)
+    q, error = simplify.simplify(p, 2)
+    self.assertLessEqual(q.triangle_count, 8)
+    self.assertAlmostEqual(_area(q), 256, places=3)
+    self.assertLess(error, 1e-6)
+    self.assertEqual(q.material, 3)
+
+  def test_lods(self):
+    gltf = { "nodes": [{ "mesh": 0, "translation": [1, 2, 3] }] }
+    meshes = simplify.add_lods(gltf, [Mesh([grid(32)], "bumps")],
+                               [0.5, 0.25])
+    self.assertEqual([mesh.name for mesh in meshes],
+                     ["bumps", "bumps_LOD1", "bumps_LOD2"])
+    counts = [mesh.primitives[0].triangle_count for mesh in meshes]
+    self.assertEqual(counts, sorted(counts, reverse=True))
+
+    node = gltf["nodes"][0]
+    self.assertEqual(node["extensions"][simplify.EXTENSION]["ids"], [1, 2])
+    coverage = node["extras"][simplify.COVERAGE]
+    self.assertEqual(len(coverage), 3)
+    self.assertEqual(coverage, sorted(coverage, reverse=True))
+    self.assertEqual(coverage[-1], 0)
+    self.assertEqual(gltf["nodes"][1], { "mesh": 1,
+                                         "translation": [1, 2, 3] })
+    self.assertIn(simplify.EXTENSION, gltf["extensionsUsed"])
+
+if __name__ == "__main__":
+  unittest.main()
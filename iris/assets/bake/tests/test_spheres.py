@@ -0,0 +1,78 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+from bake import gltf
+
+SPHERES = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                       os.pardir, "models", "RaytracedSpheres", "spheres.py")
+
+EXTENSION = "NIST_techniques_raytracing"
+
+def _generate(directory, *args):
+  # Runs spheres.py and returns the glTF and the data of its accessors.
+  path = os.path.join(directory, "spheres.glb")
+  subprocess.run([sys.executable, SPHERES, path, "--count", "1000",
+                  "--chunk", "300"] + list(args), check=True,
+                 stdout=subprocess.DEVNULL)
+  document, buffers = gltf.read(path)
+  return document, [gltf.accessor_data(document, buffers, i)
+                    for i in range(len(document["accessors"]))]
+
+def _boxes(document, data):
+  # The (min, max) pairs of each primitive's _AABB.
+  return [data[p["attributes"]["_AABB"]].reshape(-1, 2, 3)
+          for p in document["meshes"][0]["primitives"]]
+
+def _rows(boxes):
+  # Every primitive's boxes together, in a fixed order.
+  return sorted(map(tuple, np.concatenate(boxes).reshape(-1, 6)))
+
+def _records(document, data):
+  return [data[m["extensions"][EXTENSION]["shaderRecord"]["albedo"]]
+          for m in document["materials"]]
+
+class Spheres(unittest.TestCase):
+  def test_single(self):
+    # By default one lambertian primitive with a single albedo, as in
+    # spheres.gltf.
+    with tempfile.TemporaryDirectory() as directory:
+      document, data = _generate(directory)
+    (boxes,) = _boxes(document, data)
+    self.assertEqual(len(boxes), 1000)
+    sides = boxes[:, 1] - boxes[:, 0]
+    self.assertTrue(np.allclose(sides, sides[:, :1]))
+    self.assertTrue(((sides >= 0.4 - 1e-6) & (sides <= 2 + 1e-6)).all())
+    self.assertEqual(document["materials"][0]["name"], "lambertian")
+    self.assertEqual(_records(document, data)[0].tolist(), [[0.5] * 3])
+    self.assertIn(EXTENSION, document["extensionsRequired"])
+
+  def test_split(self):
+    # One primitive per material holding the same spheres, with an albedo
+    # record per sphere.
+    with tempfile.TemporaryDirectory() as directory:
+      single, single_data = _generate(directory)
+      document, data = _generate(directory, "--split-materials")
+    boxes = _boxes(document, data)
+    records = _records(document, data)
+    self.assertEqual([m["name"] for m in document["materials"]],
+                     ["lambertian", "metal"])
+    self.assertEqual([len(b) for b in boxes], [len(r) for r in records])
+    self.assertEqual(sum(len(b) for b in boxes), 1000)
+    self.assertTrue(((records[0] >= 0.1) & (records[0] <= 0.9)).all())
+    self.assertTrue(((records[1] >= 0.5) & (records[1] <= 1)).all())
+    self.assertEqual(_rows(boxes), _rows(_boxes(single, single_data)))
+
+  def test_metal_needs_split(self):
+    with tempfile.TemporaryDirectory() as directory:
+      with self.assertRaises(subprocess.CalledProcessError):
+        subprocess.run([sys.executable, SPHERES,
+                        os.path.join(directory, "spheres.glb"), "--metal",
+                        "0.5"], check=True, stderr=subprocess.DEVNULL)
+
+if __name__ == "__main__":
+  unittest.main()
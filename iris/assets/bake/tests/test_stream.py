@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from bake import stream
+from bake.gltf import load
+from bake.tests import grid
+
+def _write_ply(path, positions, normals, colors, triangles, order="<"):
+  vertex = np.dtype([(name, order + t) for name, t in (
+    ("x", "f4"), ("y", "f4"), ("z", "f4"), ("nx", "f4"), ("ny", "f4"),
+    ("nz", "f4"), ("red", "u1"), ("green", "u1"), ("blue", "u1"))])
+  face = np.dtype([("n", "u1"), ("v", order + "i4", 3)])
+  rows = np.zeros(len(positions), vertex)
+  for k, name in enumerate("xyz"):
+    rows[name] = positions[:, k]
+    rows["n" + name] = normals[:, k]
+  for k, name in enumerate(("red", "green", "blue")):
+    rows[name] = colors[:, k]
+  faces = np.zeros(len(triangles), face)
+  faces["n"] = 3
+  faces["v"] = triangles
+
+  endian = "little" if order == "<" else "big"
+  with open(path, 'wb') as fh:
+    fh.write("ply\nformat binary_{}_endian 1.0\ncomment bake test\n"
+             "element vertex {}\n".format(endian, len(rows)).encode('ascii'))
+    for name in vertex.names:
+      fh.write("property {} {}\n".format(
+        "uchar" if vertex[name].kind == 'u' else "float", name)
+        .encode('ascii'))
+    fh.write("element face {}\nproperty list uchar int vertex_indices\n"
+             "end_header\n".format(len(faces)).encode('ascii'))
+    fh.write(rows.tobytes())
+    fh.write(faces.tobytes())
+
+class RoundTrip(unittest.TestCase):
+  def _round_trip(self, output, order):
+    p = grid(16)
+    positions = p.attributes["POSITION"]
+    rng = np.random.default_rng(1)
+    normals = rng.normal(size=positions.shape).astype(np.float32)
+    colors = rng.integers(0, 256, positions.shape).astype(np.uint8)
+    triangles = p.indices.reshape(-1, 3)
+
+    with tempfile.TemporaryDirectory() as directory:
+      ply = os.path.join(directory, "scan.ply")
+      path = os.path.join(directory, output)
+      _write_ply(ply, positions, normals, colors, triangles, order)
+      # Chunks smaller than the element counts exercise the spools.
+      stream.bake(path, stream.read_ply(ply, chunk=100), directory=directory)
+      _, (mesh,) = load(path)
+
+    (primitive,) = mesh.primitives
+    np.testing.assert_array_equal(primitive.attributes["POSITION"], positions)
+    np.testing.assert_array_equal(primitive.attributes["NORMAL"], normals)
+    # Colors stay normalized bytes.
+    np.testing.assert_array_equal(primitive.attributes["COLOR_0"], colors)
+    np.testing.assert_array_equal(primitive.indices.reshape(-1, 3),
+                                  triangles)
+
+  def test_glb(self):
+    self._round_trip("scan.glb", "<")
+
+  def test_gltf_big_endian(self):
+    self._round_trip("scan.gltf", ">")
+
+if __name__ == "__main__":
+  unittest.main()
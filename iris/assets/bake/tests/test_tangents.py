@@ -0,0 +1,56 @@
+import unittest
+
+import numpy as np
+
+from bake import tangents
+from bake.tests import grid, triangle_set
+
+def _plane(mirror=False):
+  # A flat grid facing +z with u along x, or with u mirrored about x = 4.
+  p = grid()
+  positions = p.attributes["POSITION"].copy()
+  positions[:, 2] = 0
+  x, y = positions[:, 0], positions[:, 1]
+  u = np.abs(x - 4) if mirror else x
+  p.attributes["POSITION"] = positions
+  p.attributes["NORMAL"] = np.tile(np.float32([0, 0, 1]), (len(x), 1))
+  p.attributes["TEXCOORD_0"] = np.stack((u / 8, y / 8), axis=1) \
+                                 .astype(np.float32)
+  p.extras = { "HEV": { "tag": 1 } }
+  return p
+
+class Tangents(unittest.TestCase):
+  def test_plane(self):
+    p = _plane()
+    q = tangents.add_tangents(p)
+    self.assertEqual(triangle_set(q), triangle_set(p))
+    self.assertEqual(q.vertex_count, p.vertex_count)
+    self.assertEqual(q.extras, p.extras)
+    np.testing.assert_allclose(q.attributes["TANGENT"],
+                               np.tile([1, 0, 0, 1], (q.vertex_count, 1)),
+                               atol=1e-6)
+
+  def test_mirrored(self):
+    # The tangent follows u on both halves; the mirrored half is
+    # left-handed and the vertices on the seam get one copy per side.
+    p = _plane(mirror=True)
+    q = tangents.add_tangents(p)
+    self.assertEqual(triangle_set(q), triangle_set(p))
+    self.assertEqual(q.vertex_count, p.vertex_count + 9)
+    x = q.attributes["POSITION"][:, 0]
+    t = q.attributes["TANGENT"]
+    np.testing.assert_allclose(t[x < 4], np.tile([-1, 0, 0, -1],
+                                                 ((x < 4).sum(), 1)),
+                               atol=1e-6)
+    np.testing.assert_allclose(t[x > 4], np.tile([1, 0, 0, 1],
+                                                 ((x > 4).sum(), 1)),
+                               atol=1e-6)
+    self.assertEqual(sorted(t[x == 4, 3]), [-1] * 9 + [1] * 9)
+
+  def test_existing(self):
+    p = _plane()
+    p.attributes["TANGENT"] = np.zeros((p.vertex_count, 4), np.float32)
+    self.assertIs(tangents.add_tangents(p), p)
+
+if __name__ == "__main__":
+  unittest.main()
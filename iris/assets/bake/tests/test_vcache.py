@@ -0,0 +1,44 @@
+import unittest
+
+import numpy as np
+
+from bake import vcache
+from bake.tests import grid, triangle_set
+
+class Tipsify(unittest.TestCase):
+  def _check(self, p):
+    optimized = vcache.optimize(p)
+    self.assertEqual(triangle_set(optimized), triangle_set(p))
+    self.assertEqual(optimized.indices.dtype, p.indices.dtype)
+    before, _ = vcache.cache_stats(p.indices, p.vertex_count)
+    after, _ = vcache.cache_stats(optimized.indices, p.vertex_count)
+    self.assertLess(after, before)
+
+  def test_optimize(self):
+    self._check(grid(32))
+
+  def test_lockstep(self):
+    # Small regions so a small grid takes the lockstep path with many walks.
+    saved = vcache.LOCKSTEP, vcache.REGION
+    vcache.LOCKSTEP, vcache.REGION = 0, 64
+    try:
+      self._check(grid(32))
+    finally:
+      vcache.LOCKSTEP, vcache.REGION = saved
+
+  def test_fetch(self):
+    p = vcache.optimize(grid(32))
+    fetched = vcache.optimize_fetch(p)
+    self.assertEqual(triangle_set(fetched), triangle_set(p))
+    # Vertices are stored in the order the triangles first use them.
+    _, first = np.unique(fetched.indices, return_index=True)
+    self.assertTrue((np.diff(first) > 0).all())
+
+  def test_extras(self):
+    p = grid()
+    p.extras = { "HEV": { "tag": 1 } }
+    for stage in (vcache.optimize, vcache.optimize_fetch):
+      self.assertEqual(stage(p).extras, p.extras)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+import numpy as np
+
+from bake import weld
+from bake.mesh import Primitive
+from bake.tests import grid, triangle_set
+
+def _unindexed(primitive):
+  # The same triangles with three vertices of their own each.
+  return Primitive({ semantic: arr[primitive.indices]
+                     for semantic, arr in primitive.attributes.items() })
+
+class Weld(unittest.TestCase):
+  def test_weld(self):
+    p = _unindexed(grid())
+    welded = weld.weld(p)
+    self.assertEqual(triangle_set(welded), triangle_set(p))
+    self.assertEqual(welded.vertex_count, grid().vertex_count)
+
+  def test_attributes_split_vertices(self):
+    # Corners at one position with different normals stay apart.
+    p = _unindexed(grid())
+    normals = np.zeros_like(p.attributes["POSITION"])
+    normals[:, 2] = np.repeat(np.arange(len(normals) // 3) % 2, 3)
+    p.attributes["NORMAL"] = normals
+    welded = weld.weld(p, epsilon={ "POSITION": 1e-6 })
+    self.assertEqual(triangle_set(welded), triangle_set(p))
+    self.assertGreater(welded.vertex_count, grid().vertex_count)
+
+  def test_extras(self):
+    p = grid()
+    p.extras = { "HEV": { "tag": 1 } }
+    self.assertEqual(weld.weld(p).extras, p.extras)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,373 @@
+import numpy as np
+
+from bake.gltf import TRIANGLES
+from bake.mesh import Primitive, index_type, triangulate
+
+CACHE_SIZE = 16
+
+# Index buffers longer than SAMPLE indices are simulated over WINDOWS evenly
+# spread windows rather than end to end; each window is warmed up on the
+# WARMUP indices before it, which are simulated but not counted.
+SAMPLE = 1 << 18
+WINDOWS = 64
+WARMUP = 768
+
+# Meshes of more than LOCKSTEP triangles are cut into regions of about REGION
+# triangles whose Tipsify walks advance in lockstep, one fan of each region
+# per NumPy step. Each walk keeps its DEPTH latest candidates as dead ends.
+LOCKSTEP = 1 << 18
+REGION = 8192
+DEPTH = 32
+
+_FREE = np.iinfo(np.int64).max
+
+def adjacency(indices, vertex_count):
+  # CSR vertex -> corner table: the positions in indices of vertex v are
+  # corners[offsets[v]:offsets[v + 1]], its triangles those divided by 3.
+  indices = np.asarray(indices, dtype=np.int64)
+  counts = np.bincount(indices, minlength=vertex_count)
+  offsets = np.zeros(vertex_count + 1, dtype=np.intp)
+  np.cumsum(counts, out=offsets[1:])
+  # Sorting unique (vertex, corner) keys orders each vertex's corners like
+  # a stable argsort would, without its cost.
+  keys = np.sort(indices * len(indices) + np.arange(len(indices)))
+  return offsets, keys % len(indices), counts
+
+def windows(count, sample=SAMPLE):
+  # (start, warm, stop) ranges of an index buffer to simulate from start,
+  # counting warm:stop, and the fraction of the buffer they count.
+  if count <= sample:
+    return [(0, 0, count)], 1.0
+  size = sample // WINDOWS // 3 * 3
+  stops = np.linspace(size, count, WINDOWS).astype(np.intp) // 3 * 3
+  ranges = [(max(stop - size - WARMUP, 0), stop - size, stop)
+            for stop in stops.tolist()]
+  return ranges, size * WINDOWS / count
+
+def fifo_misses(keys, size, warm=0):
+  # Misses of a FIFO cache of size entries over the list keys, counted from
+  # keys[warm] on, with per-key insertion timestamps.
+  stamps = {}
+  time = 0
+  for part in (keys[:warm], keys[warm:]):
+    start = time
+    for key in part:
+      if time - stamps.get(key, -size) >= size:
+        stamps[key] = time
+        time += 1
+  return time - start
+
+def cache_misses(indices, cache_size=CACHE_SIZE):
+  # Post-transform cache misses of a FIFO cache, estimated from windows of
+  # long index buffers.
+  indices = np.asarray(indices)
+  ranges, fraction = windows(len(indices))
+  misses = sum(fifo_misses(indices[start:stop].tolist(), cache_size,
+                           warm - start)
+               for start, warm, stop in ranges)
+  return int(round(misses / fraction))
+
+def cache_stats(indices, vertex_count, cache_size=CACHE_SIZE):
+  misses = cache_misses(indices, cache_size)
+  return misses / max(len(indices) // 3, 1), misses / max(vertex_count, 1)
+
+def _ragged(starts, counts):
+  # The concatenated ranges starts[i]:starts[i] + counts[i].
+  first = np.cumsum(counts) - counts
+  return np.arange(counts.sum()) - np.repeat(first - starts, counts)
+
+def _firsts(keys, scratch):
+  # Mask of the first occurrence of each key, using an int64 scratch array
+  # indexed by key and filled with _FREE, which it is left as.
+  position = np.arange(len(keys))
+  np.minimum.at(scratch, keys, position)
+  first = scratch[keys] == position
+  scratch[keys] = _FREE
+  return first
+
+def _regions(rows, offsets, tris, vertex_count, count, size):
+  # Triangles grown breadth first into regions of about size triangles from
+  # count seeds spread over the numbering. Triangles left over when they all
+  # stop growing seed the next round, with at least twice as many seeds.
+  # Returns the region of each triangle, the step that reached it and the
+  # region of each vertex.
+  region = np.full(len(rows), -1, dtype=np.int64)
+  reached = np.zeros(len(rows), dtype=np.int64)
+  owner = np.full(vertex_count, -1, dtype=np.int64)
+  sizes = np.zeros(0, dtype=np.int64)
+  scratch_t = np.full(len(rows), _FREE, dtype=np.int64)
+  scratch_v = np.full(vertex_count, _FREE, dtype=np.int64)
+  frontier = np.empty(0, dtype=np.int64)
+  step = 0
+
+  while True:
+    if not len(frontier):
+      left = np.flatnonzero(region < 0)
+      if not len(left):
+        return region, reached, owner
+      if len(sizes):
+        count = max(len(left) // size, 2 * count)
+      frontier = np.unique(rows[left[np.linspace(
+        0, len(left) - 1, min(count, len(left))).astype(np.intp)], 0])
+      owner[frontier] = len(sizes) + np.arange(len(frontier))
+      sizes = np.append(sizes, np.zeros(len(frontier), dtype=np.int64))
+
+    counts = offsets[frontier + 1] - offsets[frontier]
+    t = tris[_ragged(offsets[frontier], counts)]
+    r = np.repeat(owner[frontier], counts)
+    fresh = region[t] < 0
+    t, r = t[fresh], r[fresh]
+    first = _firsts(t, scratch_t)
+    t, r = t[first], r[first]
+    region[t] = r
+    reached[t] = step
+    step += 1
+    sizes += np.bincount(r, minlength=len(sizes))
+
+    v = rows[t].ravel()
+    r = np.repeat(r, 3)
+    fresh = (owner[v] < 0) & (sizes[r] < size)
+    v, r = v[fresh], r[fresh]
+    first = _firsts(v, scratch_v)
+    frontier = v[first]
+    owner[frontier] = r[first]
+
+def _lockstep(rows, vertex_count, cache_size):
+  # Tipsify over regions walked side by side: every step emits the fan of
+  # each region's current vertex with array operations and picks the next
+  # ones the same way. Cache stamps within a fan are taken against the clock
+  # at its start, and a walk with no live candidate or dead end restarts at
+  # its region's first unemitted triangle.
+  offsets, corners, _ = adjacency(rows.ravel(), vertex_count)
+  part, reached, owner = _regions(rows, offsets, corners // 3, vertex_count,
+                                  max(len(rows) // REGION, 1), REGION)
+  walkers = int(part.max()) + 1
+
+  # Renumber triangles region by region in the order the search reached
+  # them, and vertices in the order those use them, giving vertices on
+  # region borders a copy for each other region. Each region is then a mesh
+  # of its own held in one stretch of every array.
+  order = np.argsort(part * (reached.max() + 1) + reached, kind='stable')
+  part = part[order]
+  indices = rows[order].ravel().astype(np.int64)
+  corner_part = np.repeat(part, 3)
+  shared = owner[indices] != corner_part
+  _, copy = np.unique(corner_part[shared] * vertex_count + indices[shared],
+                      return_inverse=True)
+  indices[shared] = vertex_count + copy.ravel()
+  first = np.full(vertex_count + shared.sum(), _FREE, dtype=np.int64)
+  np.minimum.at(first, indices, np.arange(len(indices)))
+  count = np.count_nonzero(first < _FREE)
+  renumber = np.empty(len(first), dtype=np.int64)
+  renumber[np.argsort(first)[:count]] = np.arange(count)
+  indices = renumber[indices]
+  offsets, corners, live = adjacency(indices, count)
+  tris = corners // 3
+  rotated = indices.reshape(-1, 3)
+  after = rotated[:, [1, 2, 0]].ravel()[corners]
+  before = rotated[:, [2, 0, 1]].ravel()[corners]
+
+  cursor = np.searchsorted(part, np.arange(walkers))
+  end = np.append(cursor[1:], len(part))
+  fanning = indices[3 * np.minimum(cursor, len(part) - 1)]
+  active = np.flatnonzero(cursor < end)
+
+  stamps = np.zeros(count, dtype=np.int64)
+  scratch = np.full(count, _FREE, dtype=np.int64)
+  emitted = np.zeros(len(rows), dtype=bool)
+  clock = np.full(walkers, cache_size + 1, dtype=np.int64)
+  deadEnd = np.full((walkers, DEPTH), -1, dtype=np.int64)
+  head = np.zeros(walkers, dtype=np.int64)
+  steps = []
+
+  while len(active):
+    f = fanning[active]
+    counts = offsets[f + 1] - offsets[f]
+    e = _ragged(offsets[f], counts)
+    keep = ~emitted[tris[e]]
+    fanned = np.add.reduceat(keep, np.cumsum(counts) - counts, dtype=np.int64)
+    e = e[keep]
+    emitted[tris[e]] = True
+    steps.append(tris[e])
+
+    # Each fan vertex, then the other corners of its triangles, as the
+    # cache sees them.
+    size = 1 + 2 * fanned
+    start = np.cumsum(size) - size
+    v = np.empty(size.sum(), dtype=np.int64)
+    fan = np.zeros(len(v), dtype=bool)
+    fan[start] = True
+    v[fan] = f
+    v[~fan] = np.stack((after[e], before[e]), axis=1).ravel()
+    np.subtract.at(live, v, 1)
+    live[f] = 0
+
+    w = np.repeat(active, size)
+    first = _firsts(v, scratch)
+    v, w = v[first], w[first]
+    miss = clock[w] - stamps[v] > cache_size
+    added = np.bincount(w[miss], minlength=walkers)
+    rank = np.cumsum(miss) - miss - (np.cumsum(added) - added)[w]
+    stamps[v[miss]] = clock[w[miss]] + rank[miss]
+    clock += added
+
+    # The candidate that stays cached through its remaining triangles, the
+    # longest cached first, ties going to the earliest.
+    alive = live[v] > 0
+    v, w = v[alive], w[alive]
+    fanning[active] = -1
+    if len(v):
+      priority = clock[w] - stamps[v]
+      priority[priority + 2 * live[v] > cache_size] = 0
+      group = np.flatnonzero(np.append(True, w[1:] != w[:-1]))
+      best = np.maximum.reduceat(priority * len(v) + np.arange(len(v))[::-1],
+                                 group)
+      chosen = len(v) - 1 - best % len(v)
+      fanning[w[chosen]] = v[chosen]
+
+      rank = np.arange(len(v)) - np.repeat(group, np.diff(np.append(
+        group, len(v))))
+      deadEnd[w, (head[w] + rank) % DEPTH] = v
+      head += np.bincount(w, minlength=walkers)
+
+    need = active[fanning[active] < 0]
+    if len(need):
+      ring = deadEnd[need[:, None],
+                     (head[need, None] - 1 - np.arange(DEPTH)) % DEPTH]
+      ok = (ring >= 0) & (live[ring] > 0)
+      found = ok.any(axis=1)
+      fanning[need[found]] = ring[found, ok[found].argmax(axis=1)]
+      need = need[~found]
+    # Scanning a window of triangles at a time.
+    while len(need):
+      window = cursor[need, None] + np.arange(REGION // 16)
+      ok = (window < end[need, None]) & \
+           ~emitted[np.minimum(window, len(part) - 1)]
+      found = ok.any(axis=1)
+      cursor[need] += REGION // 16
+      cursor[need[found]] = window[found, ok[found].argmax(axis=1)]
+      fanning[need[found]] = indices[3 * cursor[need[found]]]
+      need = need[~found]
+      need = need[cursor[need] < end[need]]
+    active = active[fanning[active] >= 0]
+
+  # Regions one after another, each in the order its walk emitted.
+  t = np.concatenate(steps)
+  return rows[order[t[np.argsort(part[t], kind='stable')]]].ravel()
+
+def tipsify(indices, vertex_count, cache_size=CACHE_SIZE):
+  # Sander, Nehab and Barczak, "Fast Triangle Reordering for Vertex Locality
+  # and Reduced Overdraw", SIGGRAPH 2007.
+  # Below LOCKSTEP triangles the adjacency stays in arrays, each fan read out
+  # as it is visited, and triangles are emitted by number and gathered at
+  # the end.
+  rows = np.asarray(indices).reshape(-1, 3)
+  if len(rows) > LOCKSTEP:
+    return _lockstep(rows, vertex_count, cache_size)
+  offsets, corners, live = adjacency(indices, vertex_count)
+  tris = corners // 3
+  live = live.tolist()
+  first, second, third = rows.T.tolist()
+
+  stamps = [0] * vertex_count
+  emitted = bytearray(len(rows))
+  deadEnd = []
+  output = []
+
+  time = cache_size + 1
+  cursor = 0
+  fanning = 0
+  emit = output.append
+  pushDeadEnd = deadEnd.extend
+
+  while fanning >= 0:
+    candidates = []
+    for t in tris[offsets[fanning]:offsets[fanning + 1]].tolist():
+      if emitted[t]:
+        continue
+      emitted[t] = 1
+      emit(t)
+      tri = (first[t], second[t], third[t])
+      pushDeadEnd(tri)
+      candidates += tri
+      for v in tri:
+        live[v] -= 1
+        if time - stamps[v] > cache_size:
+          stamps[v] = time
+          time += 1
+
+    # Prefer the candidate that will still be in the cache after its
+    # remaining triangles are emitted, breaking ties by age.
+    fanning = -1
+    best = -1
+    for v in candidates:
+      if live[v] > 0:
+        priority = time - stamps[v]
+        if priority + 2 * live[v] > cache_size:
+          priority = 0
+        if priority > best:
+          best = priority
+          fanning = v
+
+    if fanning < 0:
+      while deadEnd:
+        v = deadEnd.pop()
+        if live[v] > 0:
+          fanning = v
+          break
+
+    if fanning < 0:
+      while cursor < vertex_count:
+        if live[cursor] > 0:
+          fanning = cursor
+          break
+        cursor += 1
+
+  return rows[np.asarray(output, dtype=np.intp)].ravel()
+
+def optimize(primitive, cache_size=CACHE_SIZE):
+  if primitive.mode != TRIANGLES or primitive.indices is None:
+    primitive = triangulate(primitive)
+
+  indices = tipsify(primitive.indices, primitive.vertex_count, cache_size)
+  return Primitive(primitive.attributes, indices, TRIANGLES,
+                   primitive.material, primitive.extras)
+
+def fetch_order(indices, vertex_count):
+  used, first = np.unique(np.asarray(indices), return_index=True)
+  order = used[np.argsort(first, kind='stable')]
+  remap = np.full(vertex_count, -1, dtype=np.intp)
+  remap[order] = np.arange(len(order))
+  return order, remap
+
+def fetch_overfetch(primitive, line_size=64, cache_lines=16):
+  # Bytes pulled through a FIFO of vertex-buffer cache lines per attribute,
+  # relative to the attribute's size; 1.0 means every byte is read once.
+  # Long index buffers are simulated over windows.
+  fetched = 0
+  size = 0
+  indices = np.asarray(primitive.indices, dtype=np.intp)
+  ranges, fraction = windows(len(indices))
+  for arr in primitive.attributes.values():
+    stride = arr.nbytes // max(len(arr), 1)
+    misses = 0
+    for start, warm, stop in ranges:
+      window = indices[start:stop] * stride
+      lines = np.stack((window // line_size,
+                        (window + stride - 1) // line_size), axis=1)
+      misses += fifo_misses(lines.ravel().tolist(), cache_lines,
+                            2 * (warm - start))
+    fetched += misses / fraction * line_size
+    size += arr.nbytes
+  return fetched / max(size, 1)
+
+def optimize_fetch(primitive):
+  if primitive.mode != TRIANGLES or primitive.indices is None:
+    primitive = triangulate(primitive)
+
+  order, remap = fetch_order(primitive.indices, primitive.vertex_count)
+  attributes = { semantic: np.ascontiguousarray(arr[order])
+                 for semantic, arr in primitive.attributes.items() }
+  indices = remap[primitive.indices.astype(np.intp)]
+  return Primitive(attributes, indices.astype(index_type(len(order))),
+                   TRIANGLES, primitive.material, primitive.extras)
@@ -0,0 +1,57 @@
+import numpy as np
+
+from bake.gltf import TRIANGLES
+from bake.mesh import Primitive, drop_degenerate, index_type, triangulate
+
+_PRIME = np.uint64(0x100000001B3)
+
+def _quantize(arr, epsilon):
+  arr = arr.reshape(len(arr), -1)
+  if not epsilon:
+    # Adding 0.0 folds -0.0 onto 0.0 so they compare equal bitwise.
+    arr = arr + arr.dtype.type(0) if arr.dtype.kind == 'f' else arr
+    return arr.astype(np.float64).view(np.int64)
+  return np.round(arr.astype(np.float64) / epsilon).astype(np.int64)
+
+def _hash(keys):
+  h = np.full(len(keys), 0xCBF29CE484222325, dtype=np.uint64)
+  for column in keys.T:
+    h ^= column.view(np.uint64)
+    h *= _PRIME
+    h ^= h >> np.uint64(29)
+  return h
+
+def unique_rows(keys):
+  _, first, inverse = np.unique(_hash(keys), return_index=True,
+                                return_inverse=True)
+  inverse = inverse.ravel()
+  if not np.array_equal(keys[first[inverse]], keys):
+    # Hash collision between distinct vertices; fall back to a full row sort.
+    _, first, inverse = np.unique(keys, axis=0, return_index=True,
+                                  return_inverse=True)
+    inverse = inverse.ravel()
+
+  # Keep welded vertices in first-use order rather than hash order.
+  order = np.argsort(first, kind='stable')
+  remap = np.empty_like(order)
+  remap[order] = np.arange(len(order))
+  return first[order], remap[inverse]
+
+def weld(primitive, epsilon=1e-6):
+  if primitive.mode != TRIANGLES or primitive.indices is None:
+    primitive = triangulate(primitive)
+
+  def eps(semantic):
+    return epsilon.get(semantic, 0) if isinstance(epsilon, dict) else epsilon
+
+  keys = np.concatenate([_quantize(arr, eps(semantic))
+                         for semantic, arr in primitive.attributes.items()],
+                        axis=1)
+  first, remap = unique_rows(keys)
+
+  attributes = { semantic: np.ascontiguousarray(arr[first])
+                 for semantic, arr in primitive.attributes.items() }
+  indices = drop_degenerate(remap[primitive.indices.astype(np.intp)])
+
+  return Primitive(attributes, indices.astype(index_type(len(first))),
+                   TRIANGLES, primitive.material, primitive.extras)
@@ -1,6 +1,14 @@
 #!/usr/bin/env python3
+import argparse
 import json
+import os
 import struct
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, os.pardir))
+import bake.cache
+import bake.pipeline
 
 meshdata = [
   {
@@ -1868,7 +1876,7 @@ def max_element3(arr, start, count):
 
   return m
 
-if __name__ == "__main__":
+def bake_struct():
   with open('gnomon.bin', 'wb') as fh:
     o = 0
     k = 0
@@ -1954,3 +1962,49 @@ if __name__ == "__main__":
 
   with open('gnomon.gltf', 'w') as fh:
     json.dump(gltf, fh, indent=2)
+
+def load_meshes():
+  import bake.gltf
+  import bake.mesh
+
+  meshes = []
+  for data in meshdata:
+    vs = bake.gltf.as_float32(data['v'])
+    ns = bake.gltf.as_float32(data['n'])
+
+    primitives = []
+    start = 0
+    for count in data['l']:
+      primitives.append(bake.mesh.Primitive({
+        "POSITION": vs[start:start + count],
+        "NORMAL": ns[start:start + count]
+      }, mode=bake.gltf.TRIANGLE_STRIP, material=data['m']))
+      start += count
+
+    meshes.append(bake.mesh.Mesh(primitives))
+
+  return meshes
+
+def bake_numpy(args):
+  meshes = bake.pipeline.run(gltf, load_meshes(), args)
+  bake.pipeline.save('gnomon.gltf' if args.gltf else 'gnomon.glb', gltf,
+                     meshes, args)
+
+def parse_args():
+  parser = argparse.ArgumentParser(description="Bake gnomon.glb")
+  parser.add_argument('--numpy', action='store_true',
+                      help="Use the NumPy bake path (for large meshes).")
+  parser.add_argument('--gltf', action='store_true',
+                      help="Write gnomon.gltf and gnomon.bin instead of "
+                           "gnomon.glb.")
+  bake.pipeline.add_arguments(parser)
+  bake.cache.add_arguments(parser)
+  args = parser.parse_args()
+  args.numpy |= bake.pipeline.enabled(args) or not args.gltf
+  return args
+
+if __name__ == "__main__":
+  args = parse_args()
+  output = 'gnomon.gltf' if args.gltf else 'gnomon.glb'
+  bake.cache.bake(args, [__file__], output,
+                  lambda: bake_numpy(args) if args.numpy else bake_struct())
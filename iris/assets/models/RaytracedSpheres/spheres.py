@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# Generates NIST_techniques_raytracing sphere scenes like spheres.gltf, from
+# a handful to tens of millions of spheres. Spheres are made a chunk at a
+# time and streamed to disk, so memory stays bounded whatever the count.
+# As in spheres.gltf, one primitive's _AABB holds a min/max pair per sphere
+# and its material's shaderRecord holds a single albedo. --split-materials
+# instead writes one primitive per material with a color per sphere, which
+# the shaders in assets/shaders do not read yet.
+#
+#   ./spheres.py --count 1000000 --distribution clusters --morton 30 \
+#     spheres-1m.glb
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, os.pardir))
+import bake.aabb
+import bake.gltf
+import bake.morton
+import bake.stream
+
+EXTENSION = "NIST_techniques_raytracing"
+
+# The shaders and binding table of spheres.gltf.
+SHADERS = [
+  { "type": 256, "uri": "assets/shaders/raygen.rgen" },
+  { "type": 2048, "uri": "assets/shaders/miss.rmiss" },
+  { "type": 4096, "uri": "assets/shaders/sphere.rint" },
+  { "type": 1024, "uri": "assets/shaders/lambertian.rchit" },
+  { "type": 1024, "uri": "assets/shaders/metal.rchit" }
+]
+
+SHADER_BINDING_TABLE = {
+  "raygenShader": 0,
+  "missShader": 1,
+  "hitShaders": [
+    { "intersectionShader": 2, "closestHitShader": 3 },
+    { "intersectionShader": 2, "closestHitShader": 4 }
+  ]
+}
+
+# Material names by their hitShaders index, with the albedo range drawn from.
+MATERIALS = [("lambertian", 0.1, 0.9), ("metal", 0.5, 1.0)]
+
+# The albedo record of the single material without --split-materials.
+ALBEDO = (0.5, 0.5, 0.5)
+
+DISTRIBUTIONS = ("uniform", "clusters", "shell", "plane")
+
+def default_extent(count, min_radius, max_radius, distribution):
+  # Half the side of the region the spheres are spread over, large enough
+  # that they overlap little: about four mean radii between neighbours.
+  spacing = 2 * (min_radius + max_radius)
+  if distribution == "plane":
+    return spacing * count ** (1 / 2) / 2
+  if distribution == "shell":
+    return spacing * (count / (4 * np.pi)) ** (1 / 2)
+  return spacing * count ** (1 / 3) / 2
+
+def centers(rng, count, distribution, extent, clusters):
+  if distribution == "uniform":
+    return rng.uniform(-extent, extent, (count, 3))
+  if distribution == "clusters":
+    # Gaussian blobs around fixed cluster centers, a few sigma apart.
+    which = rng.integers(len(clusters), size=count)
+    sigma = extent / len(clusters) ** (1 / 3) / 4
+    return clusters[which] + rng.normal(0, sigma, (count, 3))
+  if distribution == "shell":
+    d = rng.normal(size=(count, 3))
+    d /= np.linalg.norm(d, axis=1)[:, None]
+    return d * extent
+  # Resting on the y = 0 plane; y is filled in from the radius.
+  xz = rng.uniform(-extent, extent, (count, 2))
+  return np.stack((xz[:, 0], np.zeros(count), xz[:, 1]), axis=1)
+
+def generate(count, distribution="uniform", min_radius=0.2, max_radius=1.0,
+             extent=None, clusters=16, metal=0.25, seed=0, chunk=1 << 20):
+  # Yields chunks of spheres as dicts of "center", "radius", "material"
+  # (hitShaders index) and "albedo" arrays. Radii are log-uniform.
+  rng = np.random.default_rng(seed)
+  if extent is None:
+    extent = default_extent(count, min_radius, max_radius, distribution)
+  cluster_centers = rng.uniform(-extent, extent, (max(clusters, 1), 3))
+  lo = np.array([m[1] for m in MATERIALS])
+  hi = np.array([m[2] for m in MATERIALS])
+
+  for start in range(0, count, chunk):
+    n = min(chunk, count - start)
+    radius = np.exp(rng.uniform(np.log(min_radius), np.log(max_radius), n))
+    center = centers(rng, n, distribution, extent, cluster_centers)
+    if distribution == "plane":
+      center[:, 1] = radius
+    material = (rng.random(n) < metal).astype(np.intp)
+    albedo = lo[material, None] + \
+             (hi - lo)[material, None] * rng.random((n, 3))
+    yield {
+      "center": center,
+      "radius": radius,
+      "material": material,
+      "albedo": albedo
+    }
+
+def morton_sorted(chunks, bits=30, directory=None):
+  # The spheres of chunks(), a chunk generator function, in Morton order of
+  # their centers. The chunks are generated twice: once for the bounds of
+  # the centers and once to sort them through bucket spools.
+  lo = np.full(3, np.inf)
+  hi = np.full(3, -np.inf)
+  for chunk in chunks():
+    lo = np.minimum(lo, chunk["center"].min(axis=0))
+    hi = np.maximum(hi, chunk["center"].max(axis=0))
+  return bake.morton.sort_chunks(chunks(), lambda chunk: chunk["center"],
+                                 lo, hi, bits, directory=directory)
+
+def _spool_single(chunks, directory):
+  # All spheres in one lambertian primitive with one albedo record.
+  boxes = bake.stream.Spool(directory)
+  for chunk in chunks:
+    boxes.write(bake.aabb.pack(*bake.aabb.spheres(
+      chunk["center"], chunk["radius"])), bounds=True)
+  albedo = bake.stream.Spool(directory)
+  albedo.write(np.array([ALBEDO], np.float32))
+  return [(boxes, albedo)]
+
+def _spool_split(chunks, directory):
+  # One primitive per material with an albedo record per sphere.
+  spools = [(bake.stream.Spool(directory), bake.stream.Spool(directory))
+            for _ in MATERIALS]
+  for chunk in chunks:
+    for m, (boxes, albedo) in enumerate(spools):
+      mask = chunk["material"] == m
+      if mask.any():
+        boxes.write(bake.aabb.pack(*bake.aabb.spheres(
+          chunk["center"][mask], chunk["radius"][mask])), bounds=True)
+        albedo.write(chunk["albedo"][mask].astype(np.float32))
+  return spools
+
+def write(path, chunks, directory=None, split=False):
+  # Streams the spheres into one primitive, or one per material with split,
+  # and writes the asset, GLB or .gltf with .bin by extension.
+  spools = (_spool_split if split else _spool_single)(chunks, directory)
+  used = [m for m, (boxes, _) in enumerate(spools) if boxes.count]
+  if not used:
+    raise ValueError("{}: no spheres".format(path))
+
+  gltf = {
+    "asset": { "version": "2.0" },
+    "scene": 0,
+    "scenes": [{ "nodes": [0] }],
+    "nodes": [{ "mesh": 0 }],
+    "meshes": [{ "primitives": [] }],
+    "materials": [],
+    "extensions": { EXTENSION: {
+      "shaderBindingTable": SHADER_BINDING_TABLE,
+      "shaders": SHADERS
+    } },
+    "accessors": [],
+    "bufferViews": []
+  }
+  bake.gltf.add_extension(gltf, EXTENSION, required=True)
+
+  accessors, byteLength = bake.stream.layout(gltf, [
+    (name, s) for m in used
+    for name, s in zip(("_AABB", "albedo"), spools[m])])
+  for i, m in enumerate(used):
+    gltf["meshes"][0]["primitives"].append({
+      "attributes": { "_AABB": accessors[2 * i] },
+      "material": i
+    })
+    gltf["materials"].append({
+      "name": MATERIALS[m][0],
+      "extensions": { EXTENSION: {
+        "hitShaders": m,
+        "shaderRecord": { "albedo": accessors[2 * i + 1] }
+      } }
+    })
+
+    # Shader record data is not vertex data.
+    view = gltf["accessors"][accessors[2 * i + 1]]["bufferView"]
+    del gltf["bufferViews"][view]["target"]
+
+  bake.stream.write_spools(path, gltf, [s for m in used for s in spools[m]],
+                           byteLength, directory)
+  return gltf
+
+def parse_args():
+  parser = argparse.ArgumentParser(
+    description="Generate a ray traced sphere scene")
+  parser.add_argument('output', nargs='?', default='spheres.glb',
+                      help="Output .gltf or .glb file.")
+  parser.add_argument('--count', '-n', type=int, default=1000,
+                      help="Number of spheres.")
+  parser.add_argument('--distribution', choices=DISTRIBUTIONS,
+                      default="uniform",
+                      help="How sphere centers are spread: uniformly in a "
+                           "cube, in Gaussian clusters, on a spherical shell "
+                           "or on the ground plane.")
+  parser.add_argument('--clusters', type=int, default=16,
+                      help="Number of clusters for --distribution clusters.")
+  parser.add_argument('--extent', type=float,
+                      help="Half the side of the cube, or the shell radius "
+                           "(default: grows with the count so spheres "
+                           "rarely overlap).")
+  parser.add_argument('--min-radius', type=float, default=0.2)
+  parser.add_argument('--max-radius', type=float, default=1.0)
+  parser.add_argument('--split-materials', action='store_true',
+                      help="Write one primitive per material with an albedo "
+                           "per sphere instead of one lambertian primitive "
+                           "with a single albedo.")
+  parser.add_argument('--metal', type=float, metavar='FRACTION',
+                      help="With --split-materials, the fraction of the "
+                           "spheres that are metal rather than lambertian "
+                           "(default: 0.25).")
+  parser.add_argument('--morton', type=int, choices=bake.morton.BITS,
+                      metavar='BITS',
+                      help="Write the spheres in the order of the 30 or "
+                           "63-bit Morton code of their centers.")
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--chunk', type=int, default=1 << 20, metavar='SPHERES',
+                      help="Spheres generated and written at a time.")
+  parser.add_argument('--tmpdir', metavar='DIR',
+                      help="Directory for the temporary spools.")
+  args = parser.parse_args()
+  if args.count < 1:
+    parser.error("--count must be positive")
+  if not 0 < args.min_radius <= args.max_radius:
+    parser.error("radii must satisfy 0 < --min-radius <= --max-radius")
+  if args.metal is not None and not args.split_materials:
+    parser.error("--metal needs --split-materials")
+  if args.metal is None:
+    args.metal = 0.25
+  return args
+
+if __name__ == "__main__":
+  args = parse_args()
+  start = time.perf_counter()
+
+  def chunks():
+    return generate(args.count, args.distribution, args.min_radius,
+                    args.max_radius, args.extent, args.clusters, args.metal,
+                    args.seed, args.chunk)
+
+  if args.morton is not None:
+    gltf = write(args.output, morton_sorted(chunks, args.morton, args.tmpdir),
+                 args.tmpdir, args.split_materials)
+  else:
+    gltf = write(args.output, chunks(), args.tmpdir, args.split_materials)
+  print("spheres: {} spheres in {} primitives, {} bytes, {:.2f}s".format(
+    args.count, len(gltf["meshes"][0]["primitives"]),
+    gltf["buffers"][0]["byteLength"], time.perf_counter() - start))
@@ -36,9 +36,11 @@ struct Traceable {
     VkGeometryNV geometry{};
     bool bottomLevelDirty{true};
     AccelerationStructure bottomLevelAccelerationStructure{};
+    std::uint32_t customIndex{0}; // first box in spheresBuffer
   };
 
   absl::InlinedVector<Geometry, 128> geometries;
+  Buffer spheresBuffer{}; // every geometry's boxes, in order
   bool topLevelDirty{true};
   AccelerationStructure topLevelAccelerationStructure{};
 
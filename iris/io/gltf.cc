@@ -29,9 +29,15 @@
 #include "renderer_private.h"
 #include "stb_image.h"
 #include "stb_image_resize.h"
+#include <algorithm>
+#include <cmath>
+#include <cstdint>
+#include <cstring>
+#include <limits>
 #include <map>
 #include <optional>
 #include <string>
+#include <type_traits>
 #include <vector>
 
 namespace nlohmann {
@@ -409,6 +415,8 @@ struct Primitive {
   std::optional<int> material;           // index into gltf.materials
   std::optional<int> mode;
   std::optional<std::vector<int>> targets;
+  std::optional<glm::vec4> boundingSphere;
+  std::optional<std::uint32_t> shaderRecordOffset;
 }; // struct Primitive
 
 void to_json(json& j, Primitive const& prim) {
@@ -417,6 +425,12 @@ void to_json(json& j, Primitive const& prim) {
   if (prim.material) j["material"] = *prim.material;
   if (prim.mode) j["mode"] = *prim.mode;
   if (prim.targets) j["targets"] = *prim.targets;
+  if (prim.boundingSphere) {
+    j["extras"]["HEV"]["boundingSphere"] = *prim.boundingSphere;
+  }
+  if (prim.shaderRecordOffset) {
+    j["extras"]["HEV"]["shaderRecordOffset"] = *prim.shaderRecordOffset;
+  }
 }
 
 void from_json(json const& j, Primitive& prim) {
@@ -427,6 +441,18 @@ void from_json(json const& j, Primitive& prim) {
   if (j.find("targets") != j.end()) {
     prim.targets = j["targets"].get<decltype(Primitive::targets)::value_type>();
   }
+  if (j.find("extras") != j.end()) {
+    auto&& e = j["extras"];
+    if (e.find("HEV") != e.end()) {
+      auto&& h = e["HEV"];
+      if (h.find("boundingSphere") != h.end()) {
+        prim.boundingSphere = h["boundingSphere"].get<glm::vec4>();
+      }
+      if (h.find("shaderRecordOffset") != h.end()) {
+        prim.shaderRecordOffset = h["shaderRecordOffset"];
+      }
+    }
+  }
 }
 
 struct Mesh {
@@ -924,15 +950,20 @@ GetAccessorData(int index, std::string const& accessorType,
       std::system_error(Error::kFileParseFailed, "too few buffers"));
   }
 
-  int const bufferByteStride =
-    bufferView.byteStride.value_or(AccessorTypeByteSize(accessorType)) / 4;
-  std::size_t const componentTypeSize =
+  // Elements are byteStride bytes apart, or tightly packed without one.
+  std::size_t const elementSize =
+    AccessorTypeByteSize(accessorType) / 4 *
     AccessorComponentTypeSize(accessor.componentType);
-  int const byteOffset =
+  std::size_t const byteStride =
+    bufferView.byteStride ? static_cast<std::size_t>(*bufferView.byteStride)
+                          : elementSize;
+  std::size_t const byteOffset =
     bufferView.byteOffset.value_or(0) + accessor.byteOffset.value_or(0);
 
   auto&& bufferBytes = buffersBytes[bufferView.buffer];
-  if (bufferBytes.size() < byteOffset + componentTypeSize * accessor.count) {
+  if (accessor.count > 0 &&
+      bufferBytes.size() <
+        byteOffset + byteStride * (accessor.count - 1) + elementSize) {
     return unexpected(
       std::system_error(Error::kFileParseFailed, "buffer too small"));
   }
@@ -941,47 +972,47 @@ GetAccessorData(int index, std::string const& accessorType,
   data.resize(accessor.count);
 
   switch (accessor.componentType) {
-  case 5120: {
-    auto p = reinterpret_cast<char*>(bytes);
-    for (int i = 0; i < accessor.count; ++i, p += bufferByteStride) {
-      data[i] = GetAccessorDataComponent<T>(gsl::not_null(p));
+  case 5120:
+    for (int i = 0; i < accessor.count; ++i) {
+      data[i] = GetAccessorDataComponent<T>(
+        gsl::not_null(reinterpret_cast<char*>(bytes + byteStride * i)));
     }
-  } break;
+    break;
 
-  case 5121: {
-    auto p = reinterpret_cast<unsigned char*>(bytes);
-    for (int i = 0; i < accessor.count; ++i, p += bufferByteStride) {
-      data[i] = GetAccessorDataComponent<T>(gsl::not_null(p));
+  case 5121:
+    for (int i = 0; i < accessor.count; ++i) {
+      data[i] = GetAccessorDataComponent<T>(gsl::not_null(
+        reinterpret_cast<unsigned char*>(bytes + byteStride * i)));
     }
-  } break;
+    break;
 
-  case 5122: {
-    auto p = reinterpret_cast<short*>(bytes);
-    for (int i = 0; i < accessor.count; ++i, p += bufferByteStride) {
-      data[i] = GetAccessorDataComponent<T>(gsl::not_null(p));
+  case 5122:
+    for (int i = 0; i < accessor.count; ++i) {
+      data[i] = GetAccessorDataComponent<T>(
+        gsl::not_null(reinterpret_cast<short*>(bytes + byteStride * i)));
     }
-  } break;
+    break;
 
-  case 5123: {
-    auto p = reinterpret_cast<unsigned short*>(bytes);
-    for (int i = 0; i < accessor.count; ++i, p += bufferByteStride) {
-      data[i] = GetAccessorDataComponent<T>(gsl::not_null(p));
+  case 5123:
+    for (int i = 0; i < accessor.count; ++i) {
+      data[i] = GetAccessorDataComponent<T>(gsl::not_null(
+        reinterpret_cast<unsigned short*>(bytes + byteStride * i)));
     }
-  } break;
+    break;
 
-  case 5125: {
-    auto p = reinterpret_cast<unsigned int*>(bytes);
-    for (int i = 0; i < accessor.count; ++i, p += bufferByteStride) {
-      data[i] = GetAccessorDataComponent<T>(gsl::not_null(p));
+  case 5125:
+    for (int i = 0; i < accessor.count; ++i) {
+      data[i] = GetAccessorDataComponent<T>(
+        gsl::not_null(reinterpret_cast<unsigned int*>(bytes + byteStride * i)));
     }
-  } break;
+    break;
 
-  case 5126: {
-    auto p = reinterpret_cast<float*>(bytes);
-    for (int i = 0; i < accessor.count; ++i, p += bufferByteStride) {
-      data[i] = GetAccessorDataComponent<T>(gsl::not_null(p));
+  case 5126:
+    for (int i = 0; i < accessor.count; ++i) {
+      data[i] = GetAccessorDataComponent<T>(
+        gsl::not_null(reinterpret_cast<float*>(bytes + byteStride * i)));
     }
-  } break;
+    break;
 
   default:
     return unexpected(
@@ -1003,6 +1034,187 @@ GetAccessorData(int index, std::string const& accessorType,
                             canBeZero, accessors, bufferViews, buffersBytes);
 } // GetAccessorData
 
+template <class C>
+float DequantizeComponent(std::byte const* p, bool normalized) {
+  C c;
+  std::memcpy(&c, p, sizeof(c));
+  if (!normalized) return static_cast<float>(c);
+  float const f =
+    static_cast<float>(c) / static_cast<float>(std::numeric_limits<C>::max());
+  return std::is_signed_v<C> ? std::max(f, -1.f) : f;
+}
+
+// Reads a vertex attribute as floats: FLOAT components as they are, and the
+// BYTE, UNSIGNED_BYTE, SHORT and UNSIGNED_SHORT components allowed by
+// KHR_mesh_quantization converted to float, mapped back to [-1, 1] or [0, 1]
+// when the accessor is normalized. Quantized positions stay in the integer
+// grid; the node matrices written with them dequantize them.
+template <class T>
+expected<std::vector<T>, std::system_error>
+GetAttributeData(int index, std::string const& accessorType,
+                 std::optional<std::vector<Accessor>> const& accessors,
+                 std::optional<std::vector<BufferView>> const& bufferViews,
+                 std::vector<std::vector<std::byte>> const& buffersBytes) {
+  if (!accessors || accessors->size() <= static_cast<std::size_t>(index)) {
+    return unexpected(
+      std::system_error(Error::kFileParseFailed, "too few accessors"));
+  }
+
+  auto&& accessor = (*accessors)[index];
+  if (accessor.componentType == 5126) {
+    return GetAccessorData<T>(index, accessorType, 5126, true, accessors,
+                              bufferViews, buffersBytes);
+  }
+
+  if (accessor.type != accessorType) {
+    return unexpected(std::system_error(
+      Error::kFileParseFailed, "accessor has wrong type '" + accessor.type +
+                                 "'; expecting '" + accessorType + "'"));
+  }
+  if (accessor.componentType != 5120 && accessor.componentType != 5121 &&
+      accessor.componentType != 5122 && accessor.componentType != 5123) {
+    return unexpected(std::system_error(Error::kFileParseFailed,
+                                        "accessor has wrong componentType"));
+  }
+  // Without a bufferView the accessor is all zeros.
+  if (!accessor.bufferView) return std::vector<T>(accessor.count, T{0.f});
+
+  if (!bufferViews ||
+      bufferViews->size() <= static_cast<std::size_t>(*accessor.bufferView)) {
+    return unexpected(
+      std::system_error(Error::kFileParseFailed, "too few bufferViews"));
+  }
+
+  auto&& bufferView = (*bufferViews)[*accessor.bufferView];
+  if (buffersBytes.size() <= static_cast<std::size_t>(bufferView.buffer)) {
+    return unexpected(
+      std::system_error(Error::kFileParseFailed, "too few buffers"));
+  }
+
+  glm::length_t const components = T::length();
+  std::size_t const componentSize =
+    AccessorComponentTypeSize(accessor.componentType);
+  std::size_t const elementSize = components * componentSize;
+  std::size_t const stride =
+    bufferView.byteStride.value_or(gsl::narrow_cast<int>(elementSize));
+  std::size_t const byteOffset =
+    bufferView.byteOffset.value_or(0) + accessor.byteOffset.value_or(0);
+
+  auto&& bufferBytes = buffersBytes[bufferView.buffer];
+  if (accessor.count > 0 &&
+      bufferBytes.size() <
+        byteOffset + stride * (accessor.count - 1) + elementSize) {
+    return unexpected(
+      std::system_error(Error::kFileParseFailed, "buffer too small"));
+  }
+
+  bool const normalized = accessor.normalized.value_or(false);
+  std::vector<T> data(accessor.count);
+
+  for (int i = 0; i < accessor.count; ++i) {
+    std::byte const* p = bufferBytes.data() + byteOffset + stride * i;
+    for (glm::length_t c = 0; c < components; ++c, p += componentSize) {
+      switch (accessor.componentType) {
+      case 5120:
+        data[i][c] = DequantizeComponent<std::int8_t>(p, normalized);
+        break;
+      case 5121:
+        data[i][c] = DequantizeComponent<std::uint8_t>(p, normalized);
+        break;
+      case 5122:
+        data[i][c] = DequantizeComponent<std::int16_t>(p, normalized);
+        break;
+      case 5123:
+        data[i][c] = DequantizeComponent<std::uint16_t>(p, normalized);
+        break;
+      }
+    }
+  }
+
+  return data;
+} // GetAttributeData
+
+// Reads the _NORMAL_OCT (VEC2) and _TANGENT_OCT (VEC3) attributes written by
+// the bake --octahedral stage: unit vectors octahedral encoded as normalized
+// BYTE or SHORT components, with the tangent's bitangent sign third. Returns
+// the decoded vectors with the sign (1 for normals) in w.
+expected<std::vector<glm::vec4>, std::system_error>
+GetOctahedralData(int index, std::string const& accessorType,
+                  std::optional<std::vector<Accessor>> const& accessors,
+                  std::optional<std::vector<BufferView>> const& bufferViews,
+                  std::vector<std::vector<std::byte>> const& buffersBytes) {
+  std::vector<glm::vec4> data;
+
+  if (!accessors || accessors->size() <= static_cast<std::size_t>(index)) {
+    return unexpected(
+      std::system_error(Error::kFileParseFailed, "too few accessors"));
+  }
+
+  auto&& accessor = (*accessors)[index];
+  if (accessor.type != accessorType) {
+    return unexpected(std::system_error(
+      Error::kFileParseFailed, "accessor has wrong type '" + accessor.type +
+                                 "'; expecting '" + accessorType + "'"));
+  }
+  if (accessor.componentType != 5120 && accessor.componentType != 5122) {
+    return unexpected(std::system_error(Error::kFileParseFailed,
+                                        "accessor has wrong componentType"));
+  }
+  if (!accessor.bufferView || !bufferViews ||
+      bufferViews->size() <= static_cast<std::size_t>(*accessor.bufferView)) {
+    return unexpected(
+      std::system_error(Error::kFileParseFailed, "too few bufferViews"));
+  }
+
+  auto&& bufferView = (*bufferViews)[*accessor.bufferView];
+  if (buffersBytes.size() <= static_cast<std::size_t>(bufferView.buffer)) {
+    return unexpected(
+      std::system_error(Error::kFileParseFailed, "too few buffers"));
+  }
+
+  std::size_t const components = accessorType == "VEC2" ? 2 : 3;
+  std::size_t const componentSize =
+    AccessorComponentTypeSize(accessor.componentType);
+  std::size_t const stride = bufferView.byteStride.value_or(
+    gsl::narrow_cast<int>(components * componentSize));
+  std::size_t const byteOffset =
+    bufferView.byteOffset.value_or(0) + accessor.byteOffset.value_or(0);
+
+  auto&& bufferBytes = buffersBytes[bufferView.buffer];
+  if (accessor.count > 0 &&
+      bufferBytes.size() < byteOffset + stride * (accessor.count - 1) +
+                             components * componentSize) {
+    return unexpected(
+      std::system_error(Error::kFileParseFailed, "buffer too small"));
+  }
+
+  float const scale = accessor.componentType == 5120 ? 127.f : 32767.f;
+  data.resize(accessor.count);
+
+  for (int i = 0; i < accessor.count; ++i) {
+    std::byte const* p = bufferBytes.data() + byteOffset + stride * i;
+    float e[3] = {0.f, 0.f, 0.f};
+    for (std::size_t c = 0; c < components; ++c) {
+      if (accessor.componentType == 5120) {
+        e[c] = static_cast<float>(reinterpret_cast<std::int8_t const*>(p)[c]);
+      } else {
+        std::int16_t v;
+        std::memcpy(&v, p + c * sizeof(v), sizeof(v));
+        e[c] = static_cast<float>(v);
+      }
+      e[c] = std::max(e[c] / scale, -1.f);
+    }
+
+    glm::vec3 n(e[0], e[1], 1.f - std::abs(e[0]) - std::abs(e[1]));
+    float const t = std::max(-n.z, 0.f);
+    n.x += n.x >= 0.f ? -t : t;
+    n.y += n.y >= 0.f ? -t : t;
+    data[i] = glm::vec4(glm::normalize(n), e[2] < 0.f ? -1.f : 1.f);
+  }
+
+  return data;
+} // GetOctahedralData
+
 inline expected<VkPrimitiveTopology, std::system_error>
 ModeToVkPrimitiveTopology(std::optional<int> mode) {
   if (!mode) return VK_PRIMITIVE_TOPOLOGY_TRIANGLE_LIST;
@@ -1351,8 +1563,8 @@ GLTF::ParsePrimitive(Renderer::CommandQueue commandQueue,
   for (auto&& [semantic, index] : primitive.attributes) {
     if (semantic == "POSITION") {
       IRIS_LOG_TRACE("reading POSITION");
-      if (auto p = gltf::GetAccessorData<glm::vec3>(
-            index, "VEC3", 5126, true, accessors, bufferViews, buffersBytes)) {
+      if (auto p = gltf::GetAttributeData<glm::vec3>(
+            index, "VEC3", accessors, bufferViews, buffersBytes)) {
         positions = std::move(*p);
       } else {
         IRIS_LOG_LEAVE();
@@ -1391,8 +1603,8 @@ GLTF::ParsePrimitive(Renderer::CommandQueue commandQueue,
   for (auto&& [semantic, index] : primitive.attributes) {
     if (semantic == "TEXCOORD_0") {
       IRIS_LOG_TRACE("reading TEXCOORD_0");
-      if (auto t = gltf::GetAccessorData<glm::vec2>(
-            index, "VEC2", 5126, true, accessors, bufferViews, buffersBytes)) {
+      if (auto t = gltf::GetAttributeData<glm::vec2>(
+            index, "VEC2", accessors, bufferViews, buffersBytes)) {
         texcoords = std::move(*t);
       } else {
         IRIS_LOG_LEAVE();
@@ -1400,8 +1612,8 @@ GLTF::ParsePrimitive(Renderer::CommandQueue commandQueue,
       }
     } else if (semantic == "NORMAL") {
       IRIS_LOG_TRACE("reading NORMAL");
-      if (auto n = gltf::GetAccessorData<glm::vec3>(
-            index, "VEC3", 5126, true, accessors, bufferViews, buffersBytes)) {
+      if (auto n = gltf::GetAttributeData<glm::vec3>(
+            index, "VEC3", accessors, bufferViews, buffersBytes)) {
         normals = std::move(*n);
       } else {
         IRIS_LOG_LEAVE();
@@ -1409,8 +1621,28 @@ GLTF::ParsePrimitive(Renderer::CommandQueue commandQueue,
       }
     } else if (semantic == "TANGENT") {
       IRIS_LOG_TRACE("reading TANGENT");
-      if (auto t = gltf::GetAccessorData<glm::vec4>(
-            index, "VEC4", 5126, true, accessors, bufferViews, buffersBytes)) {
+      if (auto t = gltf::GetAttributeData<glm::vec4>(
+            index, "VEC4", accessors, bufferViews, buffersBytes)) {
+        tangents = std::move(*t);
+      } else {
+        IRIS_LOG_LEAVE();
+        return unexpected(t.error());
+      }
+    } else if (semantic == "_NORMAL_OCT") {
+      IRIS_LOG_TRACE("reading _NORMAL_OCT");
+      if (auto n = gltf::GetOctahedralData(index, "VEC2", accessors,
+                                           bufferViews, buffersBytes)) {
+        normals.resize(n->size());
+        std::transform(n->begin(), n->end(), normals.begin(),
+                       [](glm::vec4 const& v) { return glm::vec3(v); });
+      } else {
+        IRIS_LOG_LEAVE();
+        return unexpected(n.error());
+      }
+    } else if (semantic == "_TANGENT_OCT") {
+      IRIS_LOG_TRACE("reading _TANGENT_OCT");
+      if (auto t = gltf::GetOctahedralData(index, "VEC3", accessors,
+                                           bufferViews, buffersBytes)) {
         tangents = std::move(*t);
       } else {
         IRIS_LOG_LEAVE();
@@ -1685,6 +1917,16 @@ GLTF::ParsePrimitive(Renderer::CommandQueue commandQueue,
 
   component.modelMatrix = nodeMat;
 
+  // Use the bounding sphere baked into the asset when there is one.
+  if (primitive.boundingSphere) {
+    component.boundingSphere = *primitive.boundingSphere;
+    IRIS_LOG_DEBUG("boundingSphere: ({} {} {}), {}", component.boundingSphere.x,
+                   component.boundingSphere.y, component.boundingSphere.z,
+                   component.boundingSphere.w);
+    IRIS_LOG_LEAVE();
+    return component;
+  }
+
   // Compute the bounding sphere
   struct CoordAccessor {
     using Pit = decltype(positions)::const_iterator;
@@ -1732,6 +1974,17 @@ GLTF::ParsePrimitive(Renderer::CommandQueue commandQueue, std::string const&,
 
   Renderer::Component::Traceable::Geometry geom;
 
+  // Boxes split into several primitives index their material's shader
+  // records from shaderRecordOffset. Instances pass box indices to shaders
+  // in the 24-bit gl_InstanceCustomIndexNV, so the offset must fit in it.
+  if (primitive.shaderRecordOffset &&
+      *primitive.shaderRecordOffset >= (1u << 24)) {
+    IRIS_LOG_LEAVE();
+    return unexpected(std::system_error(
+      Error::kFileParseFailed,
+      "shaderRecordOffset does not fit in the 24-bit instance custom index"));
+  }
+
   //
   // TODO: CreateSpheres
   //
@@ -1754,10 +2007,11 @@ GLTF::ParsePrimitive(Renderer::CommandQueue commandQueue, std::string const&,
   IRIS_LOG_DEBUG("aabbs.size(): {}", aabbs.size());
 
   if (auto buf =
-        iris::CreateBuffer(commandQueue.commandPool,           // commandPool
-                           commandQueue.queue,                 // queue
-                           commandQueue.submitFence,           // fence
-                           VK_BUFFER_USAGE_STORAGE_BUFFER_BIT, // bufferUsage
+        iris::CreateBuffer(commandQueue.commandPool, // commandPool
+                           commandQueue.queue,       // queue
+                           commandQueue.submitFence, // fence
+                           VK_BUFFER_USAGE_STORAGE_BUFFER_BIT |
+                             VK_BUFFER_USAGE_TRANSFER_SRC_BIT, // bufferUsage
                            VMA_MEMORY_USAGE_GPU_ONLY,          // memoryUsage
                            aabbs.size() * sizeof(glm::vec3),   // size
                            reinterpret_cast<std::byte*>(aabbs.data()) // data
@@ -1833,10 +2087,10 @@ GLTF::ParseRaytracingPipeline(int numGeometries) {
     },
   };
 
-  for (int i = 0; i < numGeometries; ++i) {
-    auto const binding = gsl::narrow_cast<std::uint32_t>(bindings.size());
+  // The boxes of every geometry, concatenated; see Traceable::spheresBuffer.
+  if (numGeometries > 0) {
     bindings.push_back({
-      binding,
+      2,                                 // binding
       VK_DESCRIPTOR_TYPE_STORAGE_BUFFER, // descriptorType
       1,                                 // descriptorCount
       VK_SHADER_STAGE_RAYGEN_BIT_NV | VK_SHADER_STAGE_CLOSEST_HIT_BIT_NV |
@@ -2652,7 +2906,8 @@ expected<Renderer::Component::Material, std::system_error> GLTF::CreateMaterial(
 namespace iris::io {
 
 expected<void, std::system_error> static ParseGLTF(
-  json const& j, std::filesystem::path const& path = "") noexcept {
+  json const& j, std::filesystem::path const& path = "",
+  std::optional<std::vector<std::byte>> glbBuffer = {}) noexcept {
   IRIS_LOG_ENTER();
   using namespace std::string_literals;
 
@@ -2710,6 +2965,9 @@ expected<void, std::system_error> static ParseGLTF(
         IRIS_LOG_LEAVE();
         b.error();
       }
+    } else if (glbBuffer && buffersBytes.empty()) {
+      // The first buffer of a GLB file without a uri is the BIN chunk.
+      buffersBytes.push_back(std::move(*glbBuffer));
     } else {
       IRIS_LOG_LEAVE();
       return unexpected(std::system_error(Error::kFileParseFailed,
@@ -2747,7 +3005,38 @@ expected<void, std::system_error> static ParseGLTF(
                                  gsl::narrow_cast<std::uint32_t>(y)});
       }
     } else if (image.bufferView) {
-      imagesBytes.push_back(buffersBytes[*image.bufferView]);
+      if (!g.bufferViews || g.bufferViews->size() <=
+                              static_cast<std::size_t>(*image.bufferView)) {
+        IRIS_LOG_LEAVE();
+        return unexpected(std::system_error(Error::kFileParseFailed,
+                                            "image bufferView out of range"));
+      }
+
+      auto&& bufferView = (*g.bufferViews)[*image.bufferView];
+      if (buffersBytes.size() <= static_cast<std::size_t>(bufferView.buffer)) {
+        IRIS_LOG_LEAVE();
+        return unexpected(std::system_error(Error::kFileParseFailed,
+                                            "image buffer out of range"));
+      }
+      IRIS_LOG_DEBUG("Reading image bufferView {}", *image.bufferView);
+
+      int x, y, n;
+      if (auto pixels =
+            stbi_load_from_memory(reinterpret_cast<stbi_uc const*>(
+                                    buffersBytes[bufferView.buffer].data() +
+                                    bufferView.byteOffset.value_or(0)),
+                                  bufferView.byteLength, &x, &y, &n, 4);
+          !pixels) {
+        IRIS_LOG_LEAVE();
+        return unexpected(
+          std::system_error(Error::kFileNotSupported, stbi_failure_reason()));
+      } else {
+        imagesBytes.emplace_back(reinterpret_cast<std::byte*>(pixels),
+                                 reinterpret_cast<std::byte*>(pixels) +
+                                   x * y * 4);
+        imagesExtents.push_back({gsl::narrow_cast<std::uint32_t>(x),
+                                 gsl::narrow_cast<std::uint32_t>(y)});
+      }
     } else {
       IRIS_LOG_LEAVE();
       return unexpected(std::system_error(Error::kFileNotSupported,
@@ -2834,6 +3123,66 @@ expected<void, std::system_error> static ParseGLTF(
       }
     }
 
+    //
+    // Concatenate the boxes of every geometry into the one storage buffer
+    // the intersection shader reads. Each instance's custom index is the
+    // first of its boxes there, so shaders read
+    // spheres[gl_InstanceCustomIndexNV + gl_PrimitiveID]. For the chunks of
+    // one split primitive this is the chunk's shaderRecordOffset.
+    //
+
+    VkDeviceSize spheresBufferSize = 0;
+    for (auto&& geometry : traceable.geometries) {
+      VkDeviceSize const first = spheresBufferSize / (sizeof(glm::vec3) * 2);
+      if (first + geometry.geometry.geometry.aabbs.numAABBs > (1u << 24)) {
+        IRIS_LOG_LEAVE();
+        return unexpected(std::system_error(
+          Error::kFileParseFailed,
+          "too many boxes for the 24-bit instance custom index"));
+      }
+      geometry.customIndex = gsl::narrow_cast<std::uint32_t>(first);
+      spheresBufferSize += geometry.buffer.size;
+    }
+
+    if (spheresBufferSize > 0) {
+      if (auto buf = AllocateBuffer(spheresBufferSize,
+                                    VK_BUFFER_USAGE_STORAGE_BUFFER_BIT |
+                                      VK_BUFFER_USAGE_TRANSFER_DST_BIT,
+                                    VMA_MEMORY_USAGE_GPU_ONLY)) {
+        traceable.spheresBuffer = *buf;
+      } else {
+        IRIS_LOG_LEAVE();
+        return unexpected(buf.error());
+      }
+
+      VkCommandBuffer commandBuffer;
+      if (auto cb = Renderer::BeginOneTimeSubmit(commandQueue.commandPool)) {
+        commandBuffer = *cb;
+      } else {
+        IRIS_LOG_LEAVE();
+        return unexpected(cb.error());
+      }
+
+      VkBufferCopy region = {};
+      for (auto&& geometry : traceable.geometries) {
+        region.srcOffset = 0;
+        region.size = geometry.buffer.size;
+        if (region.size > 0) {
+          vkCmdCopyBuffer(commandBuffer, geometry.buffer.buffer,
+                          traceable.spheresBuffer.buffer, 1, &region);
+        }
+        region.dstOffset += region.size;
+      }
+
+      if (auto result = Renderer::EndOneTimeSubmit(
+            commandBuffer, commandQueue.commandPool, commandQueue.queue,
+            commandQueue.submitFence);
+          !result) {
+        IRIS_LOG_LEAVE();
+        return unexpected(result.error());
+      }
+    }
+
     if (auto structure = CreateTopLevelAccelerationStructure(
           gsl::narrow_cast<std::uint32_t>(traceable.geometries.size()), 0)) {
       traceable.topLevelAccelerationStructure = *structure;
@@ -2993,6 +3342,66 @@ expected<void, std::system_error> static ParseGLTF(
   return {};
 } // ParseGLTF
 
+expected<std::pair<json, std::optional<std::vector<std::byte>>>,
+         std::system_error> static ParseGLB(std::vector<std::byte> const&
+                                              bytes) noexcept {
+  IRIS_LOG_ENTER();
+
+  // https://github.com/KhronosGroup/glTF/tree/master/specification/2.0#glb-file-format-specification
+  std::uint32_t constexpr kGLBMagic = 0x46546C67;     // "glTF"
+  std::uint32_t constexpr kGLBChunkJSON = 0x4E4F534A; // "JSON"
+  std::uint32_t constexpr kGLBChunkBIN = 0x004E4942;  // "BIN\0"
+
+  auto const readU32 = [&bytes](std::size_t offset) {
+    std::uint32_t value;
+    std::memcpy(&value, bytes.data() + offset, sizeof(value));
+    return value;
+  };
+
+  if (bytes.size() < 20 || readU32(0) != kGLBMagic || readU32(4) != 2 ||
+      readU32(8) > bytes.size()) {
+    IRIS_LOG_LEAVE();
+    return unexpected(
+      std::system_error(Error::kFileParseFailed, "Invalid GLB header"));
+  }
+
+  std::size_t const length = readU32(8);
+  std::size_t const jsonLength = readU32(12);
+  if (readU32(16) != kGLBChunkJSON || 20 + jsonLength > length) {
+    IRIS_LOG_LEAVE();
+    return unexpected(
+      std::system_error(Error::kFileParseFailed, "Invalid GLB JSON chunk"));
+  }
+
+  json j;
+  try {
+    auto const begin = reinterpret_cast<char const*>(bytes.data()) + 20;
+    j = json::parse(begin, begin + jsonLength);
+  } catch (std::exception const& e) {
+    IRIS_LOG_LEAVE();
+    return unexpected(std::system_error(
+      Error::kFileParseFailed, fmt::format("Parsing failed: {}", e.what())));
+  }
+
+  std::optional<std::vector<std::byte>> bin;
+  std::size_t const binOffset = 20 + jsonLength;
+  if (binOffset + 8 <= length) {
+    std::size_t const binLength = readU32(binOffset);
+    if (readU32(binOffset + 4) != kGLBChunkBIN ||
+        binOffset + 8 + binLength > length) {
+      IRIS_LOG_LEAVE();
+      return unexpected(
+        std::system_error(Error::kFileParseFailed, "Invalid GLB BIN chunk"));
+    }
+
+    auto const begin = bytes.begin() + binOffset + 8;
+    bin = std::vector<std::byte>(begin, begin + binLength);
+  }
+
+  IRIS_LOG_LEAVE();
+  return std::make_pair(std::move(j), std::move(bin));
+} // ParseGLB
+
 } // namespace iris::io
 
 std::function<std::system_error(void)>
@@ -3000,7 +3409,18 @@ iris::io::LoadGLTF(std::filesystem::path const& path) noexcept {
   IRIS_LOG_ENTER();
 
   json j;
-  if (auto&& bytes = ReadFile(path)) {
+  std::optional<std::vector<std::byte>> glbBuffer;
+
+  if (auto&& bytes = ReadFile(path); bytes && path.extension() == ".glb") {
+    if (auto glb = ParseGLB(*bytes)) {
+      j = std::move(glb->first);
+      glbBuffer = std::move(glb->second);
+    } else {
+      IRIS_LOG_LEAVE();
+      IRIS_LOG_ERROR("Error parsing {}: {}", path.string(), glb.error().what());
+      return []() { return std::system_error(Error::kFileParseFailed); };
+    }
+  } else if (bytes) {
     try {
       j = json::parse(*bytes);
     } catch (std::exception const& e) {
@@ -3014,7 +3434,7 @@ iris::io::LoadGLTF(std::filesystem::path const& path) noexcept {
     return []() { return std::system_error(Error::kFileLoadFailed); };
   }
 
-  if (auto ret = ParseGLTF(j, path); !ret) {
+  if (auto ret = ParseGLTF(j, path, std::move(glbBuffer)); !ret) {
     IRIS_LOG_ERROR("Error parsing GLTF: {}", ret.error().what());
     return []() { return std::system_error(Error::kFileLoadFailed); };
   }
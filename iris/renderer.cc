@@ -874,6 +874,7 @@ static void BeginFrameTraceable() {
     absl::InlinedVector<GeometryInstance, 128> instances{};
     for (auto&& geometry : sTraceable.geometries) {
       instances.emplace_back(geometry.bottomLevelAccelerationStructure.handle);
+      instances.back().customIndex = geometry.customIndex;
     }
 
     if (auto result = BuildTopLevelAccelerationStructure(
@@ -928,20 +929,17 @@ static void BeginFrameTraceable() {
     },
   };
 
-  for (auto&& geometry : sTraceable.geometries) {
-    VkDescriptorBufferInfo bufferInfo = {};
-    bufferInfo.buffer = geometry.buffer.buffer;
-    bufferInfo.offset = 0;
-    bufferInfo.range = geometry.buffer.size;
-
-    auto&& dstBinding =
-      gsl::narrow_cast<std::uint32_t>(descriptorWrites.size());
+  VkDescriptorBufferInfo bufferInfo = {};
+  bufferInfo.buffer = sTraceable.spheresBuffer.buffer;
+  bufferInfo.offset = 0;
+  bufferInfo.range = sTraceable.spheresBuffer.size;
 
+  if (sTraceable.spheresBuffer) {
     descriptorWrites.push_back({
       VK_STRUCTURE_TYPE_WRITE_DESCRIPTOR_SET, // sType
       nullptr,                                // pNext
       sTraceable.descriptorSet,               // dstSet
-      dstBinding,                             // dstBinding
+      2,                                      // dstBinding
       0,                                      // dstArrayElement
       1,                                      // descriptorCount
       VK_DESCRIPTOR_TYPE_STORAGE_BUFFER,      // descriptorType
@@ -2810,7 +2808,7 @@ iris::Renderer::LoadFile(std::filesystem::path const& path) noexcept {
 
       if (ext.compare(".json") == 0) {
         sIOContinuations.push(io::LoadJSON(path_));
-      } else if (ext.compare(".gltf") == 0) {
+      } else if (ext.compare(".gltf") == 0 || ext.compare(".glb") == 0) {
         sIOContinuations.push(io::LoadGLTF(path_));
       } else {
         IRIS_LOG_ERROR("Unhandled file extension '{}' for {}", ext.string(),